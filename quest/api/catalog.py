@@ -1,16 +1,21 @@
 import json
+import functools
 import itertools
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 import geojson
 from shapely.geometry import shape
+import shapely.wkt
 
 from .. import util
 from .. import plugins
-from quest.database.database import get_db, db_session
-from .datasets import new_dataset
+from quest.database.database import get_db, db_session, insert_datasets
+from .collections import get_collections
+from .datasets import _new_dataset_metadata
 from .metadata import get_metadata
 from ..util import construct_service_uri
+from ..util.catalog_cache import FILTER_OPERATORS, is_operator_filter
 from .tasks import add_async
 from ..static import DatasetSource, UriType
 
@@ -29,23 +34,28 @@ def add_datasets(collection, catalog_entries):
         uris (list):
             uris of ?
     """
+    if collection not in get_collections():
+        raise ValueError("Collection {} does not exist".format(collection))
+
+    entries = catalog_entries
     if not isinstance(catalog_entries, pd.DataFrame):
         entries = get_metadata(catalog_entries, as_dataframe=True)
 
-    uris = []
-    for _, data in entries.iterrows():
+    # all datasets are created in a single transaction
+    datasets = []
+    for catalog_entry, service in zip(entries['name'], entries['service']):
         source = DatasetSource.WEB_SERVICE
-        if 'quest' in data['service']:
+        if 'quest' in service:
             source = DatasetSource.DERIVED
-        uri = new_dataset(collection=collection, catalog_entry=data.to_frame().transpose(), source=source)
-        uris.append(uri)
+        datasets.append(_new_dataset_metadata(catalog_entry, collection, source=source))
+    insert_datasets(datasets)
 
-    return uris
+    return [dataset['name'] for dataset in datasets]
 
 
-@add_async
+@add_async(workload='io')
 def search_catalog(uris=None, expand=False, as_dataframe=False, as_geojson=False,
-                   update_cache=False, filters=None, queries=None):
+                   update_cache=False, filters=None, queries=None, max_workers=None, chunksize=None):
     """Retrieve list of catalog entries from resources.
 
     Args:
@@ -70,9 +80,19 @@ def search_catalog(uris=None, expand=False, as_dataframe=False, as_geojson=False
                     description (string, optional): filter catalog_entries by description
                     search_terms (list, optional): filter catalog_entries by search_terms
 
-            catalog_entries can also be filtered by any other metadata fields
+            catalog_entries can also be filtered by any other metadata fields. Fields of nested
+            metadata are joined with ':' (e.g. 'location:state') and the value can be a dict of
+            comparison operators (e.g. {'>=': 10, '<': 20} or {'in': ['TX', 'NM']})
         queries(list, Optional, Default=None):
             list of string arguments to pass to pandas.DataFrame.query to filter the catalog_entries
+        max_workers (int, Optional, Default=None):
+            maximum number of services that are searched concurrently. If None then the
+            'MAX_SERVICE_WORKERS' setting is used (default 4). Services that fail are logged and
+            skipped unless all services fail.
+        chunksize (int, Optional, Default=None):
+            if given then return a generator that yields the catalog entries in chunks of at most
+            `chunksize` entries (in the format specified by the other arguments) as they are read.
+            Services are searched one at a time and chunks are not sorted across services.
 
     Returns:
         datasets (list, geo-json dict or pandas.DataFrame, Default=list):
@@ -85,24 +105,73 @@ def search_catalog(uris=None, expand=False, as_dataframe=False, as_geojson=False
 
     services = grouped_uris.get('services') or []
 
-    all_datasets = []
-
     filters = filters or dict()
-    for name in services:
-        provider, service, _ = util.parse_service_uri(name)
-        provider_plugin = plugins.load_providers()[provider]
-        tmp_datasets = provider_plugin.search_catalog(service, update_cache=update_cache, **filters)
-        all_datasets.append(tmp_datasets)
-
-    all_datasets.append(tmp_datasets)
+    if chunksize is not None:
+        return _search_catalog_chunks(services, chunksize, filters=filters, queries=queries, update_cache=update_cache,
+                                      expand=expand, as_dataframe=as_dataframe, as_geojson=as_geojson)
+
+    all_datasets = _map_services(
+        lambda provider_plugin, service: provider_plugin.search_catalog(service, update_cache=update_cache, **filters),
+        services,
+        max_workers=max_workers,
+    )
 
     # drop duplicates fails when some columns have nested list/tuples like
     # _geom_coords. so drop based on index
-    datasets = pd.concat(all_datasets)
+    datasets = _concat_catalog_entries(all_datasets) if all_datasets else pd.DataFrame()
     datasets['index'] = datasets.index
     datasets = datasets.drop_duplicates(subset='index')
     datasets = datasets.set_index('index').sort_index()
 
+    datasets = _filter_catalog_entries(datasets, filters, queries)
+
+    return _format_catalog_entries(datasets, expand=expand, as_dataframe=as_dataframe, as_geojson=as_geojson)
+
+
+def _search_catalog_chunks(service_uris, chunksize, filters, queries, update_cache, **kwargs):
+    """Helper function for `search_catalog` to yield the filtered catalog entries of each service in chunks.
+    """
+    providers = plugins.load_providers()
+    service_uris = list(dict.fromkeys(service_uris))
+    seen = set()
+    errors = []
+    for uri in service_uris:
+        provider, service, _ = util.parse_service_uri(uri)
+        try:
+            chunks = providers[provider].search_catalog_chunks(service, chunksize, update_cache=update_cache, **filters)
+            for datasets in chunks:
+                datasets = datasets[~datasets.index.duplicated() & ~datasets.index.isin(seen)]
+                seen.update(datasets.index)
+                datasets = _filter_catalog_entries(datasets, filters, queries)
+                if not datasets.empty:
+                    yield _format_catalog_entries(datasets, **kwargs)
+        except Exception as e:
+            util.logger.error('service {} has failed, due to the following exception: \n\t{} {}.'
+                              .format(uri, e.__class__.__name__, str(e)))
+            errors.append(e)
+
+    if errors and len(errors) == len(service_uris):
+        raise errors[0]
+
+
+def _concat_catalog_entries(all_datasets):
+    """Helper function for `search_catalog` to concatenate the catalog entries of several services.
+
+    Columns that are categorical in every service are unified first since pandas would otherwise
+    convert them back to object columns.
+    """
+    categorical = set.intersection(*[{c for c in d.columns if isinstance(d[c].dtype, pd.CategoricalDtype)}
+                                     for d in all_datasets])
+    for col in categorical:
+        categories = functools.reduce(lambda a, b: a.union(b), [d[col].cat.categories for d in all_datasets])
+        all_datasets = [d.assign(**{col: d[col].cat.set_categories(categories)}) for d in all_datasets]
+
+    return pd.concat(all_datasets)
+
+
+def _filter_catalog_entries(datasets, filters, queries=None):
+    """Helper function for `search_catalog` to apply filters and queries to catalog entries.
+    """
     # apply any specified filters
     for k, v in filters.items():
         if datasets.empty:
@@ -126,7 +195,7 @@ def search_catalog(uris=None, expand=False, as_dataframe=False, as_geojson=False
                 datasets = datasets[idx]
 
             elif k == 'description':
-                idx = datasets.display_name.str.contains(v)
+                idx = datasets.description.str.contains(v)
                 datasets = datasets[idx]
 
             elif k == 'search_terms':
@@ -135,13 +204,19 @@ def search_catalog(uris=None, expand=False, as_dataframe=False, as_geojson=False
                 datasets = datasets[idx]
 
             else:
-                idx = datasets.metadata.map(lambda x: _multi_index(x, k) == v)
-                datasets = datasets[idx]
+                idx = datasets.metadata.map(lambda x: _match_metadata(_multi_index(x, k), v))
+                datasets = datasets[idx.astype(bool)]
 
     if queries is not None:
         for query in queries:
             datasets = datasets.query(query)
 
+    return datasets
+
+
+def _format_catalog_entries(datasets, expand=False, as_dataframe=False, as_geojson=False):
+    """Helper function for `search_catalog` to convert catalog entries to the requested format.
+    """
     if not (expand or as_dataframe or as_geojson):
         return datasets.index.astype('unicode').tolist()
 
@@ -160,17 +235,80 @@ def search_catalog(uris=None, expand=False, as_dataframe=False, as_geojson=False
 def _multi_index(d, index):
     """Helper function for `search_catalog` filters to index multi-index tags (see `get_tags`)
     """
-    if not isinstance(index, str):
-        return d[index]
+    try:
+        if not isinstance(index, str):
+            return d[index]
 
-    multi_index = index.split(':')
-    for k in multi_index:
-        d = d[k]
+        multi_index = index.split(':')
+        for k in multi_index:
+            d = d[k]
+    except (KeyError, IndexError, TypeError):
+        # entries that do not have the tag do not match
+        return None
 
     return d
 
 
-def get_tags(service_uris, update_cache=False, filter=None, as_count=False):
+def _match_metadata(value, v):
+    """Helper function for `search_catalog` filters to compare a metadata value to a filter value
+    that can be a dict of comparison operators (e.g. {'>=': 10, '<': 20} or {'in': ['TX', 'NM']}).
+    """
+    if not is_operator_filter(v):
+        return value == v
+
+    try:
+        return all(value in util.listify(x) if op == 'in' else value is not None and FILTER_OPERATORS[op](value, x)
+                   for op, x in v.items())
+    except TypeError:
+        return False
+
+
+def _map_services(func, service_uris, max_workers=None):
+    """Helper function for `search_catalog` and `get_tags` to call a function for several services concurrently.
+
+    Args:
+        func (function): function called with the provider plugin and service name of each service.
+        service_uris (list): uris of the services.
+        max_workers (int, Optional, Default=None): maximum number of concurrent calls.
+
+    Returns:
+        A list of the results of the services that succeeded in the same order as `service_uris`.
+        If all services fail then the exception of the first service is raised.
+    """
+    service_uris = list(dict.fromkeys(service_uris))
+    if not service_uris:
+        return []
+
+    if max_workers is None:
+        max_workers = util.get_settings().get('MAX_SERVICE_WORKERS', 4)
+
+    # load the providers once before they are used from multiple threads
+    providers = plugins.load_providers()
+
+    def call(uri):
+        provider, service, _ = util.parse_service_uri(uri)
+        return func(providers[provider], service)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(service_uris)))) as executor:
+        futures = [executor.submit(call, uri) for uri in service_uris]
+
+    results = []
+    errors = []
+    for uri, future in zip(service_uris, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            util.logger.error('service {} has failed, due to the following exception: \n\t{} {}.'
+                              .format(uri, e.__class__.__name__, str(e)))
+            errors.append(e)
+
+    if errors and not results:
+        raise errors[0]
+
+    return results
+
+
+def get_tags(service_uris, update_cache=False, filter=None, as_count=False, max_workers=None, prefix=None):
     """Get searchable tags for a given service.
 
     Args:
@@ -182,11 +320,15 @@ def get_tags(service_uris, update_cache=False, filter=None, as_count=False):
             list of tags to include in return value
         as_count(bool, Optional):
             if True, return dictionary with the number of values rather than a list of possible values
+        max_workers (int, Optional, Default=None):
+            maximum number of services that are queried concurrently (see `search_catalog`)
+        prefix (string, Optional):
+            only include tags that start with prefix (e.g. 'station:' for the tags of a nested 'station' dict)
 
     Returns:
     --------
         tags (dict):
-         dict keyed by tag name and list of possible values
+         dict keyed by tag name and list of possible values ordered by how often they occur
 
          Note: nested dicts are parsed out as a multi-index tag where keys for nested dicts are joined with ':'.
     """
@@ -199,11 +341,13 @@ def get_tags(service_uris, update_cache=False, filter=None, as_count=False):
     services = grouped_uris.get(UriType.SERVICE) or []
 
     tags = dict()
+    all_tags = _map_services(
+        lambda provider_plugin, service: provider_plugin.get_tags(service, update_cache=update_cache, prefix=prefix),
+        services,
+        max_workers=max_workers,
+    )
 
-    for service in services:
-        provider, service, _ = util.parse_service_uri(service)
-        provider_plugin = plugins.load_providers()[provider]
-        service_tags = provider_plugin.get_tags(service, update_cache=update_cache)
+    for service_tags in all_tags:
         tags.update(service_tags)
 
     if filter:
@@ -246,8 +390,11 @@ def new_catalog_entry(geometry=None, geom_type=None, geom_coords=None, metadata=
 
         geometry = shape({"coordinates": geom_coords, "type": geom_type})
 
-    if hasattr(geometry, 'wkt'):
-        geometry = geometry.wkt
+    if isinstance(geometry, str):
+        geometry = shapely.wkt.loads(geometry)
+
+    if hasattr(geometry, 'wkb'):
+        geometry = geometry.wkb
 
     catalog_id = util.uuid('catalog_entry')
 
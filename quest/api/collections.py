@@ -1,7 +1,6 @@
 """API functions related to Collections."""
-from quest.database.database import get_db, db_session
+from quest.database.database import get_db, db_session, select_collections, to_dataframe
 from .projects import _get_project_dir
-import pandas as pd
 import os
 
 
@@ -23,13 +22,13 @@ def get_collections(expand=False, as_dataframe=False):
 
     """
 
+    if as_dataframe:
+        return to_dataframe(select_collections(as_table=True))
+
     collections = _load_collections()
-    if not expand and not as_dataframe:
+    if not expand:
         collections = list(collections.keys())
 
-    if as_dataframe:
-        collections = pd.DataFrame.from_dict(collections, orient='index')
-
     return collections
 
 
@@ -89,6 +88,4 @@ def _load_collection(name):
 
 def _load_collections():
     """load list of collections."""
-    db = get_db()
-    with db_session:
-        return {c.name: c.to_dict() for c in db.Collection.select(lambda c: c)}
+    return {c['name']: c for c in select_collections()}
@@ -1,17 +1,22 @@
-from quest.database.database import get_db, db_session, select_datasets
+from quest.database.database import (select_datasets, insert_datasets, update_datasets, is_dataset_filter,
+                                     is_dataset_query, to_dataframe, to_records, DATASET_FIELDS)
 from ..plugins import load_providers, load_plugins, list_plugins
 from ..util import logger, parse_service_uri, listify, uuid, is_uuid, classify_uris
+from ..util.catalog_cache import FILTER_OPERATORS, is_operator_filter
+from ..util.download import DownloadScheduler, download_setting
 from .collections import get_collections
 from .metadata import get_metadata, update_metadata
 from .projects import _get_project_dir
 from quest.static import DatasetStatus, DatasetSource
 from .tasks import add_async
+from functools import partial
 import pandas as pd
 import param
+import time
 import os
 
 
-@add_async
+@add_async(workload='io')
 def download(catalog_entry, file_path, dataset=None, **kwargs):
     """Download dataset and save it locally.
 
@@ -44,7 +49,7 @@ def download(catalog_entry, file_path, dataset=None, **kwargs):
     return data
 
 
-@add_async
+@add_async(workload='io')
 def publish(publisher_uri, options=None, **kwargs):
     if isinstance(options, param.Parameterized):
         options = dict(options.get_param_values())
@@ -55,15 +60,20 @@ def publish(publisher_uri, options=None, **kwargs):
     data = provider_plugin.publish(publisher=publisher, **options)
     return data
 
-@add_async
-def download_datasets(datasets, raise_on_error=False):
+@add_async(workload='io')
+def download_datasets(datasets, raise_on_error=False, progress=None):
     """Download datasets that have been staged with stage_for_download.
 
+    Datasets are downloaded concurrently, with at most DOWNLOAD_PROVIDER_WORKERS downloads from the same provider
+    at a time, and downloads that fail with a network error are retried (see `quest.util.download`).
+
     Args:
         datasets (string or list, Required):
             datasets to download
         raise_on_error (bool, Optional, Default=False):
             if True, if an error occurs raise an exception
+        progress (function, Optional, Default=None):
+            called as progress(dataset, status, n_done, n_total) when the download of each dataset is done
         async: (bool, Optional, Default=False)
             if True, download in background
 
@@ -79,43 +89,73 @@ def download_datasets(datasets, raise_on_error=False):
     # filter out non download datasets
     datasets = datasets[datasets['source'] == DatasetSource.WEB_SERVICE]
 
-    db = get_db()
     project_path = _get_project_dir()
     status = {}
+    previous_status = datasets['status'].to_dict()
+    update_datasets({idx: {'status': DatasetStatus.PENDING} for idx in datasets.index})
+
+    load_providers()  # load the provider plugins before they are used by the download threads
+    jobs = []
     for idx, dataset in datasets.iterrows():
-        collection_path = os.path.join(project_path, dataset['collection'])
-        catalog_entry = dataset["catalog_entry"]
-        try:
-            update_metadata(idx, quest_metadata={'status': DatasetStatus.PENDING})
-            kwargs = dataset['options'] or dict()
-            all_metadata = download(catalog_entry,
-                                    file_path=collection_path,
-                                    dataset=idx, **kwargs)
-
-            metadata = all_metadata.pop('metadata', None)
-            quest_metadata = all_metadata
-            quest_metadata.update({
-                'status': DatasetStatus.DOWNLOADED,
-                'message': 'success',
-                })
-        except Exception as e:
-            if raise_on_error:
-                raise
-
-            quest_metadata = {
-                'status': DatasetStatus.FAILED_DOWNLOAD,
-                'message': str(e),
-                }
-
-            metadata = None
-
-        status[idx] = quest_metadata['status']
-
-        quest_metadata.update({'metadata': metadata})
-
-        with db_session:
-            dataset = db.Dataset[idx]
-            dataset.set(**quest_metadata)
+        catalog_entry = dataset['catalog_entry']
+        provider = parse_service_uri(catalog_entry)[0]
+        kwargs = dataset['options'] or dict()
+        jobs.append((idx, provider, partial(download, catalog_entry,
+                                            file_path=os.path.join(project_path, dataset['collection']),
+                                            dataset=idx, **kwargs)))
+
+    # the status of datasets is updated in batches, at most every DOWNLOAD_STATUS_INTERVAL seconds
+    status_interval = download_setting('DOWNLOAD_STATUS_INTERVAL')
+    updates = {}
+    updated_at = time.perf_counter()
+    error = None
+    scheduler = DownloadScheduler()
+    try:
+        for idx, all_metadata, e in scheduler.run(jobs):
+            if e is None:
+                metadata = all_metadata.pop('metadata', None)
+                quest_metadata = all_metadata
+                quest_metadata.update({
+                    'status': DatasetStatus.DOWNLOADED,
+                    'message': 'success',
+                    })
+            elif raise_on_error:
+                # the downloads that are running are still recorded and the failed ones stay pending
+                scheduler.stop()
+                error = error or e
+                status[idx] = DatasetStatus.PENDING
+                continue
+            else:
+                quest_metadata = {
+                    'status': DatasetStatus.FAILED_DOWNLOAD,
+                    'message': str(e),
+                    }
+                metadata = None
+
+            status[idx] = quest_metadata['status']
+
+            quest_metadata.update({'metadata': metadata})
+            updates[idx] = quest_metadata
+
+            if progress is not None:
+                progress(idx, status[idx], len(status), len(jobs))
+
+            if time.perf_counter() - updated_at >= status_interval:
+                update_datasets(updates)
+                updates = {}
+                updated_at = time.perf_counter()
+    finally:
+        # the finished downloads are recorded even if the progress callback or a download thread raises, and the
+        # datasets whose download was not started or not reported, e.g. after an error, get back their previous status
+        updates.update({idx: {'status': s} for idx, s in previous_status.items() if idx not in status})
+        if updates:
+            update_datasets(updates)
+
+    if error is not None:
+        raise error
+
+    logger.info('downloaded {} of {} datasets'.format(
+        sum(s == DatasetStatus.DOWNLOADED for s in status.values()), len(jobs)))
 
     return status
 
@@ -142,7 +182,8 @@ def get_download_options(uris, fmt='json'):
     datasets = grouped_uris.get('datasets') or []
 
     service_uris = {s: s for s in services}
-    service_uris.update({dataset: get_metadata(dataset)[dataset]['catalog_entry'] for dataset in datasets})
+    if datasets:
+        service_uris.update({k: v['catalog_entry'] for k, v in get_metadata(datasets).items()})
 
     options = {}
     for uri, service_uri in service_uris.items():
@@ -166,27 +207,58 @@ def get_publish_options(publish_uri, fmt='json'):
 
 
 @add_async
-def get_datasets(expand=None, filters=None, queries=None, as_dataframe=None):
+def get_datasets(expand=None, filters=None, queries=None, as_dataframe=None, columns=None, limit=None, offset=None):
     """Return all available datasets in active project.
 
     Args:
         expand (bool, Optional, Default=None):
             include dataset details and format as dict
         filters(dict, Optional, Default=None):
-             filter dataset by any metadata field
+             filter dataset by any metadata field, either by value or by a dict of comparison operators
+             (e.g. {'>=': start, '<': end} or {'in': [...]})
         queries(list, Optional, Default=None):
             list of string arguments to pass to pandas.DataFrame.query to filter the datasets
         as_dataframe (bool or None, Optional, Default=None):
             include dataset details and format as pandas dataframe
+        columns (list, Optional, Default=None):
+            dataset details to include when expand or as_dataframe is True, all details if None
+        limit (int, Optional, Default=None):
+            maximum number of datasets to return, ordered by name
+        offset (int, Optional, Default=None):
+            number of datasets, ordered by name, to skip
     Returns:
         uris (list, dict, pandas Dataframe, Default=list):
             staged dataset uids
 
     """
-    datasets = select_datasets()
-    datasets = pd.DataFrame(datasets)
-    if not datasets.empty:
-        datasets.set_index('name', inplace=True, drop=False)
+    if columns is not None:
+        unknown = [c for c in columns if c not in DATASET_FIELDS]
+        if unknown:
+            raise ValueError('Unknown dataset fields: {}'.format(', '.join(unknown)))
+        columns = ['name'] + [c for c in columns if c != 'name']
+    if not expand and not as_dataframe:
+        columns = ['name']
+
+    # evaluate the filters and queries that can be translated to sql in the database and the rest on the dataframe
+    filters = dict(filters or {})
+    db_filters = {k: filters.pop(k) for k in list(filters) if is_dataset_filter(k, filters[k])}
+    db_queries = [q for q in queries or [] if is_dataset_query(q)]
+    queries = [q for q in queries or [] if not is_dataset_query(q)]
+
+    if filters or queries:
+        # the datasets can only be paged and reduced to the requested columns after the remaining filters
+        datasets = select_datasets(filters=db_filters, queries=db_queries, as_table=True)
+    else:
+        datasets = select_datasets(filters=db_filters, queries=db_queries, columns=columns, limit=limit,
+                                   offset=offset, as_table=True)
+
+    if not filters and not queries and not as_dataframe:
+        # the datasets are returned without converting them to a dataframe
+        if not expand:
+            return datasets.column('name').to_pylist()
+        return {d['name']: d for d in to_records(datasets)}
+
+    datasets = to_dataframe(datasets)
 
     if datasets.empty:
         if not expand and not as_dataframe:
@@ -195,17 +267,29 @@ def get_datasets(expand=None, filters=None, queries=None, as_dataframe=None):
             datasets = {}
         return datasets
 
-    if filters is not None:
-        for k, v in filters.items():
-            if k not in datasets.keys():
-                logger.warning('filter field {} not found, continuing'.format(k))
-                continue
-
+    for k, v in filters.items():
+        if k not in datasets.keys():
+            logger.warning('filter field {} not found, continuing'.format(k))
+            continue
+
+        if is_operator_filter(v):
+            for op, value in v.items():
+                if op == 'in':
+                    datasets = datasets.loc[datasets[k].isin(value)]
+                else:
+                    datasets = datasets.loc[FILTER_OPERATORS[op](datasets[k], value)]
+        else:
             datasets = datasets.loc[datasets[k] == v]
 
-    if queries is not None:
-        for query in queries:
-            datasets = datasets.query(query)
+    for query in queries:
+        datasets = datasets.query(query)
+
+    if filters or queries:
+        if limit is not None or offset is not None:
+            start = offset or 0
+            datasets = datasets.sort_index().iloc[start:None if limit is None else start + limit]
+        if columns is not None:
+            datasets = datasets[columns]
 
     if not expand and not as_dataframe:
         datasets = datasets['name'].tolist()
@@ -253,6 +337,17 @@ def new_dataset(catalog_entry, collection, source=None, display_name=None,
     except IndexError:
         raise ValueError('Entry {} dose not exist'.format(catalog_entry))
 
+    quest_metadata = _new_dataset_metadata(catalog_entry, collection, source=source, display_name=display_name,
+                                           description=description, file_path=file_path, metadata=metadata, name=name)
+    insert_datasets([quest_metadata])
+
+    return quest_metadata['name']
+
+
+def _new_dataset_metadata(catalog_entry, collection, source=None, display_name=None,
+                          description=None, file_path=None, metadata=None, name=None):
+    """Helper function for `new_dataset` and `add_datasets` to build the database fields of a new dataset.
+    """
     name = name or uuid('dataset')
     assert name.startswith('d') and is_uuid(name)
 
@@ -278,11 +373,7 @@ def new_dataset(catalog_entry, collection, source=None, display_name=None,
     if source == DatasetSource.WEB_SERVICE:
         quest_metadata.update({'status': DatasetStatus.NOT_STAGED})
 
-    db = get_db()
-    with db_session:
-        db.Dataset(**quest_metadata)
-
-    return name
+    return quest_metadata
 
 
 def stage_for_download(uris, options=None):
@@ -302,7 +393,6 @@ def stage_for_download(uris, options=None):
             staged dataset uids
     """
     uris = listify(uris)
-    display_name = None
     datasets = []
 
     # TODO classify uris and ensure only datasets
@@ -310,35 +400,36 @@ def stage_for_download(uris, options=None):
     if not isinstance(options, list):
         options = [options] * len(uris)
 
-    db = get_db()
+    # the metadata of all datasets is retrieved at once and all datasets are updated in a single transaction
+    all_metadata = get_metadata(uris) if uris else {}
+    updates = {}
 
     for dataset_uri, kwargs in zip(uris, options):
         if isinstance(kwargs, param.Parameterized):
             kwargs = dict(kwargs.get_param_values())
 
-        dataset_metadata = get_metadata(dataset_uri)[dataset_uri]
+        dataset_metadata = all_metadata[dataset_uri]
 
         parameter = kwargs.get('parameter') if kwargs else None
         parameter_name = parameter or 'no_parameter'
 
-        if dataset_metadata['display_name'] == dataset_uri:
+        display_name = dataset_metadata['display_name']
+        if display_name == dataset_uri:
             catalog_entry = dataset_metadata['catalog_entry']
             provider, service, _ = parse_service_uri(catalog_entry)
             display_name = '{0}-{1}-{2}'.format(provider, parameter_name, dataset_uri[:7])
 
-        quest_metadata = {
-            'display_name': display_name or dataset_metadata['display_name'],
+        updates[dataset_uri] = {
+            'display_name': display_name,
             'options': kwargs,
             'status': DatasetStatus.STAGED,
             'parameter': parameter
         }
 
-        with db_session:
-            dataset = db.Dataset[dataset_uri]
-            dataset.set(**quest_metadata)
-
         datasets.append(dataset_uri)
 
+    update_datasets(updates)
+
     return datasets
 
 
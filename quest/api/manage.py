@@ -9,7 +9,7 @@ from .tasks import add_async
 from .. import util
 
 
-@add_async
+@add_async(workload='io')
 def delete(uris):
     """Delete metadata for resource(s)
 
@@ -61,7 +61,8 @@ def delete(uris):
                 dataset = db.Dataset[uri]
 
                 if dataset.source == 'derived':
-                    catalog_entry_datasets = select_datasets(lambda d: d.catalog_entry == dataset.catalog_entry)
+                    catalog_entry_datasets = select_datasets(filters={'catalog_entry': dataset.catalog_entry},
+                                                             columns=['name'])
 
                     if len(catalog_entry_datasets) == 1:
                         _, _, catalog_id = util.parse_service_uri(dataset.catalog_entry)
@@ -77,7 +78,7 @@ def delete(uris):
     return True
 
 
-@add_async
+@add_async(workload='io')
 def move(uris, destination_collection, as_dataframe=None, expand=None):
 
     if not uris:                                                                                                                        
@@ -111,7 +112,7 @@ def move(uris, destination_collection, as_dataframe=None, expand=None):
     return new_datasets
 
 
-@add_async
+@add_async(workload='io')
 def copy(uris, destination_collection, as_dataframe=None, expand=None):
 
     if not uris:                                                                                                                        
@@ -4,11 +4,15 @@ get/update metadata for projects/collections/datasets.
 """
 
 import pandas as pd
+import pyarrow as pa
+from pandas.api.types import is_scalar
 
 from .. import util
 from .. import plugins
 from ..static import UriType
-from ..database import get_db, db_session, select_collections, select_datasets
+from ..database import (select_collections, select_datasets, update_collections, update_datasets,
+                        update_catalog_entries, to_dataframe)
+from ..database.database import MAX_QUERY_PARAMETERS
 
 
 def get_metadata(uris, as_dataframe=False):
@@ -49,10 +53,10 @@ def get_metadata(uris, as_dataframe=False):
                 index = util.construct_service_uri(provider, service)
                 metadata.append(pd.DataFrame(service_metadata, index=[index]))
 
-            selected_catalog_entries = grp.query('catalog_id == catalog_id').uri.tolist()
+            # only the selected catalog entries are read rather than the whole catalog of the service
+            selected_catalog_entries = grp.query('catalog_id == catalog_id').catalog_id.tolist()
             if selected_catalog_entries:
-                catalog_entries = provider_plugin.search_catalog(service)
-                catalog_entries = catalog_entries.loc[selected_catalog_entries]
+                catalog_entries = provider_plugin.get_catalog_entries(service, selected_catalog_entries)
                 metadata.append(catalog_entries)
 
     if 'publishers' in grouped_uris.groups.keys():
@@ -68,18 +72,13 @@ def get_metadata(uris, as_dataframe=False):
     if 'collections' in grouped_uris.groups.keys():
         # get metadata for collections
         tmp_df = grouped_uris.get_group('collections')
-        collections = select_collections(lambda c: c.name in tmp_df['uri'].tolist())
-        collections = pd.DataFrame(collections)
-        collections.set_index('name', inplace=True, drop=False)
-
-        metadata.append(collections)
+        metadata.append(to_dataframe(select_collections(tmp_df['uri'].tolist(), as_table=True)))
 
     if 'datasets' in grouped_uris.groups.keys():
-        tmp_df = grouped_uris.get_group('datasets')
-        datasets = select_datasets(lambda c: c.name in tmp_df['uri'].tolist())
-        datasets = pd.DataFrame(datasets)
-        datasets.set_index('name', inplace=True, drop=False)
-        metadata.append(datasets)
+        uris = grouped_uris.get_group('datasets')['uri'].tolist()
+        datasets = [select_datasets(filters={'name': {'in': uris[start:start + MAX_QUERY_PARAMETERS]}}, as_table=True)
+                    for start in range(0, len(uris), MAX_QUERY_PARAMETERS)]
+        metadata.append(to_dataframe(pa.concat_tables(datasets)))
 
     metadata = pd.concat(metadata)
 
@@ -90,12 +89,16 @@ def get_metadata(uris, as_dataframe=False):
 
 
 def update_metadata(uris, display_name=None, description=None,
-                    metadata=None, quest_metadata=None):
+                    metadata=None, quest_metadata=None, as_dataframe=False):
     """Update metadata for resource(s)
 
+    The metadata of all resources is updated in a single transaction.
+
     Args:
-        uris (string, comma separated string, or list of strings, Required):
-            list of uris to update metadata for.
+        uris (string, comma separated string, list of strings, list of dicts or pd.DataFrame, Required):
+            list of uris to update metadata for, or records of the metadata to update at each uri, either as dicts
+            with the uri as 'name' or as a DataFrame indexed by uri (e.g. from `get_metadata`) where missing values
+            are not updated.
         display_name (string or list, Optional,Default=None):
             display name for each uri
         description (string or list, Optional,Default=None):
@@ -104,32 +107,67 @@ def update_metadata(uris, display_name=None, description=None,
             user defiend metadata
         quest_metadata (dict or list of dicts, Optional, Default=None):
             metadata used by QUEST
+        as_dataframe (bool, Optional, Default=False):
+           return the updated metadata as a pandas DataFrame
     Returns:
-        metadata (dict):
-            metadata at each uri keyed on uris
+        metadata (dict or pd.DataFrame, Default=dict):
+            updated metadata at each uri keyed on uris
     """
-    db = get_db()
-    get_db_entity_funcs = {
-        UriType.COLLECTION: lambda x: db.Collection[x],
-        UriType.DATASET: lambda x: db.Dataset[x],
-        UriType.SERVICE: lambda x: db.QuestCatalog[x.split('/')[-1]],
-    }
+    updates = _metadata_records(uris)
+    if updates is None:
+        updates = _metadata_updates(util.listify(uris) or [], display_name, description, metadata, quest_metadata)
+    elif any(arg is not None for arg in [display_name, description, metadata, quest_metadata]):
+        raise ValueError('Metadata must be passed either as records or as arguments, not both')
 
     # group uris by type
-    grouped_uris = util.classify_uris(uris,
-                                      as_dataframe=True,
+    grouped_uris = util.classify_uris(list(updates),
+                                      as_dataframe=False,
                                       exclude=[UriType.PUBLISHER],
                                       require_same_type=True)
-    resource = list(grouped_uris.groups.keys())[0]
-    uris = grouped_uris.get_group(resource)
-    get_db_entity = get_db_entity_funcs[resource]
+    resource = list(grouped_uris)[0]
 
     if resource == UriType.SERVICE:
         # then make sure there are only quest catalog entries
-        if not uris.uri.apply(lambda x: 'quest' in x).all():
+        if not all('quest' in uri for uri in updates):
             raise ValueError('Metadata on service catalog entries cannot be changed.')
 
-    uris = uris.uri.tolist()
+        update_catalog_entries({uri.split('/')[-1]: fields for uri, fields in updates.items()})
+        # the metadata of catalog entries is formatted by their provider
+        return get_metadata(list(updates), as_dataframe=as_dataframe)
+
+    if resource == UriType.COLLECTION:
+        updated = update_collections(updates)
+    else:
+        updated = update_datasets(updates)
+
+    updated = pd.DataFrame(updated)
+    updated.set_index('name', inplace=True, drop=False)
+    # same types as the metadata returned by `get_metadata`
+    for c in ['created_at', 'updated_at']:
+        updated[c] = pd.to_datetime(updated[c])
+
+    if not as_dataframe:
+        updated = updated.to_dict(orient='index')
+
+    return updated
+
+
+def _metadata_records(records):
+    """Get the metadata to update keyed by uri from records, or None if `records` are uris."""
+    if isinstance(records, pd.DataFrame):
+        return {uri: {k: v for k, v in record.items() if k != 'name' and not (is_scalar(v) and pd.isnull(v))}
+                for uri, record in records.to_dict(orient='index').items()}
+
+    if isinstance(records, list) and records and all(isinstance(r, dict) for r in records):
+        if not all('name' in r for r in records):
+            raise ValueError('Each metadata record must have the uri to update as name')
+        return {r['name']: {k: v for k, v in r.items() if k != 'name'} for r in records}
+
+    return None
+
+
+def _metadata_updates(uris, display_name, description, metadata, quest_metadata):
+    """Get the metadata to update keyed by uri from the arguments of `update_metadata`."""
     n = len(uris)
     if n > 1:
         if display_name is None:
@@ -146,18 +184,19 @@ def update_metadata(uris, display_name=None, description=None,
             metadata = [metadata] * n
 
         if not isinstance(quest_metadata, list):
-                    quest_metadata = [quest_metadata] * n
+            quest_metadata = [quest_metadata] * n
     else:
         display_name = [display_name]
         description = [description]
         metadata = [metadata]
         quest_metadata = [quest_metadata]
 
+    updates = {}
     for uri, name, desc, meta, quest_meta in zip(uris, display_name,
                                                description, metadata,
                                                quest_metadata):
-        if quest_meta is None:
-            quest_meta = {}
+        # copy the metadata, which may be shared by all uris
+        quest_meta = dict(quest_meta or {})
 
         if name:
             quest_meta.update({'display_name': name})
@@ -166,8 +205,6 @@ def update_metadata(uris, display_name=None, description=None,
         if meta:
             quest_meta.update({'metadata': meta})
 
-        with db_session:
-            entity = get_db_entity(uri)
-            entity.set(**quest_meta)
+        updates[uri] = quest_meta
 
-    return get_metadata(uris)
+    return updates
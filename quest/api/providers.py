@@ -2,7 +2,7 @@
 
 Providers are inferred by aggregating information from service plugins.
 """
-from ..util import save_settings, get_settings, update_settings, parse_service_uri
+from ..util import save_settings, get_settings, update_settings, parse_service_uri, http
 from quest.database.database import get_db, db_session
 from ..plugins import load_providers
 import requests
@@ -113,7 +113,7 @@ def add_user_provider(uri):
     valid = False
     if uri.startswith('http'):
         url = uri.rstrip('/') + '/quest.yml'
-        r = requests.head(url, verify=False)
+        r = http.head(url, verify=False)
         if (r.status_code == requests.codes.ok):
             valid = True
     else:
@@ -1,53 +1,174 @@
-from concurrent.futures import CancelledError
-from functools import wraps
-from distributed import Client, LocalCluster
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from functools import partial, wraps
+from uuid import uuid4
 import psutil
 import pandas as pd
 from tornado import gen
 import sys
-from ..util import listify
+from ..util import listify, get_settings
 from ..util.log import logger
 
-_cluster = None
+try:
+    from distributed import Client, LocalCluster
+except ImportError:
+    Client = LocalCluster = None
+
+# executor (see `EXECUTORS`) and number of workers that run each type of task, used when they are not set in the quest
+# settings, which are read when the first task of the type is started
+DEFAULT_TASK_SETTINGS = {
+    'TASK_EXECUTOR': 'processes',  # cpu bound tasks, e.g. tools
+    'TASK_WORKERS': None,  # the number of cores less two, at least one
+    'TASK_IO_EXECUTOR': 'threads',  # io bound tasks, e.g. downloads
+    'TASK_IO_WORKERS': None,  # the number of cores plus four, at most 32
+}
+_WORKLOAD_SETTINGS = {'cpu': ('TASK_EXECUTOR', 'TASK_WORKERS'), 'io': ('TASK_IO_EXECUTOR', 'TASK_IO_WORKERS')}
+
+_executors = {}  # executors keyed by workload
 tasks = {}
 futures = {}
 
 
+def default_n_cores(workload='cpu'):
+    """Get the default number of workers for a type of workload.
+
+    Args:
+        workload (string, Optional, Default='cpu'): 'cpu' or 'io'.
+    Returns:
+        n_cores (int): number of workers.
+    """
+    if workload == 'io':
+        # threads that mostly wait for the network, as many as `concurrent.futures` uses by default
+        return min(32, psutil.cpu_count() + 4)
+
+    return max(1, psutil.cpu_count() - 2)
+
+
 class StartCluster():
-    def __init__(self, n_cores=None):
+    """Distributed cluster that runs tasks in worker processes or in the threads of a single worker.
+
+    Args:
+        n_cores (int, Optional, Default=None): number of worker processes or threads, see `default_n_cores`.
+        processes (bool, Optional, Default=True): if False, run tasks in threads of a worker in this process.
+    """
+
+    def __init__(self, n_cores=None, processes=True):
         if n_cores is None:
-            n_cores = psutil.cpu_count()-2
-        self.cluster = LocalCluster(processes=True, n_workers=1)
+            n_cores = default_n_cores()
+        if processes:
+            self.cluster = LocalCluster(processes=True, n_workers=n_cores, threads_per_worker=1)
+        else:
+            self.cluster = LocalCluster(processes=False, n_workers=1, threads_per_worker=n_cores)
         self.client = Client(self.cluster)
 
-    def __exit__(self, type, value, traceback):
+    def submit(self, key, fn, *args, **kwargs):
+        future = self.client.submit(fn, *args, key=key, pure=False, **kwargs)
+        self.client.loop.add_callback(add_result_when_done, future)
+        return future
+
+    def close(self):
+        self.client.close()
         self.cluster.close()
 
+    def __exit__(self, type, value, traceback):
+        self.close()
+
 
-def _get_client():
-    global _cluster
-    if _cluster is None:
-        _cluster = StartCluster()
-    return _cluster.client
+class LocalExecutor():
+    """Runs tasks in threads of this process with `concurrent.futures`, which does not require distributed.
 
+    Args:
+        n_cores (int, Optional, Default=None): number of threads, see `default_n_cores`.
+    """
+
+    def __init__(self, n_cores=None):
+        if n_cores is None:
+            n_cores = default_n_cores()
+        self.executor = ThreadPoolExecutor(max_workers=n_cores, thread_name_prefix='quest-task')
+        self._futures = set()  # futures that are not done, which are cancelled by `close`
+
+    def submit(self, key, fn, *args, **kwargs):
+        future = self.executor.submit(fn, *args, **kwargs)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        future.add_done_callback(partial(_add_result, key))
+        return future
+
+    def close(self):
+        # `shutdown(cancel_futures=True)` requires python 3.9
+        for future in list(self._futures):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+# constructors of the executors that can be selected in the TASK_EXECUTOR and TASK_IO_EXECUTOR settings
+EXECUTORS = {
+    'processes': partial(StartCluster, processes=True),
+    'threads': partial(StartCluster, processes=False),
+    'local': LocalExecutor,
+}
+
+
+def _get_executor(workload):
+    """Get the executor of a type of workload, which is started with the current settings the first time."""
+    if workload not in _executors:
+        executor_setting, workers_setting = _WORKLOAD_SETTINGS[workload]
+        settings = get_settings()
+        name = settings.get(executor_setting, DEFAULT_TASK_SETTINGS[executor_setting])
+        n_cores = settings.get(workers_setting, DEFAULT_TASK_SETTINGS[workers_setting])
+        if name not in EXECUTORS:
+            raise ValueError('{} must be one of {}, got {}'.format(executor_setting, sorted(EXECUTORS), name))
+        if name != 'local' and LocalCluster is None:
+            logger.warning('distributed is not installed, {} tasks are run by the local executor'.format(workload))
+            name = 'local'
+        _executors[workload] = EXECUTORS[name](n_cores or default_n_cores(workload))
+
+    return _executors[workload]
+
+
+def close_executors():
+    """Close the executors of all types of workload, which are started again with the current settings when needed.
+
+    Tasks that are still pending are cancelled.
+    """
+    while _executors:
+        _, executor = _executors.popitem()
+        executor.close()
+
+
+def add_async(f=None, workload='cpu'):
+    """Add an `async_tasks` keyword argument to a function, which runs the function as a task when True.
+
+    Can be used as `@add_async` or `@add_async(workload='io')`.
+
+    Args:
+        f (function): the function.
+        workload (string, Optional, Default='cpu'):
+            'cpu' or 'io', the type of workload of the function, which selects the executor that runs its tasks
+            (see `DEFAULT_TASK_SETTINGS`).
+    """
+    if f is None:
+        return partial(add_async, workload=workload)
+    if workload not in _WORKLOAD_SETTINGS:
+        raise ValueError('workload must be one of {}, got {}'.format(sorted(_WORKLOAD_SETTINGS), workload))
 
-def add_async(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         async_tasks = kwargs.pop('async_tasks', None)
         if async_tasks:
-            client = _get_client()
-            future = client.submit(f, *args, **kwargs)
-            client.loop.add_callback(add_result_when_done, future)
-            futures[future.key] = future
-            tasks[future.key] = {
+            executor = _get_executor(workload)
+            key = '{}-{}'.format(f.__name__, uuid4().hex)
+            tasks[key] = {
                 'fn': f.__name__,
                 'args': args,
                 'kwargs': kwargs,
                 'status': 'pending',
                 'result': None,
             }
-            return future.key
+            futures[key] = executor.submit(key, f, *args, **kwargs)
+            return key
         else:
             return f(*args, **kwargs)
     return wrapper
@@ -143,9 +264,8 @@ def cancel_tasks(task_ids):
        """
     task_ids = listify(task_ids)
     df = get_tasks(with_future=True, as_dataframe=True)
-    futures = df['future'][task_ids].tolist()
-    c = _get_client()
-    c.cancel(futures)
+    for future in df['future'][task_ids].tolist():
+        future.cancel()
     return
 
 
@@ -181,6 +301,22 @@ def remove_tasks(task_ids=None, status=None):
     return
 
 
+def _add_result(key, future):
+    """Set the result and status of a task that was run by a `LocalExecutor`."""
+    if key not in tasks:
+        return  # the task was removed
+
+    if future.cancelled():
+        tasks[key]['result'] = {'error_message': 'task cancelled'}
+        tasks[key]['status'] = 'cancelled'
+    elif future.exception() is not None:
+        tasks[key]['result'] = {'error_message': str(type(future.exception()))}
+        tasks[key]['status'] = 'error'
+    else:
+        tasks[key]['result'] = future.result()
+        tasks[key]['status'] = 'finished'
+
+
 @gen.coroutine
 def add_result_when_done(future):
     try:
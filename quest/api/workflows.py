@@ -4,7 +4,8 @@ from .collections import get_collections, new_collection
 from .datasets import stage_for_download, download_datasets, open_dataset
 from .catalog import search_catalog, add_datasets
 from .tools import run_tool
-from ..database import get_db, db_session
+from ..database import select_datasets
+from ..database.database import MAX_QUERY_PARAMETERS
 from ..static import DatasetStatus
 
 
@@ -157,18 +158,17 @@ def _get_cached_data(catalog_entries, download_options, collection=None):
 
     """
 
-    db = get_db()
-    with db_session:
-        datasets = db.Dataset.select(lambda d: d.catalog_entry in catalog_entries and
-                                     d.status == DatasetStatus.DOWNLOADED and
-                                     d.options == download_options
-                                     )
-        # # the last part of the query is not working for some reason so instead:
-        # datasets = [d for d in datasets if d.options == download_options]
-        if collection is not None:
-            datasets = [d for d in datasets if d.collection.name == collection]
+    filters = {'status': DatasetStatus.DOWNLOADED, 'options': download_options}
+    if collection is not None:
+        filters['collection'] = collection
 
-    return {d.catalog_entry: d.name for d in datasets}
+    catalog_entries = list(catalog_entries)
+    datasets = []
+    for start in range(0, len(catalog_entries), MAX_QUERY_PARAMETERS):
+        chunk = catalog_entries[start:start + MAX_QUERY_PARAMETERS]
+        datasets.extend(select_datasets(filters=dict(filters, catalog_entry={'in': chunk})))
+
+    return {d['catalog_entry']: d['name'] for d in datasets}
 
 
 def _get_cached_derived_data(tool_name, tool_options):
@@ -185,11 +185,9 @@ def _get_cached_derived_data(tool_name, tool_options):
         'tool_applied': tool_name,
         'tool_options': tool_options,
     }
-    db = get_db()
-    with db_session:
-        datasets = db.Dataset.select(lambda d: d.options == options)
+    datasets = select_datasets(filters={'options': options})
 
-    return [d.name for d in datasets] or None
+    return [d['name'] for d in datasets] or None
 
 
 def _is_tile_service(service_uri):
@@ -1,8 +1,17 @@
 from .database import (
     init_db,
     get_db,
+    get_backend,
     db_session,
     select_collections,
     select_datasets,
     select_catalog_entries,
+    insert_datasets,
+    update_datasets,
+    update_collections,
+    update_catalog_entries,
+    options_hash,
+    to_dataframe,
+    to_records,
+    DEFAULT_DB_SETTINGS,
 )
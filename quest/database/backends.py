@@ -0,0 +1,188 @@
+"""Storage backends that read the metadata of a project into arrow tables.
+
+Metadata is written through the pony models of `quest.database.database`. The read paths of `get_datasets`,
+`get_collections` and `get_metadata` run plain sql on the storage backend that is selected with the DB_BACKEND
+setting, which returns the result as a `pyarrow.Table` that is converted to pandas column by column rather than row
+by row.
+
+Backends keep the results of recent queries in memory until the database changes, which is detected with the sqlite
+data version, so that the changes made by other connections and processes (e.g. task workers) are seen as well.
+"""
+import abc
+from collections import OrderedDict
+from datetime import datetime
+import sqlite3
+import threading
+
+from pony.utils import datetime2timestamp
+import pyarrow as pa
+
+BACKENDS = {}  # storage backend classes keyed by the names used in the DB_BACKEND setting
+
+
+def register_backend(name, backend):
+    """Register a storage backend so that it can be selected with the DB_BACKEND setting.
+
+    Args:
+        name (string): name of the backend.
+        backend (class): subclass of `StorageBackend`.
+    """
+    BACKENDS[name] = backend
+
+
+class StorageBackend(metaclass=abc.ABCMeta):
+    """Read only access to the database of a project.
+
+    Args:
+        dbpath (string): path of the sqlite database of the project.
+        pragmas (list, Optional, Default=None): pragma statements that configure sqlite connections.
+        cache_size (int, Optional, Default=0): number of query results that are kept in memory.
+    """
+
+    def __init__(self, dbpath, pragmas=None, cache_size=0):
+        self.dbpath = dbpath
+        self.pragmas = pragmas or []
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # tables keyed by query, least recently used first
+        self._cache_version = None  # data version of the database when the cached tables were read
+        self._cache_lock = threading.Lock()
+        self._version_connection = None
+
+    def read(self, sql, params=None, schema=None):
+        """Run a select statement, unless its result is cached and the database has not changed since.
+
+        Args:
+            sql (string): select statement with quoted table and column names and ? placeholders for `params`.
+            params (list, Optional, Default=None): values of the placeholders.
+            schema (pyarrow.Schema, Optional, Default=None): types of the selected columns.
+        Returns:
+            table (pyarrow.Table): the selected rows.
+        """
+        if not self.cache_size:
+            return self._read(sql, params, schema)
+
+        key = (sql, tuple(params or []), schema)
+        with self._cache_lock:
+            version = self.data_version()
+            if version != self._cache_version:
+                self._cache.clear()
+                self._cache_version = version
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        table = self._read(sql, params, schema)
+
+        with self._cache_lock:
+            # a table read while the database changed is cached with the previous version and dropped by the next read
+            if version == self._cache_version:
+                self._cache[key] = table
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return table
+
+    def data_version(self):
+        """Get the data version of the database, which changes whenever another connection commits a change.
+
+        Returns:
+            version (int): the value of the data_version pragma of a connection that is only used to check it.
+        """
+        if self._version_connection is None:
+            self._version_connection = sqlite3.connect(self.dbpath, check_same_thread=False)
+
+        return self._version_connection.execute('PRAGMA data_version').fetchone()[0]
+
+    @abc.abstractmethod
+    def _read(self, sql, params=None, schema=None):
+        """Run a select statement (see `read`)."""
+
+    def close(self):
+        """Close the connections of the backend."""
+        with self._cache_lock:
+            self._cache.clear()
+            if self._version_connection is not None:
+                self._version_connection.close()
+                self._version_connection = None
+
+
+class SqliteBackend(StorageBackend):
+    """Reads with the sqlite3 module and builds the arrow table from the columns of the result."""
+
+    def __init__(self, dbpath, pragmas=None, cache_size=0):
+        super(SqliteBackend, self).__init__(dbpath, pragmas, cache_size)
+        self._local = threading.local()  # sqlite connections cannot be shared by threads
+        self._connections = []
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.dbpath, check_same_thread=False)
+            for pragma in self.pragmas:
+                connection.execute(pragma).fetchall()
+            self._local.connection = connection
+            self._connections.append(connection)
+
+        return connection
+
+    def _read(self, sql, params=None, schema=None):
+        # pony stores datetimes as text, which is compared with the text of the parameter
+        params = [datetime2timestamp(p) if isinstance(p, datetime) else p for p in params or []]
+        cursor = self._connect().execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        rows = cursor.fetchall()
+
+        arrays = []
+        for name, values in zip(names, zip(*rows) if rows else [[]] * len(names)):
+            data_type = None if schema is None else schema.field(name).type
+            if data_type is not None and pa.types.is_timestamp(data_type):
+                arrays.append(pa.array(values, pa.string()).cast(data_type))
+            else:
+                arrays.append(pa.array(values, data_type))
+
+        return pa.table(arrays, names=names)
+
+    def close(self):
+        super(SqliteBackend, self).close()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._local = threading.local()
+
+
+class DuckDBBackend(StorageBackend):
+    """Reads with duckdb, which scans the sqlite database with its sqlite extension and returns arrow tables directly.
+
+    Requires the duckdb package. The sqlite extension is installed by duckdb the first time it is used.
+    """
+
+    def __init__(self, dbpath, pragmas=None, cache_size=0):
+        super(DuckDBBackend, self).__init__(dbpath, pragmas, cache_size)
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError('The duckdb storage backend requires the duckdb package')
+
+        self._connection = duckdb.connect()
+        self._connection.execute('INSTALL sqlite')
+        self._connection.execute('LOAD sqlite')
+        self._connection.execute("ATTACH '{}' AS project (TYPE SQLITE, READ_ONLY)".format(dbpath.replace("'", "''")))
+
+    def _read(self, sql, params=None, schema=None):
+        # each read uses its own cursor, which can run in parallel with the reads of other threads
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute('USE project')
+            table = cursor.execute(sql, params or []).arrow()
+        finally:
+            cursor.close()
+
+        return table if schema is None else table.cast(schema)
+
+    def close(self):
+        super(DuckDBBackend, self).close()
+        self._connection.close()
+
+
+register_backend('sqlite', SqliteBackend)
+register_backend('duckdb', DuckDBBackend)
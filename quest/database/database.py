@@ -1,9 +1,79 @@
+import ast
+from contextlib import closing
 from datetime import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
 from pony import orm
 from pony.orm import db_session
+import pyarrow as pa
+import shapely.geometry
+import shapely.wkb
 import shapely.wkt
 
+from .backends import BACKENDS
+
 _connection = None  # global var to hold persistant db connection
+_connection_pid = None  # id of the process that opened `_connection`
+_backend = None  # storage backend that reads the database of `_connection`, see `get_backend`
+MAX_QUERY_PARAMETERS = 500  # maximum number of values in a single sql IN clause
+SCHEMA_VERSION = 2  # revision of the database schema, stored in the sqlite user_version pragma
+
+# database settings used when they are not set in the quest settings
+DEFAULT_DB_SETTINGS = {
+    'DB_BACKEND': 'sqlite',  # storage backend that reads datasets and collections, see `quest.database.backends`
+    'DB_READ_CACHE_SIZE': 32,  # number of query results kept in memory by the storage backend, 0 disables the cache
+    'DB_JOURNAL_MODE': 'WAL',  # lets the task workers read while another process writes
+    'DB_SYNCHRONOUS': 'NORMAL',
+    'DB_MMAP_SIZE': 256 * 2 ** 20,  # bytes
+    'DB_BUSY_TIMEOUT': 30000,  # milliseconds to wait for a lock held by another connection
+}
+_JOURNAL_MODES = ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF']
+_SYNCHRONOUS_LEVELS = ['OFF', 'NORMAL', 'FULL', 'EXTRA']
+
+# dataset fields that are returned by `select_datasets`
+DATASET_FIELDS = [
+    'name', 'display_name', 'description', 'created_at', 'metadata', 'updated_at', 'parameter', 'unit', 'datatype',
+    'file_format', 'source', 'options', 'status', 'message', 'file_path', 'visualization_path', 'collection',
+    'catalog_entry',
+]
+# dataset fields that `select_datasets` can filter on in sql, options are matched by their hash
+DATASET_QUERY_FIELDS = [
+    'name', 'display_name', 'description', 'created_at', 'updated_at', 'unit', 'datatype', 'file_format', 'source',
+    'status', 'message', 'file_path', 'visualization_path', 'collection', 'catalog_entry', 'options',
+]
+# collection fields that are returned by `select_collections`
+COLLECTION_FIELDS = ['name', 'display_name', 'description', 'created_at', 'updated_at', 'metadata']
+_JSON_FIELDS = ['metadata', 'parameter', 'options']
+_SQL_OPERATORS = {'==': '=', '!=': '<>', '>': '>', '>=': '>=', '<': '<', '<=': '<=', 'in': 'IN', 'not in': 'NOT IN'}
+_MAX_LIMIT = 2 ** 63 - 1  # sql limit of an offset without a limit
+_QUERY_OPERATORS = {
+    ast.Eq: '==', ast.NotEq: '!=', ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<=', ast.In: 'in',
+    ast.NotIn: 'not in',
+}
+_FLIPPED_OPERATORS = {'>': '<', '>=': '<=', '<': '>', '<=': '>='}
+_BBOX_FIELDS = ['minx', 'miny', 'maxx', 'maxy']
+
+# r*tree of the bounding boxes of quest catalog entry geometries, which is kept up to date by triggers
+_SPATIAL_INDEX_SQL = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS "QuestCatalog_rtree" USING rtree(id, minx, maxx, miny, maxy, +service_id)',
+    """CREATE TRIGGER IF NOT EXISTS "QuestCatalog_rtree_insert" AFTER INSERT ON "QuestCatalog"
+    WHEN NEW."minx" IS NOT NULL BEGIN
+        INSERT INTO "QuestCatalog_rtree" (minx, maxx, miny, maxy, service_id)
+        VALUES (NEW."minx", NEW."maxx", NEW."miny", NEW."maxy", NEW."service_id");
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "QuestCatalog_rtree_update"
+    AFTER UPDATE OF "service_id", "minx", "miny", "maxx", "maxy" ON "QuestCatalog" BEGIN
+        DELETE FROM "QuestCatalog_rtree" WHERE service_id = OLD."service_id";
+        INSERT INTO "QuestCatalog_rtree" (minx, maxx, miny, maxy, service_id)
+        SELECT NEW."minx", NEW."maxx", NEW."miny", NEW."maxy", NEW."service_id" WHERE NEW."minx" IS NOT NULL;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "QuestCatalog_rtree_delete" AFTER DELETE ON "QuestCatalog" BEGIN
+        DELETE FROM "QuestCatalog_rtree" WHERE service_id = OLD."service_id";
+    END""",
+]
 
 
 def define_models(db):
@@ -31,24 +101,30 @@ def define_models(db):
         display_name = orm.Optional(str)
         description = orm.Optional(str, nullable=True)
         created_at = orm.Required(datetime, default=datetime.now())
-        metadata = orm.Optional(orm.Json)
+        metadata = orm.Optional(orm.Json, nullable=True)
         updated_at = orm.Optional(datetime)
 
         # dataset - metadata
-        parameter = orm.Optional(orm.Json)
+        parameter = orm.Optional(orm.Json, nullable=True)
         unit = orm.Optional(str)
         datatype = orm.Optional(str)
         file_format = orm.Optional(str)
-        source = orm.Optional(str)
-        options = orm.Optional(orm.Json)
-        status = orm.Optional(str)
+        source = orm.Optional(str, index=True)
+        options = orm.Optional(orm.Json, nullable=True)
+        options_hash = orm.Optional(str, nullable=True, index=True)  # see `options_hash`
+        status = orm.Optional(str, index=True)
         message = orm.Optional(str)
         file_path = orm.Optional(str, nullable=True)
         visualization_path = orm.Optional(str)
 
         # setup relationships
         collection = orm.Required(Collection)
-        catalog_entry = orm.Required(str)
+        catalog_entry = orm.Required(str, index=True)
+
+        def before_insert(self):
+            self.options_hash = options_hash(self.options)
+
+        before_update = before_insert
 
     class Providers(db.Entity):
         provider = orm.PrimaryKey(str)
@@ -59,8 +135,19 @@ def define_models(db):
         service_id = orm.PrimaryKey(str)
         created_at = orm.Required(datetime, default=datetime.now())
         updated_at = orm.Optional(datetime)
-        metadata = orm.Optional(orm.Json)
-        geometry = orm.Optional(orm.Json)
+        metadata = orm.Optional(orm.Json, nullable=True)
+        geometry = orm.Optional(bytes, nullable=True)  # wkb
+
+        # bounding box of the geometry, see `_SPATIAL_INDEX_SQL`
+        minx = orm.Optional(float, nullable=True)
+        miny = orm.Optional(float, nullable=True)
+        maxx = orm.Optional(float, nullable=True)
+        maxy = orm.Optional(float, nullable=True)
+
+        def before_insert(self):
+            self.set(**_geometry_bounds(self.geometry))
+
+        before_update = before_insert
 
 
 def get_db(dbpath=None, reconnect=False):
@@ -78,75 +165,559 @@ def get_db(dbpath=None, reconnect=False):
        Returns:
            database (object):
                database object
+
+       Notes:
+           Each process has its own connection, so a process that is forked (e.g. a task worker) reconnects to the
+           database rather than sharing the connection of its parent.
        """
-    global _connection
+    global _connection, _connection_pid, _backend
     if _connection:
-        if reconnect is False:
+        if _connection_pid != os.getpid():
+            # the connection belongs to the parent process, which is still using it
+            _connection = None
+        elif reconnect is False:
             return _connection
         else:
             _connection.disconnect()
+            if _backend is not None:
+                _backend.close()
+    _backend = None
 
     if dbpath is None:
         from ..api.projects import active_db
         dbpath = active_db()
 
     _connection = init_db(dbpath)
+    _connection_pid = os.getpid()
 
     return _connection
 
 
+def get_backend():
+    """Get the storage backend that reads the database of the active project.
+
+    The backend is selected with the DB_BACKEND setting (see `quest.database.backends`) and keeps the results of
+    the last DB_READ_CACHE_SIZE queries until the database changes.
+
+    Returns:
+        backend (StorageBackend):
+            backend of the database returned by `get_db`
+    """
+    global _backend
+    db = get_db()
+    if _backend is None:
+        from ..util.config import get_settings
+        settings = dict(DEFAULT_DB_SETTINGS, **{k: v for k, v in get_settings().items() if k in DEFAULT_DB_SETTINGS})
+        name = settings['DB_BACKEND']
+        if name not in BACKENDS:
+            raise ValueError('DB_BACKEND must be one of {}, got {}'.format(sorted(BACKENDS), name))
+        _backend = BACKENDS[name](db.provider.pool.filename, _pragmas(), int(settings['DB_READ_CACHE_SIZE']))
+
+    return _backend
+
+
 def init_db(dbpath):
     """
     Args:
     Returns:
     """
+    pragmas = _pragmas()
+    _migrate(dbpath, pragmas)  # upgrade the schema of existing databases before the models are mapped
     db = orm.Database()  # create new database object
     define_models(db)  # define entities for this database
+
+    @db.on_connect(provider='sqlite')
+    def configure_connection(db, connection):
+        _configure_connection(connection, pragmas)
+
     db.bind('sqlite', dbpath, create_db=True)  # bind this database
     db.generate_mapping(create_tables=True)
+    with db_session(ddl=True):
+        for sql in _SPATIAL_INDEX_SQL:
+            db.execute(sql)
 
     return db
 
 
-def select_collections(select_func=None):
+def options_hash(options):
+    """Get a hash of the canonical json representation of dataset options.
+
+    The hash is stored with each dataset so that datasets with the same options can be found with an index.
+
+    Args:
+        options (dict): dataset options.
+
+    Returns:
+        A hex digest that is the same for options that are equal regardless of the order of their keys.
+    """
+    canonical = json.dumps(options, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def _pragmas():
+    """Get the pragma statements that configure each connection from the DB_* settings (see `DEFAULT_DB_SETTINGS`)."""
+    from ..util.config import get_settings
+    settings = dict(DEFAULT_DB_SETTINGS, **{k: v for k, v in get_settings().items() if k in DEFAULT_DB_SETTINGS})
+
+    journal_mode = str(settings['DB_JOURNAL_MODE']).upper()
+    if journal_mode not in _JOURNAL_MODES:
+        raise ValueError('DB_JOURNAL_MODE must be one of {}, got {}'.format(_JOURNAL_MODES, journal_mode))
+    synchronous = str(settings['DB_SYNCHRONOUS']).upper()
+    if synchronous not in _SYNCHRONOUS_LEVELS:
+        raise ValueError('DB_SYNCHRONOUS must be one of {}, got {}'.format(_SYNCHRONOUS_LEVELS, synchronous))
+
+    # the busy timeout is set first so that changing the journal mode waits for other connections
+    return [
+        'PRAGMA busy_timeout = {:d}'.format(int(settings['DB_BUSY_TIMEOUT'])),
+        'PRAGMA journal_mode = {}'.format(journal_mode),
+        'PRAGMA synchronous = {}'.format(synchronous),
+        'PRAGMA mmap_size = {:d}'.format(int(settings['DB_MMAP_SIZE'])),
+    ]
+
+
+def _configure_connection(connection, pragmas):
+    for pragma in pragmas:
+        connection.execute(pragma).fetchall()
+
+
+def _migrate(dbpath, pragmas=()):
+    """Upgrade the schema of a database to `SCHEMA_VERSION` by applying each migration in a single transaction."""
+    if dbpath == ':memory:':
+        return
+
+    with closing(sqlite3.connect(dbpath, isolation_level=None)) as conn:
+        _configure_connection(conn, pragmas)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+
+        # take the write lock before checking the version again, so only one process applies the migrations
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise ValueError('Database {} has schema version {} which is newer than the supported version {}'
+                                 .format(dbpath, version, SCHEMA_VERSION))
+            # new databases are created with the current schema by pony
+            if _tables(conn):
+                for migration in _MIGRATIONS[version:]:
+                    migration(conn)
+            conn.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def _migration_1(conn):
+    """Make the json fields nullable, add the options hash and index the dataset fields that are queried."""
+    tables = _tables(conn)
+    schema = _model_schema()
+    for table in ['Dataset', 'QuestCatalog']:
+        if table in tables:
+            _rebuild_table(conn, table, schema)
+
+    if 'Dataset' in tables:
+        rows = conn.execute('SELECT "name", "options" FROM "Dataset"').fetchall()
+        conn.executemany('UPDATE "Dataset" SET "options_hash" = ? WHERE "name" = ?',
+                         [(options_hash(None if options is None else json.loads(options)), name)
+                          for name, options in rows])
+
+
+def _migration_2(conn):
+    """Store quest catalog geometries as wkb and index their bounding boxes with an r*tree."""
+    if 'QuestCatalog' not in _tables(conn):
+        return
+
+    _rebuild_table(conn, 'QuestCatalog', _model_schema())
+    updates = []
+    for service_id, geometry in conn.execute('SELECT "service_id", "geometry" FROM "QuestCatalog"').fetchall():
+        geometry = None if geometry is None else json.loads(geometry)
+        if isinstance(geometry, str):
+            geometry = shapely.wkt.loads(geometry)
+        elif isinstance(geometry, dict):
+            geometry = shapely.geometry.shape(geometry)
+        geometry = None if geometry is None else geometry.wkb
+        bounds = _geometry_bounds(geometry)
+        updates.append([geometry] + [bounds[k] for k in _BBOX_FIELDS] + [service_id])
+    conn.executemany('UPDATE "QuestCatalog" SET "geometry" = ?, {} WHERE "service_id" = ?'
+                     .format(', '.join('"{}" = ?'.format(k) for k in _BBOX_FIELDS)), updates)
+
+    for sql in _SPATIAL_INDEX_SQL:
+        conn.execute(sql)
+    conn.execute('INSERT INTO "QuestCatalog_rtree" (minx, maxx, miny, maxy, service_id) '
+                 'SELECT "minx", "maxx", "miny", "maxy", "service_id" FROM "QuestCatalog" WHERE "minx" IS NOT NULL')
+
+
+_MIGRATIONS = [_migration_1, _migration_2]  # the migration to version n is _MIGRATIONS[n - 1]
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _model_schema():
+    """Get the sql that pony uses to create the tables and indexes of the current models keyed by table."""
+    db = orm.Database()
+    define_models(db)
+    db.bind('sqlite', ':memory:')
+    db.generate_mapping(create_tables=True)
+    schema = {}
+    with db_session:
+        for table, sql in db.select('tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY type DESC'):
+            schema.setdefault(table, []).append(sql)
+    db.disconnect()
+
+    return schema
+
+
+def _rebuild_table(conn, table, schema):
+    """Recreate a table with the schema of the current models, keeping the values of the columns it still has."""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info("{}")'.format(table))]
+    create_table, indexes = schema[table][0], schema[table][1:]
+    conn.execute(create_table.replace('"{}"'.format(table), '"{}_new"'.format(table), 1))
+    new_columns = [row[1] for row in conn.execute('PRAGMA table_info("{}_new")'.format(table))]
+    shared = ', '.join('"{}"'.format(c) for c in columns if c in new_columns)
+    conn.execute('INSERT INTO "{0}_new" ({1}) SELECT {1} FROM "{0}"'.format(table, shared))
+    conn.execute('DROP TABLE "{}"'.format(table))
+    conn.execute('ALTER TABLE "{0}_new" RENAME TO "{0}"'.format(table))
+    for sql in indexes:
+        conn.execute(sql)
+
+
+def select_collections(names=None, as_table=False):
+    """
+    Args:
+        names (list, Optional, Default=None): names of the collections to select, all collections if None.
+        as_table (bool, Optional, Default=False):
+            return a `pyarrow.Table` in which json fields are json strings (see `to_dataframe`) rather than a list
+    Returns:
+        collections (list of dicts or pyarrow.Table): all of `COLLECTION_FIELDS` of each selected collection.
+    """
+    db = get_db()
+    params = []
+    sql = 'SELECT {} FROM "Collection"'.format(', '.join('"{}"'.format(c) for c in COLLECTION_FIELDS))
+    if names is not None:
+        sql += ' WHERE ' + _field_condition(db, 'name', 'in', list(names), params, entity=db.Collection)
+
+    table = get_backend().read(sql, params, _arrow_schema(db.Collection, COLLECTION_FIELDS))
+
+    return table if as_table else to_records(table)
+
+
+def select_datasets(filters=None, queries=None, columns=None, limit=None, offset=None, as_table=False):
+    """
+    Args:
+        filters (dict, Optional, Default=None):
+            values that the fields of the datasets must be equal to, or dicts of comparison operators
+            (e.g. {'>=': start, '<': end} or {'in': [...]}), which are evaluated in sql (see `is_dataset_filter`).
+            Options are matched by their hash.
+        queries (list, Optional, Default=None):
+            boolean expressions of dataset fields in the syntax of `pandas.DataFrame.query` that datasets must match,
+            which are evaluated in sql (see `is_dataset_query`).
+        columns (list, Optional, Default=None): fields of the datasets to return, all of `DATASET_FIELDS` if None.
+        limit (int, Optional, Default=None): maximum number of datasets to return, ordered by name.
+        offset (int, Optional, Default=None): number of datasets, ordered by name, to skip.
+        as_table (bool, Optional, Default=False):
+            return a `pyarrow.Table` in which json fields are json strings (see `to_dataframe`) rather than a list
+    Returns:
+        datasets (list of dicts or pyarrow.Table): the requested fields of each matching dataset.
+    """
+    columns = DATASET_FIELDS if columns is None else columns
+    unknown = [c for c in columns if c not in DATASET_FIELDS]
+    if unknown:
+        raise ValueError('Unknown dataset fields: {}'.format(', '.join(unknown)))
+
+    db = get_db()
+    params = []  # values of the ? placeholders of the conditions in the order of the placeholders
+    conditions = []
+    for k, v in (filters or {}).items():
+        condition = _filter_condition(db, k, v, params)
+        if condition is None:
+            raise ValueError('Datasets cannot be filtered by {}={!r} in the database'.format(k, v))
+        conditions.append(condition)
+    for query in queries or []:
+        condition = _query_condition(db, query, params)
+        if condition is None:
+            raise ValueError('Query {!r} cannot be evaluated in the database'.format(query))
+        conditions.append(condition)
+
+    names = ['name'] + [c for c in columns if c != 'name']
+    sql = 'SELECT {} FROM "Dataset"'.format(', '.join('"{}"'.format(c) for c in names))
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join('({})'.format(c) for c in conditions)
+    if limit is not None or offset is not None:
+        sql += ' ORDER BY "name" LIMIT {:d} OFFSET {:d}'.format(_MAX_LIMIT if limit is None else limit, offset or 0)
+
+    table = get_backend().read(sql, params, _arrow_schema(db.Dataset, names)).select(columns)
+
+    return table if as_table else to_records(table)
+
+
+def to_dataframe(table, index='name'):
+    """Convert a table returned by `select_datasets` or `select_collections` to a DataFrame.
+
+    Args:
+        table (pyarrow.Table): the table.
+        index (string, Optional, Default='name'): column to use as index, which is kept as a column as well.
+    Returns:
+        A DataFrame with the decoded values of json fields.
+    """
+    df = table.to_pandas(split_blocks=True)
+    for c in _JSON_FIELDS:
+        if c in df:
+            df[c] = [None if v is None else json.loads(v) for v in df[c]]
+    if index in df:
+        df.set_index(index, inplace=True, drop=False)
+
+    return df
+
+
+def to_records(table):
+    """Convert a table returned by `select_datasets` or `select_collections` to a list of dicts.
+
+    Args:
+        table (pyarrow.Table): the table.
+    Returns:
+        A list of dicts with the decoded values of json fields.
+    """
+    names = table.column_names
+    columns = []
+    for name in names:
+        # numpy converts a whole column to python objects much faster than arrow converts each value
+        values = table.column(name).to_numpy(zero_copy_only=False)
+        if pa.types.is_timestamp(table.schema.field(name).type):
+            values = values.astype(object)  # datetimes, and None rather than NaT
+        values = values.tolist()
+        if name in _JSON_FIELDS:
+            values = [None if v is None else json.loads(v) for v in values]
+        columns.append(values)
+
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _arrow_schema(entity, fields):
+    """Get the arrow types of fields of a model, where json is read as strings and references as primary keys."""
+    types = {datetime: pa.timestamp('us'), float: pa.float64(), bytes: pa.binary()}
+    attrs = entity._adict_
+    return pa.schema([(f, pa.string() if attrs[f].is_relation else types.get(attrs[f].py_type, pa.string()))
+                      for f in fields])
+
+
+def is_dataset_filter(field, value):
+    """Check if a dataset filter can be evaluated in the database by `select_datasets`.
+
+    Args:
+        field (string): dataset field.
+        value: value that the field must be equal to, or dict of comparison operators.
+    Returns:
+        True if the filter can be evaluated in sql.
     """
+    return _filter_condition(get_db(), field, value, []) is not None
+
+
+def is_dataset_query(query):
+    """Check if a query can be evaluated in the database by `select_datasets`.
+
+    Queries that compare dataset fields with literal values (e.g. "status == 'downloaded' and datatype in ['raster']")
+    are translated to sql. Other queries, e.g. ones that use local variables or compare two fields, are not.
+
     Args:
+        query (string): boolean expression in the syntax of `pandas.DataFrame.query`.
     Returns:
+        True if the query can be evaluated in sql.
+    """
+    return _query_condition(get_db(), query, []) is not None
+
+
+def _filter_condition(db, field, value, params):
+    """Get the sql condition of a dataset filter, or None if it cannot be evaluated in sql."""
+    from ..util.catalog_cache import is_operator_filter
+
+    if field == 'options':
+        params.append(options_hash(value))
+        return '"options_hash" = ?'
+
+    if is_operator_filter(value):
+        conditions = [_field_condition(db, field, op, v, params) for op, v in value.items()]
+        return None if None in conditions else ' AND '.join(conditions)
+
+    return _field_condition(db, field, '==', value, params)
+
+
+def _field_condition(db, field, op, value, params, entity=None):
+    """Get the sql condition comparing a field with a value, or None if it cannot be evaluated in sql.
+
+    The field is a dataset field unless another entity is given.
+    """
+    if entity is None:
+        if field not in DATASET_QUERY_FIELDS or field == 'options':
+            return None
+        entity = db.Dataset
+
+    attr = entity._adict_[field]
+    py_type = str if attr.is_relation else attr.py_type
+    # sql comparisons with null are never true, which only agrees with pandas for equality
+    if attr.nullable and op not in ['==', 'in']:
+        return None
+    is_list = isinstance(value, (list, tuple, set))
+    if is_list != (op in ['in', 'not in']):
+        return None
+    if not all(isinstance(v, py_type) for v in (value if is_list else [value])):
+        return None
+
+    if not is_list:
+        params.append(value)
+        return '"{}" {} ?'.format(field, _SQL_OPERATORS[op])
+    if not value:
+        return '1 = 0' if op == 'in' else '1 = 1'
+    params.extend(value)
+    return '"{}" {} ({})'.format(field, _SQL_OPERATORS[op], ', '.join(['?'] * len(value)))
+
+
+def _query_condition(db, query, params):
+    """Translate a `pandas.DataFrame.query` expression to a sql condition, or None if it cannot be evaluated in sql."""
+    try:
+        tree = ast.parse(query.strip(), mode='eval').body
+    except (SyntaxError, ValueError):
+        return None
+
+    def translate(node):
+        if isinstance(node, ast.BoolOp) or (isinstance(node, ast.BinOp) and
+                                            isinstance(node.op, (ast.BitAnd, ast.BitOr))):
+            is_and = isinstance(node.op, (ast.And, ast.BitAnd))
+            operands = node.values if isinstance(node, ast.BoolOp) else [node.left, node.right]
+            conditions = [translate(n) for n in operands]
+            if None in conditions:
+                return None
+            return (' AND ' if is_and else ' OR ').join('({})'.format(c) for c in conditions)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            condition = translate(node.operand)
+            return None if condition is None else 'NOT ({})'.format(condition)
+
+        if isinstance(node, ast.Compare):
+            operands = [node.left] + node.comparators
+            conditions = [compare(left, type(op), right) for left, op, right in zip(operands, node.ops, operands[1:])]
+            return None if None in conditions else ' AND '.join(conditions)
+
+        return None
+
+    def compare(left, op, right):
+        op = _QUERY_OPERATORS.get(op)
+        if op is None:
+            return None
+        if not isinstance(left, ast.Name):
+            if op not in _FLIPPED_OPERATORS and op not in ['==', '!=']:
+                return None
+            left, right, op = right, left, _FLIPPED_OPERATORS.get(op, op)
+        if not isinstance(left, ast.Name) or left.id not in DATASET_QUERY_FIELDS:
+            return None
+        # negated conditions on nullable fields would not agree with pandas
+        if db.Dataset._adict_[left.id].nullable:
+            return None
+        try:
+            value = ast.literal_eval(right)
+        except (ValueError, TypeError, SyntaxError):
+            return None
+
+        return _field_condition(db, left.id, op, value, params)
+
+    return translate(tree)
+
+
+def insert_datasets(datasets):
+    """Insert datasets in a single transaction.
+
+    Args:
+        datasets (list of dicts): field values of each dataset where the collection is given by its name.
     """
     db = get_db()
     with db_session:
-        if select_func is None:
-            collections = db.Collection.select()
-        else:
-            collections = db.Collection.select(select_func)
+        for dataset in datasets:
+            db.Dataset(**dataset)
 
+
+def update_datasets(updates):
+    """Update the fields of datasets in a single transaction.
+
+    Args:
+        updates (dict): field values to set keyed by dataset name.
+    Returns:
+        datasets (list of dicts): all of `DATASET_FIELDS` of each updated dataset, as returned by `select_datasets`.
+    """
+    db = get_db()
+    with db_session:
+        datasets = _update_entities(db.Dataset, updates)
+        return [{k: _convert_to_dict(v) if k in _JSON_FIELDS else v
+                 for k, v in d.to_dict(only=DATASET_FIELDS).items()} for d in datasets]
+
+
+def update_collections(updates):
+    """Update the fields of collections in a single transaction.
+
+    Args:
+        updates (dict): field values to set keyed by collection name.
+    Returns:
+        collections (list of dicts): the updated collections, as returned by `select_collections`.
+    """
+    db = get_db()
+    with db_session:
+        collections = _update_entities(db.Collection, updates)
         return [dict(c.to_dict(), **{'metadata': _convert_to_dict(c.metadata)
                                      }
                      ) for c in collections]
 
 
-def select_datasets(select_func=None):
-    """
+def update_catalog_entries(updates):
+    """Update the fields of quest catalog entries in a single transaction.
+
     Args:
+        updates (dict):
+            field values to set keyed by service id, where geometries can be given as wkt strings, wkb or shapely
+            geometries.
     Returns:
+        catalog_entries (list of dicts): the updated catalog entries, as returned by `select_catalog_entries`.
     """
+    updates = {k: dict(v, geometry=_to_wkb(v['geometry'])) if 'geometry' in v else v for k, v in updates.items()}
     db = get_db()
     with db_session:
-        if select_func is None:
-            datasets = db.Dataset.select()
-        else:
-            datasets = db.Dataset.select(select_func)
+        catalog_entries = _update_entities(db.QuestCatalog, updates)
+        return [dict(e.to_dict(exclude=_BBOX_FIELDS),
+                     **{'geometry': None if e.geometry is None else shapely.wkb.loads(e.geometry),
+                        'metadata': _convert_to_dict(e.metadata),
+                        }
+                     ) for e in catalog_entries]
 
-        return [dict(d.to_dict(), **{'collection': d.collection.name,
-                                     'options': _convert_to_dict(d.options),
-                                     'metadata': _convert_to_dict(d.metadata),
-                                     }
-                     ) for d in datasets]
 
+def _update_entities(entity, updates):
+    """Set the fields of entities keyed by primary key and flush the changes once (within a db_session).
+
+    Returns:
+        entities (list): the updated entities in the order of `updates`.
+    """
+    keys = list(updates)
+    key_attr = entity._pk_attrs_[0].name
+    # load the entities with a few queries rather than one query per entity
+    for start in range(0, len(keys), MAX_QUERY_PARAMETERS):
+        chunk = keys[start:start + MAX_QUERY_PARAMETERS]
+        entity.select().filter('lambda e: e.{} in chunk'.format(key_attr))[:]
+
+    entities = [entity[key] for key in keys]
+    for e, fields in zip(entities, updates.values()):
+        e.set(**fields)
+    orm.flush()
+
+    return entities
 
-def select_catalog_entries(select_func=None):
+
+def select_catalog_entries(select_func=None, bbox=None):
     """
     Args:
+        select_func (function, Optional, Default=None): pony query function that catalog entries must match.
+        bbox (list or string, Optional, Default=None):
+            bounding box (xmin, ymin, xmax, ymax) that the bounding boxes of the geometries of the catalog entries
+            must intersect, which is evaluated with the r*tree index.
     Returns:
     """
     db = get_db()
@@ -156,12 +727,54 @@ def select_catalog_entries(select_func=None):
         else:
             catalog_entries = db.QuestCatalog.select(select_func)
 
-        return [dict(e.to_dict(), **{'geometry': None if e.geometry is None else shapely.wkt.loads(e.geometry),
-                                     'metadata': _convert_to_dict(e.metadata),
-                                     }
+        if bbox is not None:
+            service_ids = _bbox_service_ids(db, bbox)
+            selected = []
+            for start in range(0, len(service_ids), MAX_QUERY_PARAMETERS):
+                chunk = service_ids[start:start + MAX_QUERY_PARAMETERS]
+                selected.extend(catalog_entries.filter(lambda e: e.service_id in chunk))
+            catalog_entries = selected
+
+        return [dict(e.to_dict(exclude=_BBOX_FIELDS),
+                     **{'geometry': None if e.geometry is None else shapely.wkb.loads(e.geometry),
+                        'metadata': _convert_to_dict(e.metadata),
+                        }
                      ) for e in catalog_entries]
 
 
+def _bbox_service_ids(db, bbox):
+    """Get the ids of the quest catalog entries with bounding boxes that intersect a bbox filter from the r*tree."""
+    from ..util.catalog_cache import bbox_parts
+    service_ids = set()
+    for part in bbox_parts(bbox):
+        xmin, ymin, xmax, ymax = part.bounds
+        service_ids.update(db.select('service_id FROM "QuestCatalog_rtree" '
+                                     'WHERE minx <= $xmax AND maxx >= $xmin AND miny <= $ymax AND maxy >= $ymin'))
+
+    return sorted(service_ids)
+
+
+def _to_wkb(geometry):
+    """Convert a wkt string or shapely geometry to wkb (which is returned unchanged)."""
+    if isinstance(geometry, str):
+        geometry = shapely.wkt.loads(geometry)
+    if hasattr(geometry, 'wkb'):
+        geometry = geometry.wkb
+
+    return geometry
+
+
+def _geometry_bounds(geometry):
+    """Get the bounding box fields of a wkb geometry, which are None for missing or empty geometries."""
+    bounds = [None] * len(_BBOX_FIELDS)
+    if geometry is not None:
+        geometry = shapely.wkb.loads(geometry)
+        if not geometry.is_empty:
+            bounds = geometry.bounds
+
+    return dict(zip(_BBOX_FIELDS, bounds))
+
+
 def _convert_to_dict(tracked_dict):
     """
     Recursively convert a Pony ORM TrackedDict to a normal Python dict
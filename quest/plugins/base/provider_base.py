@@ -1,6 +1,7 @@
 import abc
 
 from ...database import get_db, db_session
+from ...util import http
 
 
 class ProviderBase(metaclass=abc.ABCMeta):
@@ -44,6 +45,11 @@ class ProviderBase(metaclass=abc.ABCMeta):
             }
         }
 
+    @property
+    def http(self):
+        """Shared http session of the providers, see `quest.util.http`."""
+        return http.get_session()
+
     @property
     def credentials(self):
         if self._credentials is None:
@@ -60,7 +66,8 @@ class ProviderBase(metaclass=abc.ABCMeta):
     def __init__(self, name=None, use_cache=None, update_frequency='M'):
         self.name = name or self.name
         self.use_cache = use_cache or self.use_cache
-        self.update_frequency = update_frequency  # not implemented
+        # pandas frequency string (e.g. 'D', 'W', 'M') for refreshing cached catalogs, None to never refresh
+        self.update_frequency = update_frequency
         self._services = None
         self._publishers = None
         self._credentials = None
@@ -73,8 +80,18 @@ class ProviderBase(metaclass=abc.ABCMeta):
         """
         return self.services[service].search_catalog_wrapper(update_cache=update_cache, **kwargs)
 
-    def get_tags(self, service, update_cache=False):
-        return self.services[service].get_tags(update_cache=update_cache)
+    def search_catalog_chunks(self, service, chunksize, update_cache=False, **kwargs):
+        """Get catalog_entries associated with service in chunks of at most `chunksize` entries.
+        """
+        return self.services[service].search_catalog_chunks(chunksize, update_cache=update_cache, **kwargs)
+
+    def get_catalog_entries(self, service, catalog_ids, update_cache=False):
+        """Get the catalog entries of a service with the given catalog ids.
+        """
+        return self.services[service].get_catalog_entries(catalog_ids, update_cache=update_cache)
+
+    def get_tags(self, service, update_cache=False, prefix=None):
+        return self.services[service].get_tags(update_cache=update_cache, prefix=prefix)
 
     def get_services(self):
         return {k: v.metadata for k, v in self.services.items()}
@@ -1,14 +1,18 @@
-import json
+import collections
+import copy
 import os
-import pickle
+import threading
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import param
+import shapely
 import ulmo
-from shapely.geometry import box, Point
 
 from ... import util
+from ...util import http
+from ...util.catalog_cache import CatalogCache, categorize, tag_counts
 
 
 reserved_catalog_entry_fields = [
@@ -34,6 +38,8 @@ reserved_geometry_fields = [
 
 reserved_catalog_entry_fields.extend(reserved_geometry_fields)
 
+MAX_CACHED_CATALOG_ENTRIES = 10000  # catalog entries kept in memory by `get_catalog_entries` for each service
+
 
 class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have it be a Paramitarized?
     """Base class for data providers
@@ -48,12 +54,17 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
     geographical_areas = None
     bounding_boxes = None
     _parameter_map = None
+    max_catalog_merges = None  # updates merged into the catalog cache before it is rebuilt, None for no limit
 
     # name = param.String(default='Service', precedence=-1)
 
     def __init__(self, provider, **kwargs):
         self.provider = provider
         super(ServiceBase, self).__init__(**kwargs)
+        # catalog entries looked up by `get_catalog_entries` keyed by catalog id for the current cache build
+        self._catalog_entries = collections.OrderedDict()
+        self._catalog_entries_build = None
+        self._catalog_entries_lock = threading.Lock()
 
     @property
     def title(self):
@@ -63,6 +74,10 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
     def use_cache(self):
         return self.provider.use_cache
 
+    @property
+    def catalog_cache(self):
+        return CatalogCache(self.provider.name, self.name)
+
     @property
     def metadata(self):
         return {
@@ -123,6 +138,8 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
         return schema
 
     def download(self, catalog_id, file_path, dataset, **kwargs):
+        # downloads of the same service run at the same time in threads (see `quest.util.download`), so the download
+        # options must be kept in local variables rather than set on the service
         raise NotImplementedError()
 
     def search_catalog_wrapper(self, update_cache=False, **kwargs):
@@ -131,34 +148,180 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
         Take a series of query parameters and return a list of
         locations as a geojson python dictionary
         """
-        cache_file = os.path.join(util.get_cache_dir(self.provider.name), self.name + '_catalog.p')
         if self.use_cache and not update_cache:
             try:
-                catalog_entries = pd.read_pickle(cache_file)
-                self._label_catalog_entries(catalog_entries)
+                if self._refresh_catalog_cache():
+                    # filters that can be evaluated on the cache are pushed down so only matching rows are loaded
+                    catalog_entries = self.catalog_cache.read(filters=kwargs)
+                    self._label_catalog_entries(catalog_entries)
 
-                # convert to GeoPandas GeoDataFrame
-                catalog_entries = gpd.GeoDataFrame(catalog_entries, geometry='geometry')
+                    # convert to GeoPandas GeoDataFrame
+                    catalog_entries = gpd.GeoDataFrame(catalog_entries, geometry='geometry')
 
-                return catalog_entries
+                    return catalog_entries
             except Exception as e:
                 util.logger.info(e)
-                util.logger.info('updating cache')
+            util.logger.info('updating cache')
 
+        built = pd.Timestamp.now(tz='UTC')
         catalog_entries = self.search_catalog(**kwargs)
+        catalog_entries = self._normalize_catalog_entries(catalog_entries)
+        self._set_catalog_parameters(catalog_entries)
+        categorize(catalog_entries)
+
+        if self.use_cache:
+            self.catalog_cache.write(catalog_entries, built=built)
+
+        self._label_catalog_entries(catalog_entries)
+
+        # convert to GeoPandas GeoDataFrame
+        catalog_entries = gpd.GeoDataFrame(catalog_entries, geometry='geometry')
+
+        return catalog_entries
+
+    def search_catalog_chunks(self, chunksize, update_cache=False, **kwargs):
+        """Get catalog_entries associated with service in chunks of at most `chunksize` entries.
+
+        Cached catalogs are read one chunk at a time, otherwise the catalog is retrieved with
+        `search_catalog_wrapper` and then split into chunks.
+        """
+        if self.use_cache and not update_cache:
+            try:
+                up_to_date = self._refresh_catalog_cache()
+            except Exception as e:
+                util.logger.info(e)
+                up_to_date = False
+
+            if up_to_date:
+                for catalog_entries in self.catalog_cache.iter_batches(filters=kwargs, batch_size=chunksize):
+                    self._label_catalog_entries(catalog_entries)
+                    yield gpd.GeoDataFrame(catalog_entries, geometry='geometry')
+                return
+
+        catalog_entries = self.search_catalog_wrapper(update_cache=update_cache, **kwargs)
+        for start in range(0, len(catalog_entries), chunksize):
+            yield catalog_entries.iloc[start:start + chunksize]
+
+    def get_catalog_entries(self, catalog_ids, update_cache=False):
+        """Get the catalog entries with the given catalog ids.
+
+        Entries are read from the catalog cache without loading the whole catalog and the most recently used
+        entries are kept in memory until the cache is rebuilt, so repeated lookups of the same entries are cheap.
+
+        Args:
+            catalog_ids (list): catalog ids (service ids) of the catalog entries.
+            update_cache (bool, Optional, Default=False): if True, update the catalog cache.
+
+        Returns:
+            A GeoDataFrame of the catalog entries indexed by uri in the order of `catalog_ids` (including duplicates).
+            A KeyError is raised if any of the catalog entries do not exist.
+        """
+        catalog_ids = [str(i) for i in catalog_ids]
+        uris = [util.construct_service_uri(self.provider.name, self.name, i) for i in catalog_ids]
+
+        if self.use_cache and not update_cache:
+            try:
+                up_to_date = self._refresh_catalog_cache()
+            except Exception as e:
+                util.logger.info(e)
+                up_to_date = False
+
+            if up_to_date:
+                records = self._cached_catalog_entries(list(dict.fromkeys(catalog_ids)))
+                catalog_entries = gpd.GeoDataFrame.from_dict(records, orient='index')
+                return catalog_entries.loc[uris]
+
+        return self.search_catalog_wrapper(update_cache=update_cache).loc[uris]
+
+    def _cached_catalog_entries(self, catalog_ids):
+        """Get the records of the catalog entries that exist in the catalog cache keyed by uri."""
+        build = self.catalog_cache.build_id()
+        with self._catalog_entries_lock:
+            if build != self._catalog_entries_build:
+                self._catalog_entries.clear()
+                self._catalog_entries_build = build
+            missing = [i for i in catalog_ids if i not in self._catalog_entries]
+
+        loaded = {}
+        if missing:
+            catalog_entries = self.catalog_cache.read_ids(missing)
+            self._label_catalog_entries(catalog_entries)
+            loaded = dict(zip(catalog_entries.service_id, catalog_entries.to_dict(orient='records')))
+
+        records = {}
+        with self._catalog_entries_lock:
+            if build == self._catalog_entries_build:
+                self._catalog_entries.update(loaded)
+            for i in catalog_ids:
+                record = loaded.get(i) or self._catalog_entries.get(i)
+                if record is None:
+                    continue
+                if i in self._catalog_entries:
+                    self._catalog_entries.move_to_end(i)
+                records[record['name']] = record
+            while len(self._catalog_entries) > MAX_CACHED_CATALOG_ENTRIES:
+                self._catalog_entries.popitem(last=False)
+
+        # callers may modify the returned metadata
+        return copy.deepcopy(records)
+
+    def _refresh_catalog_cache(self):
+        """Update the catalog cache if it is older than the update frequency of the provider.
+
+        Entries that changed since the cache was built are merged into the cache if the service implements
+        `search_catalog_updates`, unless the cache was already merged `max_catalog_merges` times.
+
+        Returns:
+            True if the cache is up to date, False if the whole catalog needs to be downloaded again.
+        """
+        cache = self.catalog_cache
+        if not cache.is_stale(self.provider.update_frequency):
+            return True
+
+        # services that cannot report deleted entries rebuild the cache every so often to drop them
+        if self.max_catalog_merges is not None and cache.merges() >= self.max_catalog_merges:
+            return False
+
+        built = pd.Timestamp.now(tz='UTC')
+        try:
+            catalog_entries, deleted = self.search_catalog_updates(since=cache.built())
+        except NotImplementedError:
+            return False
+
+        util.logger.info('merging {} updated and {} deleted catalog entries into the {} cache'
+                         .format(len(catalog_entries), len(deleted), self.name))
+        if not catalog_entries.empty:
+            catalog_entries = self._normalize_catalog_entries(catalog_entries)
+            self._set_catalog_parameters(catalog_entries)
+        cache.merge(catalog_entries, deleted=deleted, built=built)
+
+        return True
+
+    def _set_catalog_parameters(self, catalog_entries):
+        params = self.get_parameters(catalog_ids=catalog_entries)
+        if isinstance(params, pd.DataFrame):
+            parameters = params.groupby('service_id')['parameter'].agg(lambda x: ','.join(filter(None, x.tolist())))
+            catalog_entries['parameters'] = parameters.reindex(catalog_entries.index).fillna('').values
+        else:
+            catalog_entries['parameters'] = ','.join(params['parameters'])
 
+    def _normalize_catalog_entries(self, catalog_entries):
+        """Convert the reserved geometry fields into shapely geometries and merge extra fields into metadata.
+
+        All conversions operate on whole columns since catalogs can have hundreds of thousands of entries.
+        """
         # convert geometry into shapely objects
         if 'bbox' in catalog_entries.columns:
-            catalog_entries['geometry'] = catalog_entries['bbox'].apply(lambda row: box(*[float(x) for x in row]))
+            bounds = np.array(catalog_entries['bbox'].tolist(), dtype=float).reshape(-1, 4)
+            catalog_entries['geometry'] = shapely.box(*bounds.T)
             del catalog_entries['bbox']
 
         if {'latitude', 'longitude'}.issubset(catalog_entries.columns):
-            def fn(row):
-                Point((
-                    float(row['longitude']),
-                    float(row['latitude'])
-                ))
-            catalog_entries['geometry'] = catalog_entries.apply(fn, axis=1)
+            x = catalog_entries['longitude'].values.astype(float)
+            y = catalog_entries['latitude'].values.astype(float)
+            geometry = shapely.points(x, y)
+            geometry[np.isnan(x) | np.isnan(y)] = None
+            catalog_entries['geometry'] = geometry
             del catalog_entries['latitude']
             del catalog_entries['longitude']
 
@@ -169,11 +332,6 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
             # del catalog_entries['latitude']
             # del catalog_entries['longitude']
 
-        if 'geometry' in catalog_entries.columns:
-            pass
-            # The following line doesn't have any effect (except perhaps to validate the geometry)
-            # catalog_entries['geometry'].apply(shape)
-
         if 'geometry' not in catalog_entries.columns:
             catalog_entries['geometry'] = None
 
@@ -185,44 +343,29 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
             catalog_entries['description'] = ''
 
         # merge extra data columns/fields into metadata as a dictionary
-        extra_fields = list(set(catalog_entries.columns.tolist()) - set(reserved_catalog_entry_fields))
+        extra_fields = [c for c in catalog_entries.columns if c not in reserved_catalog_entry_fields]
         # change NaN to None so it can be JSON serialized properly
-        catalog_entries['metadata'] = [
-            {k: None if v != v else v for k, v in record.items()}
-            for record in catalog_entries[extra_fields].to_dict(orient='records')
-        ]
+        extra = catalog_entries[extra_fields].astype(object)
+        extra = extra.where(extra.notnull(), None)
+        # building the dicts from the columns avoids the per value type conversion of DataFrame.to_dict
+        records = zip(*[extra[c].values for c in extra_fields]) if extra_fields else [()] * len(catalog_entries)
+        catalog_entries['metadata'] = [dict(zip(extra_fields, values)) for values in records]
         catalog_entries.drop(extra_fields, axis=1, inplace=True)
-        columns = list(set(catalog_entries.columns.tolist()).intersection(reserved_geometry_fields))
+        columns = [c for c in catalog_entries.columns if c in reserved_geometry_fields]
         catalog_entries.drop(columns, axis=1, inplace=True)
 
-        params = self.get_parameters(catalog_ids=catalog_entries)
-        if isinstance(params, pd.DataFrame):
-            groups = params.groupby('service_id').groups
-            catalog_entries['parameters'] = catalog_entries.index.map(
-                lambda x: ','.join(filter(None, params.loc[groups[x]]['parameter'].tolist()))
-                if x in groups.keys() else ''
-            )
-        else:
-            catalog_entries['parameters'] = ','.join(params['parameters'])
-
-        if self.use_cache:
-            # write to cache_file
-            os.makedirs(os.path.split(cache_file)[0], exist_ok=True)
-            catalog_entries.to_pickle(cache_file)
-
-        self._label_catalog_entries(catalog_entries)
-
-        # convert to GeoPandas GeoDataFrame
-        catalog_entries = gpd.GeoDataFrame(catalog_entries, geometry='geometry')
-
         return catalog_entries
 
     def _label_catalog_entries(self, catalog_entries):
-        catalog_entries['service'] = util.construct_service_uri(self.provider.name, self.name)
+        service = util.construct_service_uri(self.provider.name, self.name)
+        # the service uri is the same for every entry so it is stored once as a single category
+        catalog_entries['service'] = pd.Categorical.from_codes(np.zeros(len(catalog_entries), dtype=np.int8),
+                                                               categories=[service])
         if 'service_id' not in catalog_entries:
             catalog_entries['service_id'] = catalog_entries.index
-        catalog_entries['service_id'] = catalog_entries['service_id'].apply(str)
-        catalog_entries.index = catalog_entries['service'] + '/' + catalog_entries['service_id']
+        catalog_entries['service_id'] = catalog_entries['service_id'].astype(str)
+        catalog_entries.index = service + '/' + catalog_entries['service_id'].values.astype(object)
+        # the name column shares the uri strings of the index
         catalog_entries['name'] = catalog_entries.index
 
     def search_catalog(self, **kwargs):
@@ -248,74 +391,58 @@ class ServiceBase(param.Parameterized):  # TODO can I make this an abc and have
         """
         raise NotImplementedError()
 
-    def get_tags(self, update_cache=False):
-        cache_file = os.path.join(util.get_cache_dir(self.provider.name), self.name + '_tags.p')
-        if self.use_cache and not update_cache:
-            try:
-                with open(cache_file, 'rb') as cache:
-                    tags = pickle.load(cache)
-                return tags
-            except:
-                util.logger.info('updating tag cache')
+    def search_catalog_updates(self, since):
+        """
+        should return the catalog entries that were added or changed since a given time
+        in the same format as `search_catalog` and a list of the ids of the entries that
+        were removed. Used to refresh a cached catalog that is older than the update frequency
+        of the provider without downloading the whole catalog again.
 
-        catalog_entries = self.search_catalog_wrapper(update_cache=update_cache)
-        metadata = pd.DataFrame(list(catalog_entries.metadata))
+        services that cannot query for changes should not override this, in which case
+        the whole catalog is downloaded again. services that cannot query for removed entries
+        should set `max_catalog_merges`, so that the whole catalog is downloaded again after
+        that many updates.
+        :param since: time the cached catalog was built (UTC pandas.Timestamp)
+
+        """
+        raise NotImplementedError()
 
-        # drop metadata fields that are unusable as tag fields
-        metadata.drop(labels=['location', 'coverages'], axis=1, inplace=True, errors='ignore')
+    def get_tags(self, update_cache=False, prefix=None):
+        """Get the distinct values of the metadata tags of the catalog entries.
 
-        tags = {}
-        for tag in metadata.columns:
+        Nested dicts are parsed out as multi-index tags where the keys are joined with ':'.
+
+        Args:
+            update_cache (bool, Optional, Default=False): if True, update the catalog cache.
+            prefix (string, Optional, Default=None): only return tags that start with prefix.
+
+        Returns:
+            A dict keyed by tag with a list of the values of each tag ordered by how often they occur.
+        """
+        if self.use_cache and not update_cache:
             try:
-                tags[tag] = list(metadata[tag].unique())
-
-                # make sure datetime values are serialized (for RPC server)
-                tags[tag] = json.loads(json.dumps(tags[tag], default=util.to_json_default_handler))
-            except TypeError:
-                values = list(metadata[tag])
-                new_tags = dict()
-                new_tags[tag] = list()
-                for v in values:
-                    if isinstance(v, dict):
-                        self._combine_dicts(new_tags, self._get_tags_from_dict(tag, v))
-                    else:
-                        new_tags[tag].append(v)
-                if not new_tags[tag]:
-                    del new_tags[tag]
-                tags.update({k: list(set(v)) for k, v in new_tags.items()})
+                if self._refresh_catalog_cache():
+                    return self._tags_to_dict(self.catalog_cache.read_tags(prefix=prefix))
+            except Exception as e:
+                util.logger.info(e)
+            util.logger.info('updating tag cache')
 
+        catalog_entries = self.search_catalog_wrapper(update_cache=update_cache)
+
+        # the tag index is written along with the catalog cache
+        tags = None
         if self.use_cache:
-            # write to cache_file
-            with open(cache_file, 'wb') as cache:
-                pickle.dump(tags, cache)
+            try:
+                tags = self.catalog_cache.read_tags(prefix=prefix)
+            except Exception as e:
+                util.logger.info(e)
+        if tags is None:
+            tags = tag_counts(catalog_entries.metadata, prefix=prefix)
 
-        return tags
+        return self._tags_to_dict(tags)
 
-    def _get_tags_from_dict(self, tag, d):
-        """Helper function for `get_tags` to recursively parse dicts and add them as multi-indexed tags
-        """
-        tags = dict()
-        for k, v in d.items():
-            new_tag = '{}:{}'.format(tag, k)
-            if isinstance(v, dict):
-                self._combine_dicts(tags, self._get_tags_from_dict(new_tag, v))
-            else:
-                tags[new_tag] = v
-
-        return tags
-
-    def _combine_dicts(self, this, other):
-        """Helper function for `get_tags` to combine dictionaries by aggregating values rather than overwriting them.
-        """
-        for k, other_v in other.items():
-            other_v = util.listify(other_v)
-            if k in this:
-                this_v = this[k]
-                if isinstance(this_v, list):
-                    other_v.extend(this_v)
-                else:
-                    other_v.append(this_v)
-            this[k] = other_v
+    def _tags_to_dict(self, tags):
+        return {tag: values.tolist() for tag, values in tags.groupby('tag', sort=False)['value']}
 
 
 class TimePeriodServiceBase(ServiceBase):
@@ -337,9 +464,8 @@ class SingleFileServiceBase(ServiceBase):
     eg elevation raster etc
     """
     def download(self, catalog_id, file_path, dataset, **kwargs):
-        service_uri = util.construct_service_uri(self.provider.name, self.name, catalog_id)
-        catalog_id = self.provider.search_catalog(self.name).loc[service_uri]
-        reserved = catalog_id.get('reserved')
+        catalog_entry = self.get_catalog_entries([catalog_id]).iloc[0]
+        reserved = catalog_entry.get('reserved')
         download_url = reserved['download_url']
         fmt = reserved.get('extract_from_zip', '')
         filename = reserved.get('filename', util.uuid('dataset'))
@@ -347,7 +473,7 @@ class SingleFileServiceBase(ServiceBase):
         return {
             'file_path': file_path,
             'file_format': reserved.get('file_format'),
-            'parameter': catalog_id.get('parameters'),
+            'parameter': catalog_entry.get('parameters'),
             'datatype': self.datatype,
         }
 
@@ -358,10 +484,10 @@ class SingleFileServiceBase(ServiceBase):
         util.logger.info('... downloading %s' % url)
 
         if tile_fmt == '':
-            ulmo.util.download_if_new(url, tile_path, check_modified=check_modified)
+            http.download_file(url, tile_path, check_modified=check_modified)
         else:
             zip_path = os.path.join(path, 'zip', filename)
-            ulmo.util.download_if_new(url, zip_path, check_modified=check_modified)
+            http.download_file(url, zip_path, check_modified=check_modified)
             util.logger.info('... ... zipfile saved at %s' % zip_path)
             tile_path = ulmo.util.extract_from_zip(zip_path, tile_path, tile_fmt)
 
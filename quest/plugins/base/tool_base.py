@@ -74,8 +74,8 @@ class ToolBase(param.ParameterizedFunction):
         result = self._run_tool()
         datasets = listify(result.get('datasets', []))
         catalog_entries = listify(result.get('catalog_entries', []))
-        for dataset in datasets:
-            update_metadata(dataset, quest_metadata={
+        if datasets:
+            update_metadata(datasets, quest_metadata={
                 'options': self.set_options,
                 'status': DatasetStatus.DERIVED
             })
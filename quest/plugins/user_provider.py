@@ -2,6 +2,7 @@ from geojson import Feature, FeatureCollection, Polygon
 from quest.plugins.base import ProviderBase, ServiceBase
 from io import StringIO
 from quest import util
+from quest.util import http
 import pandas as pd
 import requests
 import warnings
@@ -72,7 +73,7 @@ def get_user_service_base():
                             "ignore",
                             category=requests.packages.urllib3.exceptions.InsecureRequestWarning
                         )
-                        r = requests.get(src, verify=False)
+                        r = http.get(src, verify=False)
                     if r.status_code == 200:  # only download if file exists
                         chunk_size = 64 * 1024
                         with open(dst, 'wb') as f:
@@ -225,6 +226,6 @@ def uri_open(uri, is_remote):
                 "ignore",
                 category=requests.packages.urllib3.exceptions.InsecureRequestWarning
             )
-            return StringIO(requests.get(uri, verify=False).text)
+            return StringIO(http.get(uri, verify=False).text)
     else:
         return open(uri)
@@ -0,0 +1,1018 @@
+"""Columnar on-disk cache for service catalogs.
+
+Each service catalog is stored as a single parquet file with the geometry encoded as WKB and its bounding box
+stored in separate columns. This allows catalog searches to only read the columns they need and to push filters
+down to the parquet reader so that only the matching rows are materialized.
+
+Rows are written in Hilbert curve order of their bounding box centers so that each row group covers a compact
+area, and a spatial index of the row bounding boxes is saved alongside the catalog. Bounding box searches query
+the index and then only read the row groups that contain matching rows.
+
+An inverted index of the tokens in the text of each row is also saved so that `search_terms`, `display_name`
+and `description` searches only need to read the rows that contain every token of the search term, as well as
+an index of the distinct values of each metadata tag (see `quest.api.get_tags`). Scalar metadata tags are also
+stored in typed columns so that metadata filters can be pushed down to the parquet reader.
+
+String columns with few distinct values (e.g. parameters or geometry types) are dictionary encoded and read as
+pandas categoricals, and entries are stored by their service id rather than their full uri, so that large catalogs
+take up a fraction of the memory of plain object columns.
+"""
+import collections
+import datetime
+import functools
+import json
+import operator
+import os
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
+import shapely.geometry
+
+from .misc import bbox2poly, construct_service_uri, get_cache_dir, listify
+
+CATALOG_CACHE_VERSION = '4'
+ROW_GROUP_SIZE = 10000
+HILBERT_BITS = 16
+
+INDEX_COLUMN = '_index'
+GEOM_TYPE_COLUMN = '_geom_type'
+BBOX_COLUMNS = ['_minx', '_miny', '_maxx', '_maxy']
+JSON_COLUMNS = ['metadata', 'reserved']
+EXCLUDED_TAGS = ['location', 'coverages']  # metadata fields that are unusable as tags
+TAG_COLUMN_PREFIX = '_tag:'
+MAX_TAG_COLUMNS = 200
+CATEGORICAL_MAX_RATIO = 0.5  # string columns with at most this ratio of distinct to non-null values are categorical
+FILTER_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+TOKEN_PATTERN = r'[^\pL\pN_]+'
+REGEX_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+_VERSION_KEY = b'quest_catalog_version'
+_BUILD_KEY = b'quest_catalog_build'
+_BUILT_KEY = b'quest_catalog_built'
+_MERGES_KEY = b'quest_catalog_merges'
+_JSON_COLUMNS_KEY = b'quest_json_columns'
+# keys of the json objects that datetime and date values are stored as
+_DATETIME_TAG = '$datetime'
+_DATE_TAG = '$date'
+
+_indexes = {}  # spatial and text indexes that have already been loaded keyed by index file path
+
+
+class CatalogCache(object):
+    """Reads and writes the cached catalog of a single service.
+
+    Args:
+        provider (string): name of the provider the service belongs to.
+        service (string): name of the service.
+    """
+    def __init__(self, provider, service):
+        self.provider = provider
+        self.service = service
+
+    @property
+    def path(self):
+        return os.path.join(get_cache_dir(self.provider), '{}_catalog.parquet'.format(self.service))
+
+    @property
+    def spatial_index_path(self):
+        return os.path.join(get_cache_dir(self.provider), '{}_catalog.sidx.npz'.format(self.service))
+
+    @property
+    def text_index_path(self):
+        return os.path.join(get_cache_dir(self.provider), '{}_catalog.text.parquet'.format(self.service))
+
+    @property
+    def tags_path(self):
+        return os.path.join(get_cache_dir(self.provider), '{}_catalog.tags.parquet'.format(self.service))
+
+    def exists(self):
+        """Check if a cache file with the current cache version exists.
+
+        Returns:
+            True if the cache can be read, False otherwise.
+        """
+        try:
+            self._read_schema()
+        except (OSError, ValueError):
+            return False
+
+        return True
+
+    def built(self):
+        """Get the time the cached catalog was built.
+
+        Returns:
+            A UTC pandas Timestamp or None if the build time was not recorded.
+        """
+        built = self._read_schema().metadata.get(_BUILT_KEY)
+        return pd.Timestamp(built.decode()) if built else None
+
+    def merges(self):
+        """Get the number of times changes were merged into the cache since the whole catalog was written.
+
+        Returns:
+            The number of merges.
+        """
+        return int(self._read_schema().metadata.get(_MERGES_KEY, b'0'))
+
+    def build_id(self):
+        """Get the id of the current build of the cached catalog.
+
+        Returns:
+            A string that changes every time the cache is written.
+        """
+        return self._read_schema().metadata.get(_BUILD_KEY, b'').decode()
+
+    def is_stale(self, update_frequency, now=None):
+        """Check if the cached catalog is older than an update frequency.
+
+        Frequencies with a variable length (e.g. 'M') are measured from the build time rather than from the start
+        of the next period, so a cache built on January 15th with a frequency of 'M' is stale on February 15th.
+
+        Args:
+            update_frequency (string): pandas frequency string (e.g. 'D', 'W', 'M'). If None the cache is never stale.
+            now (pandas.Timestamp, Optional, Default=None): time to compare against, defaults to the current time.
+
+        Returns:
+            True if the cache needs to be refreshed, False otherwise.
+        """
+        if not update_frequency:
+            return False
+
+        built = self.built()
+        if built is None:
+            return True
+
+        now = now if now is not None else pd.Timestamp.now(tz='UTC')
+        offset = pd.tseries.frequencies.to_offset(update_frequency)
+        if isinstance(offset, pd.offsets.Tick):
+            expires = built + offset
+        else:
+            period = pd.Period(built.tz_localize(None), freq=update_frequency)
+            expires = built + ((period + 1).start_time - period.start_time)
+
+        return now >= expires
+
+    def write(self, catalog_entries, built=None, merges=0):
+        """Write a normalized catalog to the cache, replacing any existing cache.
+
+        Args:
+            catalog_entries (pandas.DataFrame): normalized catalog entries (see `ServiceBase.search_catalog_wrapper`).
+            built (pandas.Timestamp, Optional, Default=None):
+                time the catalog entries were retrieved, defaults to the current time.
+            merges (int, Optional, Default=0): number of merges since the whole catalog was written (see `merges`).
+        """
+        build = uuid4().hex
+        built = built if built is not None else pd.Timestamp.now(tz='UTC')
+        table = _encode(catalog_entries, build, built, merges)
+        bounds = np.column_stack([table.column(c).to_numpy(zero_copy_only=False) for c in BBOX_COLUMNS])
+
+        # the indexes are built from the entries as they will be read from the cache
+        decoded = _decode(table, json.loads(table.schema.metadata[_JSON_COLUMNS_KEY].decode()))
+        text_index = TextIndex.from_documents(self._text_documents(decoded), build)
+        metadata = decoded['metadata'] if 'metadata' in decoded.columns else []
+        tags = _tag_table(metadata).replace_schema_metadata({_BUILD_KEY: build.encode()})
+        for name, array in _tag_columns(metadata, table.num_rows).items():
+            table = table.append_column(name, array)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # write to temporary files first so readers never see a partially written cache
+        with open(self.spatial_index_path + '.tmp', 'wb') as f:
+            np.savez(f, build=np.array(build), bounds=bounds)
+        text_index.save(self.text_index_path + '.tmp')
+        pq.write_table(tags, self.tags_path + '.tmp')
+        pq.write_table(table, self.path + '.tmp', row_group_size=ROW_GROUP_SIZE)
+        for path in [self.spatial_index_path, self.text_index_path, self.tags_path, self.path]:
+            os.replace(path + '.tmp', path)
+
+    def merge(self, catalog_entries, deleted=None, built=None):
+        """Merge added and changed entries into the cache and remove deleted entries.
+
+        Args:
+            catalog_entries (pandas.DataFrame):
+                normalized catalog entries that replace any cached entries with the same index.
+            deleted (list, Optional, Default=None): index of the entries to remove from the cache.
+            built (pandas.Timestamp, Optional, Default=None):
+                time the changes were retrieved, defaults to the current time.
+        """
+        cached = self.read()
+        removed = set(catalog_entries.index.astype(str)).union(str(i) for i in deleted or [])
+        cached = cached[~cached.index.isin(removed)]
+        self.write(pd.concat([cached, catalog_entries]), built=built, merges=self.merges() + 1)
+
+    def read(self, filters=None, columns=None):
+        """Read catalog entries from the cache.
+
+        Args:
+            filters (dict, Optional, Default=None):
+                search filters (see `quest.api.search_catalog`). Filters that can be evaluated on the cache are
+                pushed down to the parquet reader, all other filters are ignored. `search_terms` are only used to
+                narrow down the rows that are read, so some of the returned rows may not match them.
+            columns (list, Optional, Default=None):
+                catalog columns to read. If None then all columns are read.
+
+        Returns:
+            A pandas DataFrame of the catalog entries indexed the same way as when they were written.
+        """
+        schema = self._read_schema()
+        json_columns = json.loads(schema.metadata.get(_JSON_COLUMNS_KEY, b'[]').decode())
+        table = pa.concat_tables(self._scan(schema, filters, columns))
+
+        return _decode(table, json_columns)
+
+    def read_ids(self, ids, columns=None):
+        """Read the catalog entries with the given service ids.
+
+        Entries are matched on the service_id column if the catalog has one and on the index otherwise. Only the
+        matching column is scanned, so looking up a few entries is much cheaper than reading the whole catalog.
+
+        Args:
+            ids (list): service ids of the catalog entries.
+            columns (list, Optional, Default=None): catalog columns to read. If None then all columns are read.
+
+        Returns:
+            A pandas DataFrame of the catalog entries that were found (see `read`).
+        """
+        schema = self._read_schema()
+        json_columns = json.loads(schema.metadata.get(_JSON_COLUMNS_KEY, b'[]').decode())
+        columns = _read_columns(schema, columns)
+
+        column = 'service_id' if 'service_id' in schema.names else INDEX_COLUMN
+        field = ds.field(column)
+        if schema.field(column).type != pa.string():
+            field = field.cast(pa.string())
+        expression = field.isin([str(i) for i in ids])
+        table = ds.dataset(self.path, format='parquet').to_table(columns=columns, filter=expression)
+
+        return _decode(table, json_columns)
+
+    def iter_batches(self, filters=None, columns=None, batch_size=ROW_GROUP_SIZE):
+        """Read catalog entries from the cache in batches.
+
+        Only the entries of one batch are held in memory at a time, so this can be used to process catalogs that are
+        too large to read at once.
+
+        Args:
+            filters (dict, Optional, Default=None): search filters (see `read`).
+            columns (list, Optional, Default=None): catalog columns to read. If None then all columns are read.
+            batch_size (int, Optional, Default=ROW_GROUP_SIZE): number of catalog entries in each batch.
+
+        Yields:
+            pandas DataFrames of at most `batch_size` catalog entries (see `read`).
+        """
+        schema = self._read_schema()
+        json_columns = json.loads(schema.metadata.get(_JSON_COLUMNS_KEY, b'[]').decode())
+
+        pending = []
+        pending_rows = 0
+        for table in self._scan(schema, filters, columns, batch_size=batch_size):
+            pending.append(table)
+            pending_rows += table.num_rows
+            while pending_rows >= batch_size:
+                table = pa.concat_tables(pending)
+                yield _decode(table.slice(0, batch_size), json_columns)
+                pending = [table.slice(batch_size)]
+                pending_rows -= batch_size
+
+        if pending_rows > 0:
+            yield _decode(pa.concat_tables(pending), json_columns)
+
+    def _scan(self, schema, filters=None, columns=None, batch_size=None):
+        """Read the rows matching the filters as arrow tables.
+
+        If `batch_size` is None then a single table is returned, otherwise tables of roughly `batch_size` rows before
+        filtering are returned one at a time.
+        """
+        build = schema.metadata.get(_BUILD_KEY, b'').decode()
+
+        columns = _read_columns(schema, columns)
+
+        filters = dict(filters or {})
+        rows = self._candidate_rows(filters, build)
+        expression = filter_expression(filters, schema)
+
+        if rows is None:
+            dataset = ds.dataset(self.path, format='parquet')
+            if batch_size is None:
+                yield dataset.to_table(columns=columns, filter=expression)
+            else:
+                for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+                    yield pa.Table.from_batches([batch])
+            return
+
+        # the columns used by the filter expression are read as well and dropped after filtering
+        read_columns = columns + [c for c in filter_columns(filters, schema) if c not in columns]
+
+        step = batch_size or max(len(rows), 1)
+        for start in range(0, max(len(rows), 1), step):
+            table = self._take(rows[start:start + step], read_columns)
+            if expression is not None:
+                table = table.filter(expression)
+            yield table.select(columns)
+
+    def read_tags(self, prefix=None):
+        """Read the index of the distinct values of the metadata tags of the cached catalog.
+
+        Nested metadata dicts are indexed as multi-index tags where the keys are joined with ':' and each item of a
+        list value is counted separately.
+
+        Args:
+            prefix (string, Optional, Default=None): only read tags that start with prefix (e.g. 'location:').
+
+        Returns:
+            A pandas DataFrame with the columns tag, value and count sorted by tag and descending count.
+        """
+        build = self._read_schema().metadata.get(_BUILD_KEY, b'')
+        if pq.read_schema(self.tags_path).metadata.get(_BUILD_KEY) != build:
+            raise ValueError('Tag index {} does not belong to the cached catalog'.format(self.tags_path))
+
+        expression = pc.starts_with(ds.field('tag'), prefix) if prefix else None
+        table = ds.dataset(self.tags_path, format='parquet').to_table(filter=expression)
+
+        return _decode_tags(table)
+
+    def _candidate_rows(self, filters, build):
+        """Get the positions of the rows that can match the filters using the spatial and text indexes.
+
+        The bbox filter is removed from the filters if it was evaluated with the spatial index.
+
+        Returns:
+            A sorted array of row positions or None if the indexes could not be used to narrow down the rows.
+        """
+        candidates = []
+        if 'bbox' in filters:
+            spatial_index = self._load_index(SpatialIndex, self.spatial_index_path, build)
+            if spatial_index is not None:
+                candidates.append(spatial_index.query(filters.pop('bbox')))
+
+        text_filters = {k: v for k, v in filters.items() if k in TextIndex.fields}
+        if text_filters:
+            text_index = self._load_index(TextIndex, self.text_index_path, build)
+            for k, v in text_filters.items():
+                if text_index is None:
+                    break
+                if k == 'search_terms':
+                    # an entry matches if it matches any of the search terms
+                    rows = [text_index.query(k, term) for term in v]
+                    rows = None if not rows or any(r is None for r in rows) else functools.reduce(np.union1d, rows)
+                else:
+                    rows = text_index.query(k, v)
+                if rows is not None:
+                    candidates.append(np.asarray(rows, dtype=np.int64))
+
+        if not candidates:
+            return None
+
+        return functools.reduce(np.intersect1d, candidates)
+
+    def _take(self, rows, columns=None):
+        """Read rows by position, only loading the row groups that contain them."""
+        parquet_file = pq.ParquetFile(self.path)
+        metadata = parquet_file.metadata
+        row_group_sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        row_group_offsets = np.concatenate([[0], np.cumsum(row_group_sizes)]).astype(np.int64)
+
+        row_groups = np.searchsorted(row_group_offsets, rows, side='right') - 1
+        selected = np.unique(row_groups)
+        if len(selected) == 0:
+            table = parquet_file.schema_arrow.empty_table()
+            return table.select(columns) if columns is not None else table
+
+        table = parquet_file.read_row_groups(selected.tolist(), columns=columns)
+
+        # position of each row in the table of concatenated row groups
+        sizes = row_group_offsets[selected + 1] - row_group_offsets[selected]
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        positions = rows - row_group_offsets[row_groups] + starts[np.searchsorted(selected, row_groups)]
+
+        return table.take(pa.array(positions))
+
+    def _load_index(self, cls, path, build):
+        cached = _indexes.get(path)
+        if isinstance(cached, cls) and cached.build == build:
+            return cached
+
+        index = cls.load(path, build)
+        if index is not None:
+            _indexes[path] = index
+
+        return index
+
+    def _text_documents(self, df):
+        """Get the text of each row that is indexed for each of the text index fields.
+
+        The search_terms text contains the string representation of every column the way it is returned by
+        `ServiceBase.search_catalog_wrapper`, so any entry that `quest.api.search_catalog` would match is found.
+        """
+        service_ids = df['service_id'].astype(str) if 'service_id' in df.columns else pd.Series(df.index.astype(str))
+        # the service uri, service_id and name labels are all contained in the name
+        text = [construct_service_uri(self.provider, self.service) + '/' + service_ids.values]
+        for col in df.columns:
+            if col == 'geometry':
+                values = shapely.to_wkt(df[col].values, rounding_precision=-1)
+                text.append(np.where(pd.isnull(values), 'None', values))
+            else:
+                text.append([str(v) for v in df[col].values])
+
+        documents = {'search_terms': pc.binary_join_element_wise(*[pa.array(t, pa.string()) for t in text], '\n')}
+        for field in ['display_name', 'description']:
+            if field in df.columns:
+                documents[field] = pa.array([str(v) for v in df[field].values], pa.string())
+
+        return documents
+
+    def _read_schema(self):
+        schema = pq.read_schema(self.path)
+        version = (schema.metadata or {}).get(_VERSION_KEY, b'').decode()
+        if version != CATALOG_CACHE_VERSION:
+            raise ValueError('Catalog cache {} has version "{}", expected "{}"'
+                             .format(self.path, version, CATALOG_CACHE_VERSION))
+
+        return schema
+
+
+class SpatialIndex(object):
+    """R-tree (STRtree) of the bounding boxes of the rows in a cached catalog.
+
+    Args:
+        bounds (numpy.ndarray): n x 4 array of (minx, miny, maxx, maxy) for each row. Rows without a geometry are NaN.
+        build (string): id of the cache build the index belongs to.
+    """
+    def __init__(self, bounds, build):
+        self.build = build
+        self._rows = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+        self._tree = shapely.STRtree(shapely.box(*bounds[self._rows].T))
+
+    @classmethod
+    def load(cls, path, build):
+        """Load a spatial index saved by `CatalogCache.write`.
+
+        Returns:
+            The spatial index or None if it does not exist or belongs to a different cache build.
+        """
+        try:
+            with np.load(path) as data:
+                if str(data['build']) != build:
+                    return None
+                bounds = data['bounds']
+        except (OSError, KeyError):
+            return None
+
+        return cls(bounds, build)
+
+    def query(self, bbox):
+        """Get the rows with bounding boxes that intersect a bbox.
+
+        Args:
+            bbox (list or string): bounding box in the form (lon min, lat min, lon max, lat max).
+
+        Returns:
+            A sorted array of row positions.
+        """
+        parts = bbox_parts(bbox)
+        rows = np.concatenate([self._tree.query(shapely.box(*part.bounds)) for part in parts])
+
+        return np.unique(self._rows[rows])
+
+
+class TextIndex(object):
+    """Inverted index of the tokens in the text of the rows in a cached catalog.
+
+    Args:
+        postings (dict): for each indexed field a tuple of (tokens, offsets, rows) where the positions of the rows
+            that contain ``tokens[i]`` are ``rows[offsets[i]:offsets[i + 1]]``.
+        build (string): id of the cache build the index belongs to.
+    """
+    fields = ['search_terms', 'display_name', 'description']
+
+    def __init__(self, postings, build):
+        self.postings = postings
+        self.build = build
+        self.size = max((int(rows.max()) + 1 for _, _, rows in postings.values() if len(rows)), default=0)
+
+    @classmethod
+    def from_documents(cls, documents, build):
+        """Build an index from the text of each row.
+
+        Args:
+            documents (dict): text of each row (as a pyarrow string array) keyed by field.
+            build (string): id of the cache build the index belongs to.
+        """
+        postings = {}
+        for field, text in documents.items():
+            tokens = pc.split_pattern_regex(text, TOKEN_PATTERN)
+            rows = pc.list_parent_indices(tokens).to_numpy().astype(np.int64)
+            tokens = pc.list_flatten(tokens)
+            nonempty = pc.not_equal(tokens, '')
+            encoded = pc.filter(tokens, nonempty).dictionary_encode()
+            rows = rows[nonempty.to_numpy(zero_copy_only=False)]
+
+            # unique (token, row) pairs sorted by token and then row
+            n = max(len(text), 1)
+            keys = np.unique(encoded.indices.to_numpy().astype(np.int64) * n + rows)
+            token_ids = keys // n
+            offsets = np.searchsorted(token_ids, np.arange(len(encoded.dictionary) + 1))
+            postings[field] = (encoded.dictionary, offsets, (keys % n).astype(np.int32))
+
+        return cls(postings, build)
+
+    @classmethod
+    def load(cls, path, build):
+        """Load a text index saved with `save`.
+
+        Returns:
+            The text index or None if it does not exist or belongs to a different cache build.
+        """
+        try:
+            table = pq.read_table(path)
+        except OSError:
+            return None
+        if (table.schema.metadata or {}).get(_BUILD_KEY, b'').decode() != build:
+            return None
+
+        postings = {}
+        for field in pc.unique(table.column('field')).to_pylist():
+            t = table.filter(pc.equal(table.column('field'), field))
+            lengths = pc.list_value_length(t.column('rows')).to_numpy()
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            rows = pc.list_flatten(t.column('rows')).to_numpy()
+            postings[field] = (t.column('token').combine_chunks(), offsets, rows)
+
+        return cls(postings, build)
+
+    def save(self, path):
+        tables = []
+        for field, (tokens, offsets, rows) in self.postings.items():
+            tables.append(pa.table({
+                'field': pa.array([field] * len(tokens), pa.string()),
+                'token': tokens,
+                'rows': pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), pa.array(rows, pa.int32())),
+            }))
+        schema = pa.schema([('field', pa.string()), ('token', pa.string()), ('rows', pa.list_(pa.int32()))],
+                           metadata={_BUILD_KEY: self.build.encode()})
+        table = pa.concat_tables([t.cast(schema) for t in tables]) if tables else schema.empty_table()
+        pq.write_table(table.replace_schema_metadata(schema.metadata), path)
+
+    def query(self, field, pattern):
+        """Get the rows that can contain a pattern.
+
+        Every token of the pattern must be contained in one of the tokens of a row for the row to match, so the
+        result includes all rows that contain the pattern but may include some rows that do not.
+
+        Args:
+            field (string): indexed field to search.
+            pattern (string): literal search pattern.
+
+        Returns:
+            A sorted array of row positions or None if the index cannot be used for the pattern.
+        """
+        if field not in self.postings or not _is_literal(pattern):
+            return None
+
+        tokens = pc.split_pattern_regex(pa.array([pattern]), TOKEN_PATTERN)[0].as_py()
+        tokens = [t for t in tokens if t]
+        if not tokens:
+            return None
+
+        vocabulary, offsets, rows = self.postings[field]
+        result = np.ones(self.size, dtype=bool)
+        for token in tokens:
+            matched = pc.match_substring(vocabulary, token).to_numpy(zero_copy_only=False)
+            selected = np.zeros(self.size, dtype=bool)
+            selected[rows[np.repeat(matched, np.diff(offsets))]] = True
+            result &= selected
+
+        return np.flatnonzero(result)
+
+
+def filter_expression(filters, schema):
+    """Build a pyarrow expression for the search filters that can be evaluated on a cached catalog.
+
+    Args:
+        filters (dict): search filters (see `quest.api.search_catalog`).
+        schema (pyarrow.Schema): schema of the cached catalog.
+
+    Returns:
+        A `pyarrow.dataset.Expression` or None if none of the filters can be evaluated on the cache.
+    """
+    expression = None
+    for _, e in _filter_expressions(filters, schema):
+        expression = e if expression is None else expression & e
+
+    return expression
+
+
+def filter_columns(filters, schema):
+    """Get the names of the columns that are used to evaluate the search filters on a cached catalog.
+
+    Args:
+        filters (dict): search filters (see `quest.api.search_catalog`).
+        schema (pyarrow.Schema): schema of the cached catalog.
+
+    Returns:
+        A list of column names.
+    """
+    columns = []
+    for used, _ in _filter_expressions(filters, schema):
+        columns.extend(c for c in used if c not in columns)
+
+    return columns
+
+
+def is_operator_filter(value):
+    """Check if a metadata filter value is a dict of comparison operators, e.g. {'>=': 10, '<': 20} or {'in': [..]}.
+    """
+    return isinstance(value, dict) and len(value) > 0 and all(k in FILTER_OPERATORS or k == 'in' for k in value)
+
+
+def _filter_expressions(filters, schema):
+    """Yield the columns used and the expression of each filter that can be evaluated on a cached catalog."""
+    names = schema.names
+    for k, v in (filters or {}).items():
+        if k == 'bbox':
+            yield BBOX_COLUMNS, _bbox_expression(v)
+
+        elif k in ['geom_type', 'parameter', 'display_name', 'description']:
+            column = {'geom_type': GEOM_TYPE_COLUMN, 'parameter': 'parameters'}.get(k, k)
+            # only literal patterns are pushed down since pandas would interpret the pattern as a python regex
+            if column in names and _is_literal(v):
+                field = ds.field(column)
+                if pa.types.is_dictionary(schema.field(column).type):
+                    # substring matching is not implemented for dictionary encoded strings
+                    field = field.cast(pa.string())
+                yield [column], pc.match_substring(field, v)
+
+        elif k != 'search_terms' and TAG_COLUMN_PREFIX + k in names:
+            column = TAG_COLUMN_PREFIX + k
+            expression = _tag_expression(column, schema.field(column).type, v)
+            if expression is not None:
+                yield [column], expression
+
+
+def _tag_expression(column, column_type, value):
+    """Build the expression for a metadata filter or None if the values cannot be compared to the tag column."""
+    comparisons = value.items() if is_operator_filter(value) else [('==', value)]
+    expression = None
+    for op, v in comparisons:
+        values = listify(v) if op == 'in' else [v]
+        if not all(_is_comparable(column_type, x) for x in values):
+            return None
+
+        e = ds.field(column).isin(values) if op == 'in' else FILTER_OPERATORS[op](ds.field(column), v)
+        expression = e if expression is None else expression & e
+
+    return expression
+
+
+def _is_comparable(column_type, value):
+    if pa.types.is_dictionary(column_type):
+        column_type = column_type.value_type
+    if pa.types.is_boolean(column_type):
+        return isinstance(value, bool)
+    if pa.types.is_integer(column_type) or pa.types.is_floating(column_type):
+        return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+    return isinstance(value, str)
+
+
+def tag_counts(metadata, prefix=None):
+    """Count the distinct values of the tags in catalog metadata.
+
+    Args:
+        metadata (list or pandas.Series): metadata dict of each catalog entry.
+        prefix (string, Optional, Default=None): only count tags that start with prefix.
+
+    Returns:
+        A pandas DataFrame with the columns tag, value and count (see `CatalogCache.read_tags`).
+    """
+    tags = _decode_tags(_tag_table(metadata))
+    if prefix:
+        tags = tags[tags.tag.str.startswith(prefix)].reset_index(drop=True)
+
+    return tags
+
+
+def _tag_table(metadata):
+    counts = collections.Counter()
+    for record in metadata:
+        if isinstance(record, dict):
+            _count_tags(counts, '', {k: v for k, v in record.items() if k not in EXCLUDED_TAGS})
+
+    # string values are counted as is and all other values by their json representation
+    tags = [tag for tag, _ in counts]
+    values = [json.dumps(value) if is_string else value for _, (is_string, value) in counts]
+    df = pd.DataFrame({'tag': pd.Series(tags, dtype=object), 'value': pd.Series(values, dtype=object),
+                       'count': pd.Series(list(counts.values()), dtype=np.int64)})
+    df = df.sort_values(['tag', 'count'], ascending=[True, False], kind='stable')
+
+    return pa.Table.from_pandas(df, schema=pa.schema([('tag', pa.string()), ('value', pa.string()),
+                                                      ('count', pa.int64())]), preserve_index=False)
+
+
+def _count_tags(counts, prefix, d):
+    for k, v in d.items():
+        tag = '{}{}'.format(prefix, k)
+        if isinstance(v, dict):
+            _count_tags(counts, tag + ':', v)
+            continue
+
+        for value in v if isinstance(v, list) else [v]:
+            if isinstance(value, str):
+                counts[(tag, (True, value))] += 1
+            else:
+                counts[(tag, (False, json.dumps(value, sort_keys=True, default=_json_default)))] += 1
+
+
+def _tag_columns(metadata, n):
+    """Get typed columns of the scalar metadata tags, keyed by column name.
+
+    Only tags that have values of a single type (bool, number or string) in all entries are stored as columns.
+    """
+    tags = collections.defaultdict(dict)
+    for row, record in enumerate(metadata):
+        if isinstance(record, dict):
+            _flatten_tags(tags, row, '', record)
+
+    columns = {}
+    for tag, values in sorted(tags.items(), key=lambda item: -len(item[1]))[:MAX_TAG_COLUMNS]:
+        types = {type(v) for v in values.values() if v is not None}
+        if types == {bool}:
+            column_type = pa.bool_()
+        elif types == {int}:
+            column_type = pa.int64()
+        elif types and types <= {int, float}:
+            column_type = pa.float64()
+        elif types == {str}:
+            column_type = pa.string()
+        else:
+            continue
+
+        column = [None] * n
+        for row, v in values.items():
+            column[row] = v
+        try:
+            array = pa.array(column, column_type)
+        except (pa.ArrowInvalid, OverflowError):
+            continue
+        if column_type == pa.string() and _is_low_cardinality(len(set(values.values())), len(values)):
+            array = array.dictionary_encode()
+        columns[TAG_COLUMN_PREFIX + tag] = array
+
+    return dict(sorted(columns.items()))
+
+
+def categorize(catalog_entries, columns=None):
+    """Convert the string columns of a catalog that have few distinct values into pandas categoricals in place.
+
+    Args:
+        catalog_entries (pandas.DataFrame): catalog entries.
+        columns (list, Optional, Default=None): columns to convert. If None then all columns are converted.
+
+    Returns:
+        The catalog entries with the converted columns. Columns with mixed or non-string values are left as they are.
+    """
+    for col in catalog_entries.columns if columns is None else columns:
+        values = catalog_entries[col]
+        if values.dtype != object or col in JSON_COLUMNS + ['geometry'] or not _is_string_column(values):
+            continue
+
+        counts = values.value_counts(dropna=True)
+        if _is_low_cardinality(len(counts), counts.sum()):
+            catalog_entries[col] = values.astype('category')
+
+    return catalog_entries
+
+
+def _is_low_cardinality(distinct, count):
+    return count > 0 and distinct <= CATEGORICAL_MAX_RATIO * count
+
+
+def _flatten_tags(tags, row, prefix, d):
+    for k, v in d.items():
+        tag = '{}{}'.format(prefix, k)
+        if isinstance(v, dict):
+            _flatten_tags(tags, row, tag + ':', v)
+        else:
+            tags[tag][row] = v
+
+
+def _decode_tags(table):
+    return pd.DataFrame({
+        'tag': table.column('tag').to_pylist(),
+        'value': _loads(table.column('value')),
+        'count': table.column('count').to_numpy(),
+    }, columns=['tag', 'value', 'count'])
+
+
+def _read_columns(schema, columns):
+    """Get the columns of the cached catalog to read for the requested catalog columns."""
+    if columns is None:
+        return [c for c in schema.names if not _is_internal(c)]
+
+    return [INDEX_COLUMN] + [c for c in listify(columns) if c in schema.names and c != INDEX_COLUMN]
+
+
+def _is_internal(column):
+    return column in BBOX_COLUMNS + [GEOM_TYPE_COLUMN] or column.startswith(TAG_COLUMN_PREFIX)
+
+
+def _is_literal(pattern):
+    return isinstance(pattern, str) and not REGEX_CHARACTERS.intersection(pattern)
+
+
+def bbox_parts(bbox):
+    """Get the polygons of a bbox filter, which are two polygons when the bbox crosses the antimeridian."""
+    bbox = bbox2poly(*[float(x) for x in listify(bbox)], as_shapely=True)
+    # a bbox that crosses the antimeridian is split into a multipolygon
+    return getattr(bbox, 'geoms', [bbox])
+
+
+def _bbox_expression(bbox):
+    expression = None
+    for part in bbox_parts(bbox):
+        xmin, ymin, xmax, ymax = part.bounds
+        e = ((ds.field('_minx') <= xmax) & (ds.field('_maxx') >= xmin) &
+             (ds.field('_miny') <= ymax) & (ds.field('_maxy') >= ymin))
+        expression = e if expression is None else expression | e
+
+    return expression
+
+
+def _encode(catalog_entries, build, built, merges=0):
+    """Convert a catalog DataFrame into an arrow table sorted along a Hilbert curve."""
+    geometry = _to_geometry_array(catalog_entries.get('geometry'), len(catalog_entries))
+    bounds = shapely.bounds(geometry)
+    order = _hilbert_order(bounds)
+    catalog_entries = catalog_entries.iloc[order]
+    geometry = geometry[order]
+    bounds = bounds[order]
+
+    df = pd.DataFrame(index=np.arange(len(catalog_entries)))
+    df[INDEX_COLUMN] = catalog_entries.index.astype(str)
+
+    json_columns = []
+    for col in catalog_entries.columns:
+        values = catalog_entries[col]
+        if col == 'geometry':
+            continue
+        if values.dtype == object and (col in JSON_COLUMNS or not _is_string_column(values)):
+            df[col] = [_dumps(v) for v in values]
+            json_columns.append(col)
+        else:
+            df[col] = values.values
+
+    # categorical columns are stored as dictionary encoded arrow columns and are read back as categoricals
+    categorize(df, columns=[c for c in df.columns if c not in json_columns + [INDEX_COLUMN]])
+    df['geometry'] = shapely.to_wkb(geometry)
+    df[GEOM_TYPE_COLUMN] = pd.Categorical(_geom_type_names(geometry))
+    df[BBOX_COLUMNS] = bounds
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({
+        _VERSION_KEY: CATALOG_CACHE_VERSION.encode(),
+        _BUILD_KEY: build.encode(),
+        _BUILT_KEY: built.isoformat().encode(),
+        _MERGES_KEY: str(merges).encode(),
+        _JSON_COLUMNS_KEY: json.dumps(json_columns).encode(),
+    })
+
+    return table.replace_schema_metadata(metadata)
+
+
+def _decode(table, json_columns):
+    """Convert an arrow table read from the cache back into a catalog DataFrame."""
+    # json and geometry columns are decoded directly from arrow rather than first being converted to pandas
+    decoded = [c for c in json_columns + ['geometry'] if c in table.column_names]
+    dropped = [c for c in table.column_names if _is_internal(c)]
+    df = table.drop(decoded + dropped).to_pandas()
+    df.index = df.pop(INDEX_COLUMN).values
+
+    for col in decoded:
+        if col == 'geometry':
+            df[col] = shapely.from_wkb(table.column(col).to_numpy(zero_copy_only=False))
+        else:
+            df[col] = _loads(table.column(col))
+
+    return df
+
+
+def _hilbert_order(bounds):
+    """Get the order of rows along a Hilbert curve through the centers of their bounding boxes.
+
+    Rows without a geometry are placed last.
+    """
+    n = 2 ** HILBERT_BITS
+    centers = np.column_stack([(bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2])
+    valid = ~np.isnan(centers).any(axis=1)
+    d = np.full(len(centers), np.iinfo(np.int64).max, dtype=np.int64)
+    if not valid.any():
+        return np.arange(len(centers))
+
+    lower = centers[valid].min(axis=0)
+    extent = np.maximum(centers[valid].max(axis=0) - lower, np.finfo(float).eps)
+    x, y = ((centers[valid] - lower) / extent * (n - 1)).astype(np.int64).T
+
+    h = np.zeros(len(x), dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        h += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the curve is continuous
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s //= 2
+
+    d[valid] = h
+
+    return np.argsort(d, kind='stable')
+
+
+def _to_geometry_array(geometry, n):
+    if geometry is None:
+        return np.full(n, None, dtype=object)
+
+    values = np.empty(n, dtype=object)
+    for i, v in enumerate(geometry):
+        if v is None or isinstance(v, shapely.Geometry):
+            values[i] = v
+        elif isinstance(v, dict):
+            values[i] = shapely.geometry.shape(v)
+        elif isinstance(v, str):
+            values[i] = shapely.from_geojson(v) if v.lstrip().startswith('{') else shapely.from_wkt(v)
+        else:
+            values[i] = None
+
+    return values
+
+
+def _geom_type_names(geometry):
+    names = np.array(['Point', 'LineString', 'LinearRing', 'Polygon', 'MultiPoint',
+                      'MultiLineString', 'MultiPolygon', 'GeometryCollection'], dtype=object)
+    type_ids = shapely.get_type_id(geometry)
+    result = np.full(len(type_ids), None, dtype=object)
+    idx = type_ids >= 0
+    result[idx] = names[type_ids[idx]]
+
+    return result
+
+
+def _is_string_column(values):
+    return all(v is None or v != v or isinstance(v, str) for v in values)
+
+
+def _loads(column):
+    # decoding a single json array is much faster than decoding each value separately
+    text = '[{}]'.format(','.join(pc.fill_null(column, 'null').to_pylist()))
+    # the slower object hook is only used when there are tagged dates to decode (see `_json_default`)
+    return json.loads(text, object_hook=_decode_dates if '"$date' in text else None)
+
+
+def _dumps(value):
+    # NaN is used as a missing value by pandas and is stored as null
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+
+    return json.dumps(value, default=_json_default)
+
+
+def _json_default(obj):
+    # dates are tagged so that they are read back as dates rather than as strings
+    if isinstance(obj, (datetime.datetime, np.datetime64)):
+        return {_DATETIME_TAG: pd.Timestamp(obj).isoformat()}
+    if isinstance(obj, datetime.date):
+        return {_DATE_TAG: obj.isoformat()}
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, tuple, np.ndarray)):
+        return list(obj)
+
+    return str(obj)
+
+
+def _decode_dates(obj):
+    if len(obj) == 1:
+        if _DATETIME_TAG in obj:
+            return pd.Timestamp(obj[_DATETIME_TAG])
+        if _DATE_TAG in obj:
+            return datetime.date.fromisoformat(obj[_DATE_TAG])
+
+    return obj
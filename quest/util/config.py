@@ -5,7 +5,7 @@ import logging
 import yaml
 import os
 
-from ..database import get_db
+from ..database import get_db, DEFAULT_DB_SETTINGS
 
 log = logging.getLogger(__name__)
 
@@ -66,10 +66,20 @@ def update_settings(config={}):
     settings.setdefault('PROJECTS_DIR', 'projects')
     settings.setdefault('USER_SERVICES', [])
 
-    # reset connection to database in new PROJECT_DIR
-    if 'BASE_DIR' in config.keys() or 'PROJECTS_DIR' in config.keys():
+    # reset connection to database in new PROJECT_DIR or with new database settings
+    if 'BASE_DIR' in config.keys() or 'PROJECTS_DIR' in config.keys() or set(config) & set(DEFAULT_DB_SETTINGS):
         get_db(reconnect=True)
 
+    # restart the task executors with the new task settings
+    if any(k.startswith('TASK_') for k in config):
+        from ..api.tasks import close_executors
+        close_executors()
+
+    # connect with the new http settings
+    if any(k.startswith('HTTP_') for k in config):
+        from .http import close_session
+        close_session()
+
     # reload providers
     if 'USER_SERVICES' in config.keys():
         from ..plugins.plugins import load_providers
@@ -0,0 +1,135 @@
+"""Concurrent downloads with a limit on the downloads that run at the same time for each provider.
+
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.error import URLError
+import time
+
+import requests
+
+from .config import get_settings
+from .http import RETRY_STATUS_CODES, is_retried
+from .log import logger
+
+# used when they are not set in the quest settings
+DEFAULT_DOWNLOAD_SETTINGS = {
+    'DOWNLOAD_WORKERS': 8,  # downloads that run at the same time
+    'DOWNLOAD_PROVIDER_WORKERS': 4,  # downloads from the same provider that run at the same time, or a dict of them
+    'DOWNLOAD_RETRIES': 3,  # retries of a download that failed with a network error outside of the shared http session
+    'DOWNLOAD_BACKOFF': 1.0,  # seconds before the first retry, which are doubled for each retry after it
+    'DOWNLOAD_STATUS_INTERVAL': 1.0,  # seconds between the updates of the status of downloaded datasets
+}
+
+
+def download_setting(key):
+    """Get a download setting from the quest settings (see `DEFAULT_DOWNLOAD_SETTINGS`)."""
+    return get_settings().get(key, DEFAULT_DOWNLOAD_SETTINGS[key])
+
+
+def is_retryable(exception):
+    """Check whether a download failed with an error that may not happen again, e.g. a timeout or a server error.
+
+    Errors of requests that were sent with the shared http session are not retryable, because the session already
+    retried them (see `quest.util.http`), so only the requests of client libraries that use their own connections
+    are retried by the download.
+
+    Args:
+        exception (Exception): the error of the download.
+    Returns:
+        retryable (bool): True if the download should be retried.
+    """
+    if is_retried(exception):
+        return False
+
+    if isinstance(exception, requests.HTTPError):
+        return exception.response is not None and exception.response.status_code in RETRY_STATUS_CODES
+
+    return isinstance(exception, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError, URLError))
+
+
+class DownloadScheduler(object):
+    """Runs downloads in threads, at most `provider_workers` from the same provider at a time.
+
+    Downloads that fail with an error that `is_retryable` are retried after a delay that doubles with each retry.
+
+    Args:
+        n_workers (int, Optional, Default=None): number of downloads that run at the same time.
+        provider_workers (int or dict, Optional, Default=None):
+            number of downloads from the same provider that run at the same time, or a dict of them keyed by provider
+            (providers that are not in the dict have no limit other than `n_workers`).
+        retries (int, Optional, Default=None): number of retries of each download.
+        backoff (float, Optional, Default=None): seconds before the first retry of a download.
+
+        The arguments that are None are read from the DOWNLOAD_* settings (see `DEFAULT_DOWNLOAD_SETTINGS`).
+    """
+
+    def __init__(self, n_workers=None, provider_workers=None, retries=None, backoff=None):
+        self.n_workers = n_workers or download_setting('DOWNLOAD_WORKERS')
+        self.provider_workers = provider_workers or download_setting('DOWNLOAD_PROVIDER_WORKERS')
+        self.retries = retries if retries is not None else download_setting('DOWNLOAD_RETRIES')
+        self.backoff = backoff if backoff is not None else download_setting('DOWNLOAD_BACKOFF')
+        self._stopped = False
+
+    def provider_limit(self, provider):
+        """Get the number of downloads from a provider that run at the same time."""
+        if isinstance(self.provider_workers, dict):
+            return self.provider_workers.get(provider) or self.n_workers
+
+        return self.provider_workers
+
+    def stop(self):
+        """Do not start the downloads that are still queued. The downloads that are running are still reported."""
+        self._stopped = True
+
+    def run(self, jobs):
+        """Run downloads and report each one as soon as it is done.
+
+        Args:
+            jobs (list): tuples of (key, provider, download), where download is a function without arguments.
+        Yields:
+            (key, result, exception): the result of the download of `key`, or the error it failed with.
+        """
+        queues = OrderedDict()  # downloads that wait for a free worker keyed by provider
+        for key, provider, download in jobs:
+            queues.setdefault(provider, deque()).append((key, download))
+
+        running = {}  # keys and providers of the running downloads keyed by future
+        n_running = dict.fromkeys(queues, 0)
+        self._stopped = False
+
+        with ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix='quest-download') as executor:
+            while True:
+                # start the downloads of providers that are below their limit, taking turns between providers
+                started = True
+                while started and not self._stopped and len(running) < self.n_workers:
+                    started = False
+                    for provider, queue in queues.items():
+                        if queue and n_running[provider] < self.provider_limit(provider) \
+                                and len(running) < self.n_workers:
+                            key, download = queue.popleft()
+                            future = executor.submit(self._download, key, download)
+                            running[future] = key, provider
+                            n_running[provider] += 1
+                            started = True
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, provider = running.pop(future)
+                    n_running[provider] -= 1
+                    exception = future.exception()
+                    yield key, None if exception else future.result(), exception
+
+    def _download(self, key, download):
+        for retry in range(self.retries + 1):
+            try:
+                return download()
+            except Exception as e:
+                if retry == self.retries or self._stopped or not is_retryable(e):
+                    raise
+                delay = self.backoff * 2 ** retry
+                logger.info('download of {} failed with {}, retrying in {}s'.format(key, e, delay))
+                time.sleep(delay)
@@ -0,0 +1,221 @@
+"""HTTP client that is shared by the provider plugins.
+
+All requests go through one `requests.Session` per process, which keeps the connections to each host alive between
+requests, retries requests that fail with a connection error or a server error and waits between the requests to hosts
+that have a rate limit. The client is configured with the HTTP_* settings (see `DEFAULT_HTTP_SETTINGS`) and is created
+again when they are changed.
+"""
+from email.utils import parsedate_to_datetime
+from io import BytesIO
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import get_settings
+
+# used when they are not set in the quest settings
+DEFAULT_HTTP_SETTINGS = {
+    'HTTP_TIMEOUT': 60,  # seconds to wait for a connection or for data from the server
+    'HTTP_RETRIES': 5,  # retries of a request that failed with a connection error or one of RETRY_STATUS_CODES
+    'HTTP_BACKOFF': 0.5,  # backoff factor of the retries, which wait for backoff * 2 ** (retry - 1) seconds
+    'HTTP_POOL_SIZE': 16,  # connections to the same host that are kept alive
+    'HTTP_RATE_LIMITS': {},  # requests per second to a host, keyed by host name, e.g. {'waterservices.usgs.gov': 10}
+}
+
+# server errors that are usually transient, 500 is not retried because some services use it for requests without data
+RETRY_STATUS_CODES = [429, 502, 503, 504]
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def http_setting(key):
+    """Get an http setting from the quest settings (see `DEFAULT_HTTP_SETTINGS`)."""
+    return get_settings().get(key, DEFAULT_HTTP_SETTINGS[key])
+
+
+class RateLimiter(object):
+    """Spaces the requests to each host so that they do not exceed its rate limit.
+
+    Args:
+        rate_limits (dict): requests per second keyed by host name.
+    """
+
+    def __init__(self, rate_limits):
+        self.rate_limits = dict(rate_limits or {})
+        self._next_request = {}  # earliest time of the next request keyed by host name
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        """Wait until a request can be sent to a host."""
+        rate = self.rate_limits.get(host)
+        if not rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            request_time = max(now, self._next_request.get(host, now))
+            self._next_request[host] = request_time + 1.0 / rate
+
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
+class QuestHTTPAdapter(HTTPAdapter):
+    """Transport adapter with a default timeout that waits for the rate limit of the host before each request.
+
+    Args:
+        rate_limiter (RateLimiter): rate limits of the hosts.
+        timeout (float, Optional, Default=None): timeout of requests that do not set one.
+        kwargs: arguments of `requests.adapters.HTTPAdapter`.
+    """
+
+    def __init__(self, rate_limiter, timeout=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        super(QuestHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        request.quest_retried = True  # errors of the request were retried by `max_retries`, see `is_retried`
+        self.rate_limiter.wait(urlparse(request.url).hostname)
+        return super(QuestHTTPAdapter, self).send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def _new_adapter():
+    retries = Retry(
+        total=http_setting('HTTP_RETRIES'),
+        backoff_factor=http_setting('HTTP_BACKOFF'),
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False,  # the last response is returned, as without retries
+    )
+    pool_size = http_setting('HTTP_POOL_SIZE')
+    return QuestHTTPAdapter(RateLimiter(http_setting('HTTP_RATE_LIMITS')), timeout=http_setting('HTTP_TIMEOUT'),
+                            max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
+
+
+def is_retried(exception):
+    """Check whether a request error comes from a request of the shared session, which retries transient errors.
+
+    Args:
+        exception (Exception): the error, e.g. a `requests.ConnectionError` or a `requests.HTTPError`.
+    Returns:
+        retried (bool): True if the request was sent with the shared session, or a session mounted on it.
+    """
+    return getattr(getattr(exception, 'request', None), 'quest_retried', False)
+
+
+def get_session():
+    """Get the http session of this process, which is created with the current settings the first time.
+
+    Returns:
+        session (requests.Session): the shared session.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        # connection pools cannot be shared with a forked process
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            mount(session, _new_adapter())
+            _session, _session_pid = session, os.getpid()
+
+        return _session
+
+
+def close_session():
+    """Close the connections of the http session, which is created again with the current settings when needed."""
+    global _session
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+
+
+def mount(session, adapter=None):
+    """Send the requests of another session (e.g. of a client library) through the connection pools of the shared one.
+
+    Args:
+        session (requests.Session): the session.
+        adapter (HTTPAdapter, Optional, Default=None): the adapter to mount, the one of the shared session by default.
+    Returns:
+        session (requests.Session): the session.
+    """
+    adapter = adapter or get_session().get_adapter('https://')
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get(url, **kwargs):
+    """Send a GET request with the shared session (see `requests.get`)."""
+    return get_session().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    """Send a HEAD request with the shared session (see `requests.head`)."""
+    return get_session().head(url, **kwargs)
+
+
+def read_csv(url, **kwargs):
+    """Read a csv file from a url with the shared session.
+
+    Args:
+        url (string): url of the file.
+        kwargs: arguments of `pandas.read_csv`.
+    Returns:
+        data (pandas.DataFrame): the contents of the file.
+    Raises:
+        requests.HTTPError: if the server responds with an error.
+    """
+    r = get(url)
+    r.raise_for_status()
+    return pd.read_csv(BytesIO(r.content), **kwargs)
+
+
+def download_file(url, path, check_modified=False, chunk_size=64 * 1024, **kwargs):
+    """Download a file with the shared session unless it was downloaded before.
+
+    A file that exists is not downloaded again, unless `check_modified` is True and its size differs from the content
+    length of the url or the url was modified after the file.
+
+    Args:
+        url (string): url of the file.
+        path (string): path to save the file to.
+        check_modified (bool, Optional, Default=False):
+            if True, check the content length and the last modified time of the url when the file exists.
+        chunk_size (int, Optional, Default=65536): number of bytes that are written at a time.
+        kwargs: arguments of `requests.get`.
+    Returns:
+        path (string): the path of the file.
+    """
+    if os.path.exists(path):
+        if not check_modified:
+            return path
+
+        headers = head(url, allow_redirects=True, **kwargs).headers
+        size = headers.get('content-length')
+        modified = headers.get('last-modified')
+        if size is not None and int(size) == os.path.getsize(path) and modified is not None \
+                and parsedate_to_datetime(modified).timestamp() <= os.path.getmtime(path):
+            return path
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial_path = '{}.{}.part'.format(path, threading.get_ident())  # an interrupted download does not leave a file
+    try:
+        with get(url, stream=True, **kwargs) as r:
+            r.raise_for_status()
+            with open(partial_path, 'wb') as f:
+                for content in r.iter_content(chunk_size):
+                    f.write(content)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    return path
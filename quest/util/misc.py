@@ -1,7 +1,8 @@
+import functools
 import os
 import re
 import warnings
-from uuid import uuid4, UUID
+from uuid import uuid4
 
 import shapely.geometry
 import geopandas as gpd
@@ -17,6 +18,12 @@ except ImportError:
 from .config import get_settings
 from ..static import UriType
 
+URI_CACHE_SIZE = 2 ** 16  # number of uris for which the result of `parse_service_uri` is kept
+_UUID4_PATTERN = re.compile(r'[0-9a-f]{12}4[0-9a-f]{3}[89ab][0-9a-f]{15}')
+# matches the prefix of service and publisher uris and whole dataset uris, which are uuids that start with 'd'
+_URI_TYPE_PATTERN = re.compile(r'(svc://)|(pub://)|(d[0-9a-f]{11}4[0-9a-f]{3}[89ab][0-9a-f]{15}\Z)')
+_URI_TYPE_GROUPS = [None, UriType.SERVICE, UriType.PUBLISHER, UriType.DATASET]
+
 
 def _abs_path(path, mkdir=True):
     """Gets the absolute path for a file to be within the Quest directory,
@@ -119,45 +126,42 @@ def classify_uris(uris, grouped=True, as_dataframe=True, require_same_type=False
     Returns:
         A pandas dataframe.
     """
-    uris = listify(uris)
-
-    df = pd.DataFrame(uris, columns=['uri'])
-    df['type'] = UriType.COLLECTION
-
-    uuid_idx = df['uri'].apply(is_uuid)
-    service_idx = df['uri'].str.startswith('svc://')
-    publish_idx = df['uri'].str.startswith('pub://')
-    dataset_idx = uuid_idx & df['uri'].str.startswith('d')
-
-    df['type'][service_idx] = UriType.SERVICE
-    df['type'][publish_idx] = UriType.PUBLISHER
-    df['type'][dataset_idx] = UriType.DATASET
-    df.set_index('uri', drop=False, inplace=True)
-
-    grouped_df = df.groupby('type')
+    uris = list(listify(uris) or [])
+    if raise_if_empty and not uris:
+        raise ValueError('At least one uri must be specified.')
 
-    if raise_if_empty:
-        if df.empty:
-            raise ValueError('At least one uri must be specified.')
+    types = _uri_types(uris)
+    groups = {}
+    for uri, uri_type in zip(uris, types):
+        groups.setdefault(uri_type, []).append(uri)
+    groups = {k: groups[k] for k in sorted(groups)}
 
     if exclude is not None:
         for uri_type in exclude:
-            if uri_type in grouped_df.groups:
+            if uri_type in groups:
                 raise ValueError('Uris for {0} are not allowed.'.format(uri_type))
 
-    if require_same_type and len(grouped_df.groups.keys()) > 1:
+    if require_same_type and len(groups) > 1:
         raise ValueError('All uris must be of the same type')
 
     if not as_dataframe:
-        groups = {k: list(v) for k, v in grouped_df.groups.items()}
         return groups
 
+    df = pd.DataFrame({'uri': uris, 'type': types}, index=pd.Index(uris, name='uri'), columns=['uri', 'type'])
+
     if grouped:
-        return grouped_df
+        return df.groupby('type')
 
     return df
 
 
+def _uri_types(uris):
+    """Get the resource type of each uri in a list (see `classify_uris`)."""
+    # a single regular expression classifies a uri faster than looking it up in a cache or using pandas string methods
+    match = _URI_TYPE_PATTERN.match
+    return [_URI_TYPE_GROUPS[m.lastindex] if m else UriType.COLLECTION for m in map(match, uris)]
+
+
 def construct_service_uri(provider, service, catalog_id=None):
     """Builds a uri from the given parameters.
 
@@ -257,16 +261,8 @@ def is_uuid(uuid):
     Returns:
         If the uuid is version 4 then true, else false otherwise.
     """
-    try:
-        val = UUID(uuid, version=4)
-    except ValueError:
-        # If it's a value error, then the string is not a valid UUID.
-        return False
-
-    # If the uuid_string is a valid hex code, but an invalid uuid4,
-    # the UUID.__init__ will convert it to a valid uuid4.
-    # This is bad for validation purposes.
-    return val.hex == uuid
+    # only the canonical form, i.e. what `UUID(uuid, version=4).hex` would return, is accepted
+    return _UUID4_PATTERN.fullmatch(uuid) is not None
 
 
 def listify(liststr, delimiter=','):
@@ -293,6 +289,7 @@ def listify(liststr, delimiter=','):
         return [liststr]
 
 
+@functools.lru_cache(maxsize=URI_CACHE_SIZE)
 def parse_service_uri(uri):
     """Parses a service uri into separate provider, service, and catalog_id strings.
 
@@ -22,7 +22,8 @@ class DatasetSelector(param.ObjectSelector):
         datasets = quest.api.get_datasets(
             filters=self.filters,
             queries=self.queries,
-            expand=True
+            expand=True,
+            columns=['display_name'],
         )
         return [NamedString(k, v['display_name']) for k, v in datasets.items()]
 
@@ -67,7 +68,8 @@ class DatasetListSelector(param.ListSelector):
         datasets = quest.api.get_datasets(
             filters=self.filters,
             queries=self.queries,
-            expand=True
+            expand=True,
+            columns=['display_name'],
         )
         return [NamedString(k, v['display_name']) for k, v in datasets.items()]
 
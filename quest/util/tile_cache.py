@@ -0,0 +1,227 @@
+"""On-disk cache of map tiles.
+
+Tiles are saved as files in the cache directory, by the url template of the tile service, the zoom level and the tile
+indices. A sqlite index keeps the size of each tile, the time it was last used, the time it was last validated with the
+server and the ETag and Last-Modified headers it was sent with. Tiles that were validated less than their max-age ago
+(the one sent by the server or TILE_CACHE_MAX_AGE) are read from disk without a request. Older tiles are revalidated
+with a conditional request, which only downloads them again if they changed on the server. The least recently used
+tiles are removed when the tiles take up more than TILE_CACHE_SIZE bytes.
+"""
+import collections
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from . import http
+from .config import get_settings
+from .misc import get_cache_dir
+
+# used when they are not set in the quest settings
+DEFAULT_TILE_CACHE_SETTINGS = {
+    'TILE_CACHE_SIZE': 1024 ** 3,  # bytes of tiles that are kept on disk, 0 to not cache tiles
+    'TILE_CACHE_MAX_AGE': 7 * 24 * 3600,  # seconds a tile is used without revalidation, unless the server sets max-age
+}
+
+_tile_caches = {}  # tile caches keyed by path and settings
+_tile_caches_lock = threading.Lock()
+
+
+def tile_cache_setting(key):
+    """Get a tile cache setting from the quest settings (see `DEFAULT_TILE_CACHE_SETTINGS`)."""
+    return get_settings().get(key, DEFAULT_TILE_CACHE_SETTINGS[key])
+
+
+def get_tile_cache():
+    """Get the tile cache in the cache directory with the current TILE_CACHE_* settings.
+
+    Returns:
+        tile_cache (TileCache): the tile cache, or None if TILE_CACHE_SIZE is 0.
+    """
+    max_size = tile_cache_setting('TILE_CACHE_SIZE')
+    if not max_size:
+        return None
+
+    key = os.path.join(get_cache_dir(), 'tiles'), max_size, tile_cache_setting('TILE_CACHE_MAX_AGE')
+    with _tile_caches_lock:
+        if key not in _tile_caches:
+            # the caches with previous settings are not closed, because downloads that are running may still use them,
+            # their connections are closed when they are garbage collected
+            _tile_caches.clear()
+            _tile_caches[key] = TileCache(*key)
+
+        return _tile_caches[key]
+
+
+def _max_age(response):
+    """Get the seconds a response can be used without revalidation from its Cache-Control header, if it has one."""
+    cache_control = response.headers.get('cache-control', '')
+    if 'no-cache' in cache_control:
+        return 0
+    match = re.search(r'max-age=(\d+)', cache_control)
+    return int(match.group(1)) if match else None
+
+
+class TileCache(object):
+    """Tiles saved on disk with their least recently used time.
+
+    Args:
+        path (string): directory of the cache.
+        max_size (int): bytes of tiles that are kept.
+        max_age (float, Optional, Default=604800):
+            seconds a tile is used without revalidation, unless the server sent a max-age with the tile.
+
+    Attributes:
+        stats (collections.Counter): number of `hits` (tiles read from disk), `revalidations` (tiles read from disk
+            after the server confirmed they did not change), `misses` (tiles downloaded) and `evictions` of this
+            instance.
+    """
+
+    def __init__(self, path, max_size, max_age=DEFAULT_TILE_CACHE_SETTINGS['TILE_CACHE_MAX_AGE']):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(path, 'index.sqlite'), timeout=30, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL').fetchall()
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS tiles (key TEXT PRIMARY KEY, size INTEGER, '
+                                 'etag TEXT, last_modified TEXT, max_age REAL, validated REAL, accessed REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed)')
+        self._size = self._total_size()
+
+    def tile_path(self, url_template, z, x, y):
+        """Get the path of the file of a tile."""
+        service = hashlib.sha1(url_template.encode()).hexdigest()[:16]
+        return os.path.join(self.path, service, str(z), str(x), str(y))
+
+    def get(self, url_template, z, x, y):
+        """Get a tile from the cache, or from the server if it is not cached or changed since it was cached.
+
+        Args:
+            url_template (string): url of the tiles with `{Z}`, `{X}` and `{Y}` placeholders.
+            z (int): zoom level.
+            x (int): x index of the tile.
+            y (int): y index of the tile.
+        Returns:
+            content (bytes): the tile, or None if the server does not have it.
+        """
+        key = '{} {} {} {}'.format(url_template, z, x, y)
+        path = self.tile_path(url_template, z, x, y)
+        with self._lock:
+            row = self._connection.execute('SELECT etag, last_modified, max_age, validated FROM tiles WHERE key = ?',
+                                           (key,)).fetchone()
+
+        headers = {}
+        if row is not None:
+            etag, last_modified, max_age, validated = row
+            if time.time() < validated + (self.max_age if max_age is None else max_age):
+                content = self._read(key, path)
+                if content is not None:
+                    self._count('hits')
+                    return content
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        response = http.get(url_template.format(Z=z, X=x, Y=y), headers=headers)
+        if response.status_code == 304:
+            with self._lock:
+                self._connection.execute('UPDATE tiles SET max_age = ?, validated = ? WHERE key = ?',
+                                         (_max_age(response), time.time(), key))
+            content = self._read(key, path)
+            if content is not None:
+                self._count('revalidations')
+                return content
+            response = http.get(url_template.format(Z=z, X=x, Y=y))  # the tile was removed since it was checked
+
+        self._count('misses')
+        if response.status_code != 200:
+            return None
+
+        if 'no-store' not in response.headers.get('cache-control', ''):
+            self._write(key, path, response)
+
+        return response.content
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _read(self, key, path):
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None  # removed by another process
+
+        with self._lock:
+            self._connection.execute('UPDATE tiles SET accessed = ? WHERE key = ?', (time.time(), key))
+
+        return content
+
+    def _write(self, key, path, response):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = '{}.{}.part'.format(path, threading.get_ident())
+        with open(partial_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(partial_path, path)
+
+        size = len(response.content)
+        with self._lock:
+            previous = self._connection.execute('SELECT size FROM tiles WHERE key = ?', (key,)).fetchone()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, size, response.headers.get('etag'), response.headers.get('last-modified'),
+                 _max_age(response), time.time(), time.time())
+            )
+            self._size += size - (previous[0] if previous else 0)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Remove the least recently used tiles until the tiles fit in `max_size`."""
+        self._size = self._total_size()  # tiles may have been added by other processes
+        rows = self._connection.execute('SELECT key, size FROM tiles ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= self.max_size:
+                break
+            url_template, z, x, y = key.rsplit(' ', 3)
+            try:
+                os.remove(self.tile_path(url_template, z, x, y))
+            except OSError:
+                pass
+            evicted.append((key,))
+            self._size -= size
+
+        self._connection.executemany('DELETE FROM tiles WHERE key = ?', evicted)
+        self.stats['evictions'] += len(evicted)
+
+    def _total_size(self):
+        return self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM tiles').fetchone()[0]
+
+    def clear(self):
+        """Remove all tiles from the cache."""
+        with self._lock:
+            keys = [key for key, in self._connection.execute('SELECT key FROM tiles')]
+            for key in keys:
+                url_template, z, x, y = key.rsplit(' ', 3)
+                try:
+                    os.remove(self.tile_path(url_template, z, x, y))
+                except OSError:
+                    pass
+            self._connection.execute('DELETE FROM tiles')
+            self._size = 0
+
+    def close(self):
+        """Close the connection to the index of the cache."""
+        with self._lock:
+            self._connection.close()
@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -8,6 +9,10 @@ from quest.plugins import IoBase
 from quest.util import setattr_on_dataframe
 from quest.util.log import logger
 
+# the HDF5 library is not thread safe, so files are read and written one at a time, e.g. by downloads that run at the
+# same time
+_hdf5_lock = threading.Lock()
+
 
 class XYHdf5(IoBase):
     name = 'xy-hdf5'
@@ -20,7 +25,7 @@ class XYHdf5(IoBase):
     def read(self, path):
         """Read metadata and dataframe from HDF5 store."""
 
-        with pd.HDFStore(path) as h5store:
+        with _hdf5_lock, pd.HDFStore(path) as h5store:
             dataframe = h5store.get('dataframe')
             setattr_on_dataframe(dataframe, 'metadata', h5store.get_storer('dataframe').attrs.metadata)
         return dataframe
@@ -30,7 +35,7 @@ class XYHdf5(IoBase):
         base, fname = os.path.split(file_path)
 
         os.makedirs(base, exist_ok=True)
-        with pd.HDFStore(file_path) as h5store:
+        with _hdf5_lock, pd.HDFStore(file_path) as h5store:
             h5store.put('dataframe', dataframe)
             h5store.get_storer('dataframe').attrs.metadata = metadata
 
@@ -2,7 +2,7 @@ from quest.plugins import ProviderBase, SingleFileServiceBase, PublishBase
 from hs_restclient import HydroShare, HydroShareAuthBasic
 from quest.database.database import get_db, db_session
 from quest.api.metadata import get_metadata
-from quest.util import param_util, listify, log
+from quest.util import param_util, listify, log, http
 from quest.static import DatasetStatus
 from shapely.geometry import Point, box
 from quest.static import ServiceType
@@ -252,6 +252,7 @@ class HSProvider(ProviderBase):
         try:
             auth = auth or self.auth
             hs = HydroShare(auth=auth, **self.connection_info)
+            http.mount(hs.session)
             list(hs.resources(count=1))
             return hs
         except Exception as e:
@@ -260,6 +261,7 @@ class HSProvider(ProviderBase):
 
         try:
             hs = HydroShare()
+            http.mount(hs.session)
             list(hs.resources(count=1))
         except:
             raise ValueError("Cannot connect to the  HydroShare.")
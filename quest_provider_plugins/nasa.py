@@ -2,7 +2,6 @@ from quest.database.database import get_db, db_session
 from quest.util import log
 from getpass import getpass
 import pandas as pd
-import requests
 
 collections_url = 'https://cmr.earthdata.nasa.gov/search/collections.json?short_name=%s'
 
@@ -27,9 +26,9 @@ class NasaServiceBase(SingleFileServiceBase):
 
     def _read_granules(self, short_name, page_num):
         try:
-            return requests.get(granules_url % (short_name, page_num), auth=(self.info['username'], self.info['password'])).json()['feed']['entry']
+            return self.provider.http.get(granules_url % (short_name, page_num), auth=(self.info['username'], self.info['password'])).json()['feed']['entry']
         except ValueError:
-            return requests.get(granules_url % (short_name, page_num)).json()['feed']['entry']
+            return self.provider.http.get(granules_url % (short_name, page_num)).json()['feed']['entry']
 
     def search_catalog(self, **kwargs):
 
@@ -3,10 +3,11 @@ import os
 
 import pandas as pd
 import param
+from requests import HTTPError
 from urllib.parse import quote, urlencode
-from urllib.error import HTTPError
 
 from quest.plugins import ProviderBase, TimePeriodServiceBase, load_plugins
+from quest.util import http
 from quest.util.log import logger
 
 
@@ -39,17 +40,9 @@ class NoaaServiceBase(TimePeriodServiceBase):
         raise NotImplementedError()
         # TODO drop duplicates?
     
-    @property
-    def catalog_id(self):
-        return self._catalog_id
-
-    @property
-    def parameter_code(self):
-        pmap = self.parameter_map(invert=True)
-        return pmap[self.parameter]
-
-    @property
-    def url(self):
+    # the download options are passed to `_url` rather than set on the service, which is shared by the downloads that
+    # run at the same time
+    def _url(self, catalog_id, parameter_code, start, end, p):
         raise NotImplementedError()
 
     def parameter_map(self, invert=False):
@@ -62,18 +55,17 @@ class NoaaServiceBase(TimePeriodServiceBase):
 
     def download(self, catalog_id, file_path, dataset, **kwargs):
         p = param.ParamOverrides(self, kwargs)
-        self.parameter = p.parameter
-        self.end = pd.to_datetime(p.end)
-        self.start = pd.to_datetime(p.start)
-        self._catalog_id = catalog_id
+        parameter_code = self.parameter_map(invert=True)[p.parameter]
+        end = pd.to_datetime(p.end)
+        start = pd.to_datetime(p.start)
 
         if dataset is None:
             dataset = 'station-' + catalog_id
 
         try:
-            url = self.url
+            url = self._url(catalog_id, parameter_code, start, end, p)
             logger.info('downloading data from %s' % url)
-            data = pd.read_csv(url)
+            data = http.read_csv(url)
 
             if data.empty:
                 raise ValueError('No Data Available')
@@ -83,7 +75,7 @@ class NoaaServiceBase(TimePeriodServiceBase):
             data.rename(columns=rename, inplace=True)
             data = data.set_index('time')
             data.index = pd.to_datetime(data.index)
-            data.rename(columns={self.parameter_code: self.parameter})
+            data.rename(columns={parameter_code: p.parameter})
 
             file_path = os.path.join(file_path, self.BASE_PATH, self.service_name, dataset, '{0}.h5'.format(dataset))
 
@@ -92,7 +84,7 @@ class NoaaServiceBase(TimePeriodServiceBase):
                 'file_format': 'timeseries-hdf5',
                 'datatype': 'timeseries',
                 'parameter': p.parameter,
-                'unit': units[self.parameter_code],
+                'unit': units[parameter_code],
                 'service_id': 'svc://noaa:{}/{}'.format(self.service_name, catalog_id)
             }
 
@@ -104,9 +96,9 @@ class NoaaServiceBase(TimePeriodServiceBase):
             return metadata
 
         except HTTPError as error:
-            if error.code == 500:
+            if error.response.status_code == 500:
                 raise ValueError('No Data Available')
-            elif error.code == 400:
+            elif error.response.status_code == 400:
                 raise ValueError('Bad Request')
             else:
                 raise error
@@ -167,17 +159,16 @@ class NoaaServiceNDBC(NoaaServiceBase):
         objects=sorted(_parameter_map.values())
     )
 
-    @property
-    def url(self):
+    def _url(self, catalog_id, parameter_code, start, end, p):
 
-        variables = 'time', self.parameter_code
+        variables = 'time', parameter_code
 
         return self._format_url(dataset_id=self._dataset_id, variables=variables,
-                                station=self.catalog_id, start_time=self.start, end_time=self.end)
+                                station=catalog_id, start_time=start, end_time=end)
 
     def search_catalog(self, **kwargs):
         variables = 'station', 'longitude', 'latitude'
-        df = pd.read_csv(self._format_url(dataset_id=self._dataset_id, variables=variables))
+        df = http.read_csv(self._format_url(dataset_id=self._dataset_id, variables=variables))
         df.rename(columns={
             'station': 'service_id',
             'longitude (degrees_east)': 'longitude',
@@ -239,15 +230,14 @@ class NoaaServiceCoopsMet(NoaaServiceBase):
         objects=sorted(_parameter_map.values())
     )
 
-    @property
-    def url(self):
+    def _url(self, catalog_id, parameter_code, start, end, p):
 
-        location = self._location_id_map[self.parameter_code]
+        location = self._location_id_map[parameter_code]
         dataset_id = 'nosCoops{}'.format(location)
-        variables = 'time', self.parameter_code
+        variables = 'time', parameter_code
 
         return self._format_url(dataset_id=dataset_id, variables=variables,
-                                stationID=self.catalog_id, start_time=self.start, end_time=self.end)
+                                stationID=catalog_id, start_time=start, end_time=end)
 
     def search_catalog(self, **kwargs):
         # hard coding for now
@@ -257,7 +247,7 @@ class NoaaServiceCoopsMet(NoaaServiceBase):
 
         # coops_url = [self.BASE_URL + '{}.csvp?stationID%2Clongitude%2Clatitude'.format(id) for id in dataset_Ids]
         coops_url = [self._format_url(dataset_id=dataset_id, variables=variables) for dataset_id in dataset_services]
-        df = pd.concat([pd.read_csv(f) for f in coops_url])
+        df = pd.concat([http.read_csv(f) for f in coops_url])
 
         df.rename(columns={
             'stationID': 'service_id',
@@ -336,18 +326,17 @@ class NoaaServiceCoopsWater(NoaaServiceBase):
         objects=sorted(_datum_map.values())
     )
 
-    @property
-    def url(self):
-        location = self._location_id_map[self.parameter_code]
-        quality = self.quality[0].capitalize() if self.parameter_code == 'waterLevel' else ''
-        datum = {v: k for k, v in self._datum_map.items()}[self.datum]
-        dataset_id = 'nosCoops{}{}{}'.format(location, quality, self.interval)
+    def _url(self, catalog_id, parameter_code, start, end, p):
+        location = self._location_id_map[parameter_code]
+        quality = p.quality[0].capitalize() if parameter_code == 'waterLevel' else ''
+        datum = {v: k for k, v in self._datum_map.items()}[p.datum]
+        dataset_id = 'nosCoops{}{}{}'.format(location, quality, p.interval)
 
-        variables = 'time', self.parameter_code
+        variables = 'time', parameter_code
 
         return self._format_url(dataset_id=dataset_id, variables=variables,
-                                stationID=self.catalog_id, datum=datum,
-                                start_time=self.start, end_time=self.end)
+                                stationID=catalog_id, datum=datum,
+                                start_time=start, end_time=end)
 
     def search_catalog(self, **kwargs):
         # hard coding for now
@@ -358,7 +347,7 @@ class NoaaServiceCoopsWater(NoaaServiceBase):
 
         coops_url = [self._format_url(dataset_id=dataset_id, variables=variables) for dataset_id in
                      dataset_services]
-        df = pd.concat([pd.read_csv(f) for f in coops_url])
+        df = pd.concat([http.read_csv(f) for f in coops_url])
 
         df.rename(columns={
             'stationID': 'service_id',
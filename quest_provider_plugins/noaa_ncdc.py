@@ -32,11 +32,6 @@ class NcdcServiceBase(TimePeriodServiceBase):
             'parameter_codes': list(self._parameter_map.keys())
         }
 
-    @property
-    def parameter_code(self):
-        pmap = self.parameter_map(invert=True)
-        return pmap[self.parameter]
-
     def search_catalog(self, **kwargs):
         catalog_entries = self._search_catalog()
 
@@ -54,12 +49,9 @@ class NcdcServiceBase(TimePeriodServiceBase):
 
         return catalog_entries
 
-    @property
-    def catalog_entry(self):
-        return self._catalog_entry
-
-    @property
-    def data(self):
+    # the download options are passed to `_get_data` rather than set on the service, which is shared by the downloads
+    # that run at the same time
+    def _get_data(self, catalog_id, parameter, start, end):
         raise NotImplementedError()
 
     def parameter_map(self, invert=False):
@@ -72,10 +64,9 @@ class NcdcServiceBase(TimePeriodServiceBase):
 
     def download(self, catalog_id, file_path, dataset, **kwargs):
         p = param.ParamOverrides(self, kwargs)
-        self.parameter = p.parameter
-        self.end = pd.to_datetime(p.end)
-        self.start = pd.to_datetime(p.start)
-        self._catalog_entry = catalog_id
+        parameter = p.parameter
+        end = pd.to_datetime(p.end)
+        start = pd.to_datetime(p.start)
 
         if dataset is None:
             dataset = 'station-' + catalog_id
@@ -93,14 +84,14 @@ class NcdcServiceBase(TimePeriodServiceBase):
             'file_path': file_path,
             'file_format': 'timeseries-hdf5',
             'datatype': 'timeseries',
-            'parameter': self.parameter,
-            'unit': self._unit_map[self.parameter],
+            'parameter': parameter,
+            'unit': self._unit_map[parameter],
             'service_id': 'svc://ncdc:{}/{}'.format(self.service_name, catalog_id)
         }
 
         # save data to disk
         io = load_plugins('io', 'timeseries-hdf5')['timeseries-hdf5']
-        io.write(file_path, self.data, metadata)
+        io.write(file_path, self._get_data(catalog_id, parameter, start, end), metadata)
         del metadata['service_id']
 
         return metadata
@@ -137,20 +128,20 @@ class NcdcServiceGhcnDaily(NcdcServiceBase):
 
     parameter = param.ObjectSelector(default=None, doc='parameter', precedence=1, objects=sorted(_parameter_map.values()))
 
-    @property
-    def data(self):
-        data = ghcn_daily.get_data(self.catalog_entry,
-                                   elements=self.parameter_code,
+    def _get_data(self, catalog_id, parameter, start, end):
+        parameter_code = self.parameter_map(invert=True)[parameter]
+        data = ghcn_daily.get_data(catalog_id,
+                                   elements=parameter_code,
                                    as_dataframe=True)  # [parameter_code]
-        if not data or data[self.parameter_code].empty:
+        if not data or data[parameter_code].empty:
             raise ValueError('No Data Available')
 
-        data = data[self.parameter_code]
+        data = data[parameter_code]
 
-        data = data[self.start_string:self.end_string]
+        data = data[start.strftime('%Y-%m-%d'):end.strftime('%Y-%m-%d')]
         if data.empty:
             raise ValueError('No Data Available')
-        data.rename(columns={'value': self.parameter}, inplace=True)
+        data.rename(columns={'value': parameter}, inplace=True)
 
         return data
 
@@ -185,22 +176,22 @@ class NcdcServiceGsod(NcdcServiceBase):
     }
     parameter = param.ObjectSelector(default=None, doc='parameter', precedence=1, objects=sorted(_parameter_map.values()))
 
-    @property
-    def data(self):
-        data = gsod.get_data(self.catalog_entry, start=self.start, end=self.end,
-                             parameters=self.parameter_code)
+    def _get_data(self, catalog_id, parameter, start, end):
+        parameter_code = self.parameter_map(invert=True)[parameter]
+        data = gsod.get_data(catalog_id, start=start, end=end,
+                             parameters=parameter_code)
 
-        if not data or not data[self.catalog_entry]:
+        if not data or not data[catalog_id]:
             raise ValueError('No Data Available')
 
-        data = data[self.catalog_entry]
+        data = data[catalog_id]
         data = pd.DataFrame(data)
         if data.empty:
             raise ValueError('No Data Available')
 
         data = data.set_index('date')
         data.index = pd.PeriodIndex(data.index, freq='D')
-        data.rename(columns={self.parameter_code: self.parameter}, inplace=True)
+        data.rename(columns={parameter_code: parameter}, inplace=True)
 
         return data
 
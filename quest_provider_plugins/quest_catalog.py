@@ -1,6 +1,7 @@
 from quest.plugins import ProviderBase, SingleFileServiceBase
 from quest.database.database import select_catalog_entries
 from quest.static import ServiceType
+from quest import util
 import pandas as pd
 
 
@@ -18,9 +19,18 @@ class QuestCatalogService(SingleFileServiceBase):
     ]
     _parameter_map = {}
 
-    def search_catalog(self, **kwargs):
+    def search_catalog(self, catalog_ids=None, bbox=None, **kwargs):
+        # the bbox is pre-filtered with the spatial index of the database and then applied exactly by `search_catalog`
+        if catalog_ids is None:
+            return pd.DataFrame(select_catalog_entries(bbox=bbox))
 
-        return pd.DataFrame(select_catalog_entries())
+        return pd.DataFrame(select_catalog_entries(lambda e: e.service_id in catalog_ids, bbox=bbox))
+
+    def get_catalog_entries(self, catalog_ids, update_cache=False):
+        # entries are selected from the database by id rather than loading the whole catalog
+        catalog_ids = [str(i) for i in catalog_ids]
+        catalog_entries = self.search_catalog_wrapper(catalog_ids=list(dict.fromkeys(catalog_ids)))
+        return catalog_entries.loc[[util.construct_service_uri(self.provider.name, self.name, i) for i in catalog_ids]]
 
 
 class QuestCatalogProvider(ProviderBase):
@@ -1,7 +1,6 @@
 """providers based on www.sciencebase.gov."""
 
 import pandas as pd
-import requests
 from quest.plugins import ProviderBase, SingleFileServiceBase
 from quest import util
 
@@ -29,7 +28,7 @@ class UsgsNlcdServiceBase(SingleFileServiceBase):
             ('parentId', self._parent_id)
         ]
 
-        r = requests.get(base_url, params=params)
+        r = self.provider.http.get(base_url, params=params)
         catalog_entries = pd.DataFrame(r.json()['items'])
         catalog_entries = catalog_entries.loc[~catalog_entries.title.str.contains('Imperv')]
         catalog_entries = catalog_entries.loc[~catalog_entries.title.str.contains('by State')]
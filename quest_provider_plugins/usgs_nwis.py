@@ -3,6 +3,7 @@
 from quest.plugins import ProviderBase, TimePeriodServiceBase, load_plugins
 import concurrent.futures
 from functools import partial
+import numpy as np
 import pandas as pd
 import os
 from ulmo.usgs import nwis
@@ -13,6 +14,7 @@ BASE_PATH = 'usgs-nwis'
 
 
 class NwisServiceBase(TimePeriodServiceBase):
+    max_catalog_merges = 6  # removed sites are dropped when the catalog is rebuilt, every 7 months by default
     period = param.String(default='P365D', precedence=4, doc='time period (e.g. P365D = 365 days or P4W = 4 weeks)')
 
     def download(self, catalog_id, file_path, dataset, **kwargs):
@@ -83,12 +85,28 @@ class NwisServiceBase(TimePeriodServiceBase):
         return metadata
 
     def search_catalog(self, **kwargs):
-        func = partial(_nwis_catalog_entries, service=self.service_name)
+        return self._search_sites()
+
+    def search_catalog_updates(self, since):
+        """Get the sites that were added or changed since a time.
+
+        The site service cannot query for sites that were removed, so no deleted sites are returned and the whole
+        catalog is downloaded again after `max_catalog_merges` updates to drop them.
+        """
+        # the site service only accepts the modification window as a duration relative to now
+        hours = int(np.ceil((pd.Timestamp.now(tz='UTC') - since) / pd.Timedelta(hours=1)))
+        return self._search_sites(modifiedSince='PT{}H'.format(max(hours, 1))), []
+
+    def _search_sites(self, **kwargs):
+        func = partial(_nwis_catalog_entries, service=self.service_name, **kwargs)
         with concurrent.futures.ProcessPoolExecutor() as executor:
             sites = executor.map(func, _states())
 
         sites = {k: v for d in sites for k, v in d.items()}
         df = pd.DataFrame.from_dict(sites, orient='index')
+        if df.empty:
+            return df
+
         # df['_geom_type'] = 'Point'
         for col in ['latitude', 'longitude']:
             df[col] = df['location'].apply(lambda x: float(x[col]))
@@ -103,7 +121,7 @@ class NwisServiceBase(TimePeriodServiceBase):
         return df
 
     def get_parameters(self, catalog_ids=None):
-        df = self.search_catalog()
+        df = self.search_catalog() if catalog_ids is None else catalog_ids
 
         chunks = list(_chunks(df.index.tolist()))
         func = partial(_site_info, service=self.service_name)
@@ -204,8 +222,8 @@ def _chunks(l, n=100):
         yield l[i:i+n]
 
 
-def _nwis_catalog_entries(state, service):
-    return nwis.get_sites(state_code=state, service=service)
+def _nwis_catalog_entries(state, service, **kwargs):
+    return nwis.get_sites(state_code=state, service=service, **kwargs)
 
 
 def _nwis_parameters(site, service):
@@ -1,15 +1,15 @@
 from quest.plugins import ProviderBase, SingleFileServiceBase
-from quest.util import listify
-from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
+from quest.util import listify, http
+from quest.util.tile_cache import get_tile_cache
 from quest.static import ServiceType
 from shapely.geometry import box
-from itertools import product
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice, product
 from io import BytesIO
 from PIL import Image
+from rasterio.windows import Window
 import pandas as pd
 import numpy as np
-import requests
 import rasterio
 import logging
 import param
@@ -19,6 +19,7 @@ import os
 TILE_SIZE = 256
 MAX_ZOOM = 19
 WMTS_EPSG = 3857
+TILE_WORKERS = 8  # tiles that are downloaded at the same time
 
 log = logging.getLogger('quest')
 
@@ -79,11 +80,9 @@ class WMTSImageryService(SingleFileServiceBase):
             crop_bbox = None
             adjusted_bbox = tile_bbox
 
-        image_array = self._download_and_stitch_tiles(p.url, tile_indices, crop_bbox, p.zoom_level, p.max_tiles)
-
         file_path = os.path.join(file_path, dataset + '.tiff')
 
-        self._write_image_to_tif(image_array, adjusted_bbox, file_path)
+        self._download_tiles_to_tif(p.url, tile_indices, crop_bbox, p.zoom_level, p.max_tiles, adjusted_bbox, file_path)
 
         metadata = {
             'metadata': {'bbox': adjusted_bbox},
@@ -239,8 +238,12 @@ class WMTSImageryService(SingleFileServiceBase):
         return xmin_pixel, ymin_pixel, xmax_pixel, ymax_pixel
 
     @staticmethod
-    def _download_and_stitch_tiles(url, tile_indices, crop_bbox, zoom_level, max_tiles):
-        """Download a set of WMTS tiles and stitch them into a single image.
+    def _download_tiles_to_tif(url, tile_indices, crop_bbox, zoom_level, max_tiles, bbox, file_path):
+        """Download a set of WMTS tiles and write them into a tiled GeoTiff with a WebMercator CRS.
+
+        Tiles are downloaded by `TILE_WORKERS` threads and each tile is written to its window of the GeoTiff as soon as
+        it is downloaded, so only the tiles that are being downloaded are kept in memory rather than the whole image.
+        Tiles are read from the tile cache when they were downloaded before (see `quest.util.tile_cache`).
 
         Args:
             url (string, required):
@@ -248,18 +251,19 @@ class WMTSImageryService(SingleFileServiceBase):
             tile_indices (tuple, required):
                 a tuple of tile indices indicating the range of tiles to download in the form (xmin, ymin, xmax, ymax)
             crop_bbox (tuple, required):
-                a tuple of pixel indices relative to the stitched image to crop the image by. If `None` then image
+                a tuple of pixel indices relative to the stitched tiles to crop the image by. If `None` then image
                  won't be cropped.
             zoom_level (int, required):
                 the zoom level of the WMTS tile indices
             max_tiles (int, required):
                 a number between 1 and `zoom_level`^4 to limit the number of tiles retrieved.
+            bbox (tuple, required):
+                lon/lat bounding box for image in the form (lon_min, lat_min, lon_max, lat_max)
+            file_path (string, required):
+                file path to save the GeoTiff to
 
         Raises:
             ValueError: if the number of tiles that would be downloaded exceed `max_tiles`
-
-        Returns:
-            A numpy array containing the stitched (and possibly cropped) tiles.
         """
         xmin, ymin, xmax, ymax = tile_indices
 
@@ -275,50 +279,58 @@ class WMTSImageryService(SingleFileServiceBase):
                              "Either increase the tile limit (max_tiles) or decrease the zoom level."
                              .format(total_number_of_tiles, max_tiles))
 
-        stitched_image = Image.new('RGB', (number_of_x_tiles * TILE_SIZE, number_of_y_tiles * TILE_SIZE))
-
-        for x, y in product(x_range, y_range):
-            internet_status = requests.Session()
-            retries = Retry(total=10, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-            if 'https' in url:
-                internet_status.mount('https://', HTTPAdapter(max_retries=retries))
-            elif 'http' in url:
-                internet_status.mount('http://', HTTPAdapter(max_retries=retries))
-            output_feedback = internet_status.get(url.format(Z=zoom_level, X=x, Y=y), verify=True)
-            if output_feedback.status_code == 200:
-                incoming_image = Image.open(BytesIO(output_feedback.content))
-                x_pixel = (x - xmin) * TILE_SIZE
-                y_pixel = (y - ymin) * TILE_SIZE
-                stitched_image.paste(im=incoming_image, box=(x_pixel, y_pixel))
-                incoming_image.close()
-
-        if crop_bbox:
-            stitched_image = stitched_image.crop(box=crop_bbox)
-        image_array = np.array(stitched_image)
-        stitched_image.close()
-
-        return image_array
+        # pixel indices of the image relative to the stitched tiles in the form (xmin, ymin, xmax, ymax)
+        window_bbox = crop_bbox or (0, 0, number_of_x_tiles * TILE_SIZE, number_of_y_tiles * TILE_SIZE)
+        width = window_bbox[2] - window_bbox[0]
+        height = window_bbox[3] - window_bbox[1]
+
+        tile_cache = get_tile_cache()
+
+        def download_tile(x, y):
+            if tile_cache is not None:
+                content = tile_cache.get(url, zoom_level, x, y)
+            else:
+                response = http.get(url.format(Z=zoom_level, X=x, Y=y))
+                content = response.content if response.status_code == 200 else None
+            if content is None:
+                return None  # missing tiles are left black
+            with Image.open(BytesIO(content)) as incoming_image:
+                return np.array(incoming_image.convert('RGB'))
+
+        def write_tile(dst, x, y, tile):
+            # offset of the tile in the image, which is negative for tiles that are cropped on the top or left side
+            x_pixel = (x - xmin) * TILE_SIZE - window_bbox[0]
+            y_pixel = (y - ymin) * TILE_SIZE - window_bbox[1]
+            tile = tile[max(0, -y_pixel):height - y_pixel, max(0, -x_pixel):width - x_pixel]
+            if tile.size:
+                window = Window(max(0, x_pixel), max(0, y_pixel), tile.shape[1], tile.shape[0])
+                dst.write(np.moveaxis(tile, -1, 0), window=window)  # move the bands from the last axis to the first
 
-    @staticmethod
-    def _write_image_to_tif(array, bbox, file_path):
-        """Write an RGB array as a GeoTiff with a WebMercator CRS.
-
-        Args:
-            array (numpy array, required):
-                three band array of RGB values of an image
-            bbox (tuple, required):
-                lon/lat bounding box for image in the form (lon_min, lat_min, lon_max, lat_max)
-            file_path (string, required):
-                file path to save the GeoTiff to
-        """
-        image_array = np.moveaxis(array, -1, 0)  # move the bands from the last axis to the first.
-        count, height, width = image_array.shape
         transform = rasterio.transform.from_bounds(*bbox, width=width, height=height)
         crs = rasterio.crs.CRS.from_epsg(WMTS_EPSG)
-        with rasterio.open(file_path, 'w', driver='GTiff', height=height,
-                           width=width, count=count, dtype=image_array.dtype,
-                           crs=crs, transform=transform) as dst:
-            dst.write(image_array, indexes=[1, 2, 3])
+        tiles = product(y_range, x_range)  # row by row, in the order of the blocks of the GeoTiff
+        try:
+            with rasterio.open(file_path, 'w', driver='GTiff', height=height, width=width, count=3, dtype='uint8',
+                               crs=crs, transform=transform, tiled=True, blockxsize=TILE_SIZE,
+                               blockysize=TILE_SIZE) as dst, ThreadPoolExecutor(TILE_WORKERS) as executor:
+                # at most two tiles per worker are downloaded or waiting to be written at a time
+                downloads = {executor.submit(download_tile, x, y): (x, y) for y, x in islice(tiles, 2 * TILE_WORKERS)}
+                while downloads:
+                    done, _ = wait(downloads, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        x, y = downloads.pop(future)
+                        tile = future.result()
+                        if tile is not None:
+                            write_tile(dst, x, y, tile)
+                        for y, x in islice(tiles, 1):
+                            downloads[executor.submit(download_tile, x, y)] = x, y
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+        if tile_cache is not None:
+            log.info('tile cache of {}: {}'.format(tile_cache.path, dict(tile_cache.stats)))
 
 
 class WMTSImageryProvider(ProviderBase):
@@ -31,13 +31,15 @@ class RstMerge(ToolBase):
 
         datasets = self.datasets
 
-        orig_metadata = get_metadata(datasets[0])[datasets[0]]
-        raster_files = [get_metadata(dataset)[dataset]['file_path'] for dataset in datasets]
+        # the metadata of all datasets is retrieved at once
+        all_metadata = get_metadata(datasets)
+        orig_metadata = all_metadata[datasets[0]]
+        raster_files = [all_metadata[dataset]['file_path'] for dataset in datasets]
 
         for dataset in datasets:
-            if get_metadata(dataset)[dataset]['parameter'] != orig_metadata['parameter']:
+            if all_metadata[dataset]['parameter'] != orig_metadata['parameter']:
                 raise ValueError('Parameters must match for all datasets')
-            if get_metadata(dataset)[dataset]['unit'] != orig_metadata['unit']:
+            if all_metadata[dataset]['unit'] != orig_metadata['unit']:
                 raise ValueError('Units must match for all datasets')
 
         new_metadata = {
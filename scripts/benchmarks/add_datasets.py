@@ -0,0 +1,59 @@
+"""Benchmark adding datasets to a collection.
+
+Compares `quest.api.add_datasets`, which creates all datasets in a single transaction, with calling
+`quest.api.new_dataset` for each catalog entry, which is what `add_datasets` did before. Staging the new datasets
+for download with `quest.api.stage_for_download` is timed as well.
+
+Usage:
+    python add_datasets.py [number of catalog entries]
+"""
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import quest
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+N_LOOP = min(N, 500)  # the per entry loop is timed on fewer entries and extrapolated
+
+
+def catalog_entries(n):
+    uris = ['svc://usgs-nwis:iv/{:08d}'.format(i) for i in range(n)]
+    return pd.DataFrame({'name': uris, 'service': 'svc://usgs-nwis:iv'}, index=uris)
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'BASE_DIR': folder_obj.name, 'CACHE_DIR': folder_obj.name,
+                               'PROJECTS_DIR': folder_obj.name})
+    quest.api.new_project('benchmark')
+    quest.api.set_active_project('benchmark')
+    quest.api.new_collection('loop')
+    quest.api.new_collection('bulk')
+
+    start = time.perf_counter()
+    for _, entry in catalog_entries(N_LOOP).iterrows():
+        quest.api.new_dataset(collection='loop', catalog_entry=entry.to_frame().transpose(), source='download')
+    loop = (time.perf_counter() - start) * N / N_LOOP
+
+    start = time.perf_counter()
+    datasets = quest.api.add_datasets('bulk', catalog_entries(N))
+    bulk = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quest.api.stage_for_download(datasets, options={'parameter': 'streamflow'})
+    stage = time.perf_counter() - start
+
+    print('{} catalog entries'.format(N))
+    print('{:<40} {:>10}'.format('', 'time (s)'))
+    print('{:<40} {:>10.2f}'.format('new_dataset per entry (extrapolated)', loop))
+    print('{:<40} {:>10.2f}'.format('add_datasets', bulk))
+    print('{:<40} {:>10.2f}'.format('stage_for_download', stage))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
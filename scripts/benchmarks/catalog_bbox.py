@@ -0,0 +1,81 @@
+"""Benchmark bbox filtering of a cached service catalog.
+
+Compares a full geometry scan (`GeoDataFrame.intersects` over every catalog entry, which is what
+`quest.api.search_catalog` did for every call) with a search through the spatial index that is saved
+alongside the parquet catalog cache. The scan is timed both on a catalog that is already in memory and
+including loading the catalog from a pickle, as the previous cache did on every search.
+
+Usage:
+    python catalog_bbox.py [number of catalog entries]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+import quest
+from quest.util.catalog_cache import CatalogCache
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+REPEAT = 5
+BBOXES = [
+    [-97.0, 30.0, -96.5, 30.5],  # small area
+    [-100.0, 28.0, -90.0, 38.0],  # state sized area
+    [-125.0, 24.0, -66.0, 50.0],  # continental
+]
+
+
+def synthetic_catalog(n, seed=0):
+    rng = np.random.RandomState(seed)
+    lon = rng.uniform(-125, -66, n)
+    lat = rng.uniform(24, 50, n)
+    return pd.DataFrame({
+        'display_name': ['station {}'.format(i) for i in range(n)],
+        'description': '',
+        'parameters': 'streamflow',
+        'metadata': [{'state': 'TX'}] * n,
+        'geometry': gpd.points_from_xy(lon, lat),
+    }, index=['{:08d}'.format(i) for i in range(n)])
+
+
+def best_of(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT))
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'CACHE_DIR': folder_obj.name})
+
+    catalog_entries = synthetic_catalog(N)
+    cache = CatalogCache('benchmark', 'points')
+    cache.write(catalog_entries)
+    gdf = gpd.GeoDataFrame(catalog_entries, geometry='geometry')
+    pickle_file = os.path.join(folder_obj.name, 'points_catalog.p')
+    catalog_entries.to_pickle(pickle_file)
+    cache.read(filters={'bbox': BBOXES[0]})  # load the spatial index
+
+    print('{} catalog entries, best of {} runs'.format(N, REPEAT))
+    print('{:<30} {:>8} {:>12} {:>16} {:>12}'.format('bbox', 'matches', 'scan (s)', 'load+scan (s)', 'index (s)'))
+    for bbox in BBOXES:
+        poly = quest.util.bbox2poly(*bbox, as_shapely=True)
+        matches = gdf.intersects(poly).sum()
+        assert matches == len(cache.read(filters={'bbox': bbox}, columns=['display_name']))
+
+        def load_and_scan():
+            df = gpd.GeoDataFrame(pd.read_pickle(pickle_file), geometry='geometry')
+            return df[df.intersects(poly)]
+
+        scan = best_of(lambda: gdf[gdf.intersects(poly)])
+        load_scan = best_of(load_and_scan)
+        index = best_of(lambda: cache.read(filters={'bbox': bbox}))
+        print('{:<30} {:>8} {:>12.4f} {:>16.4f} {:>12.4f}'.format(str(bbox), matches, scan, load_scan, index))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark the memory used by a service catalog read from the catalog cache.
+
+Compares the resident size of a labelled catalog (as returned by `ServiceBase.search_catalog_wrapper`) when the
+low-cardinality string columns are categorical, as they are now read from the cache, with the same catalog using
+plain object columns.
+
+Usage:
+    python catalog_memory.py [number of catalog entries]
+"""
+import sys
+import tempfile
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+import quest
+from quest.plugins.base.service_base import ServiceBase
+from quest.util.catalog_cache import CatalogCache
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+
+class Provider(object):
+    name = 'benchmark'
+
+
+def synthetic_catalog(n, seed=0):
+    rng = np.random.RandomState(seed)
+    states = np.array(['AL', 'AK', 'AZ', 'CA', 'CO', 'PA', 'TX', 'WA'], dtype=object)
+    parameters = np.array(['streamflow', 'gage_height', 'streamflow,gage_height', 'water_temperature'], dtype=object)
+    return pd.DataFrame({
+        'display_name': ['station {}'.format(i) for i in range(n)],
+        'description': '',
+        'parameters': parameters[rng.randint(0, len(parameters), n)],
+        'metadata': [{'state': s} for s in states[rng.randint(0, len(states), n)]],
+        'geometry': gpd.points_from_xy(rng.uniform(-125, -66, n), rng.uniform(24, 50, n)),
+    }, index=['{:08d}'.format(i) for i in range(n)])
+
+
+def megabytes(df):
+    return df.drop(columns=['geometry']).memory_usage(deep=True).sum() / 2 ** 20
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'CACHE_DIR': folder_obj.name})
+
+    cache = CatalogCache('benchmark', 'points')
+    cache.write(synthetic_catalog(N))
+    service = ServiceBase(provider=Provider(), name='points')
+
+    categorical = cache.read()
+    service._label_catalog_entries(categorical)
+
+    plain = categorical.astype({c: object for c in categorical.columns if categorical[c].dtype == 'category'})
+
+    print('{} catalog entries, excluding geometries'.format(N))
+    print('{:<20} {:>12}'.format('columns', 'memory (MB)'))
+    print('{:<20} {:>12.1f}'.format('object', megabytes(plain)))
+    print('{:<20} {:>12.1f}'.format('categorical', megabytes(categorical)))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
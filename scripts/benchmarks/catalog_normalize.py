@@ -0,0 +1,96 @@
+"""Benchmark the normalization of raw service catalogs in `ServiceBase.search_catalog_wrapper`.
+
+Compares the previous row by row handling of the reserved fields (`DataFrame.apply` to build points
+and boxes and a dict comprehension over every record to build the metadata column) with the
+vectorized normalization on a synthetic catalog shaped like the USGS NWIS site catalog.
+
+Usage:
+    python catalog_normalize.py [number of catalog entries]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point, box
+
+from quest.plugins.base.service_base import ServiceBase, reserved_catalog_entry_fields, reserved_geometry_fields
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+REPEAT = 3
+
+
+def synthetic_catalog(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({
+        'display_name': ['site {}'.format(i) for i in range(n)],
+        'latitude': rng.uniform(24, 50, n).astype(str),
+        'longitude': rng.uniform(-125, -66, n).astype(str),
+        'state': rng.choice(['TX', 'PA', 'CA', 'NY'], n),
+        'huc': rng.randint(10 ** 7, 10 ** 8, n).astype(str),
+        'elevation': np.where(rng.rand(n) < 0.1, np.nan, rng.uniform(0, 3000, n)),
+        'site_type': 'ST',
+    }, index=['{:08d}'.format(i) for i in range(n)])
+
+
+def synthetic_bbox_catalog(n, seed=0):
+    rng = np.random.RandomState(seed)
+    x, y = rng.uniform(-125, -66, n), rng.uniform(24, 50, n)
+    return pd.DataFrame({
+        'bbox': list(zip(x, y, x + 1, y + 1)),
+        'tile': np.arange(n),
+    }, index=['{:08d}'.format(i) for i in range(n)])
+
+
+def rowwise_normalize(catalog_entries):
+    """The reserved field handling before it was vectorized (with the missing return in `fn` fixed)."""
+    if 'bbox' in catalog_entries.columns:
+        catalog_entries['geometry'] = catalog_entries['bbox'].apply(lambda row: box(*[float(x) for x in row]))
+        del catalog_entries['bbox']
+
+    if {'latitude', 'longitude'}.issubset(catalog_entries.columns):
+        def fn(row):
+            return Point((float(row['longitude']), float(row['latitude'])))
+        catalog_entries['geometry'] = catalog_entries.apply(fn, axis=1)
+        del catalog_entries['latitude']
+        del catalog_entries['longitude']
+
+    if 'display_name' not in catalog_entries.columns:
+        catalog_entries['display_name'] = catalog_entries.index
+
+    if 'description' not in catalog_entries.columns:
+        catalog_entries['description'] = ''
+
+    extra_fields = list(set(catalog_entries.columns.tolist()) - set(reserved_catalog_entry_fields))
+    catalog_entries['metadata'] = [
+        {k: None if v != v else v for k, v in record.items()}
+        for record in catalog_entries[extra_fields].to_dict(orient='records')
+    ]
+    catalog_entries.drop(extra_fields, axis=1, inplace=True)
+    columns = list(set(catalog_entries.columns.tolist()).intersection(reserved_geometry_fields))
+    catalog_entries.drop(columns, axis=1, inplace=True)
+
+    return catalog_entries
+
+
+def best_of(func, catalog_entries):
+    return min(timeit.repeat(lambda: func(catalog_entries.copy()), number=1, repeat=REPEAT))
+
+
+def main():
+    service = ServiceBase.__new__(ServiceBase)
+    print('{} catalog entries, best of {} runs'.format(N, REPEAT))
+    print('{:<12} {:>12} {:>16}'.format('geometry', 'row wise (s)', 'vectorized (s)'))
+    for name, catalog_entries in [('lat/lon', synthetic_catalog(N)), ('bbox', synthetic_bbox_catalog(N))]:
+        expected = rowwise_normalize(catalog_entries.copy())
+        result = service._normalize_catalog_entries(catalog_entries.copy())
+        assert expected.geometry.tolist() == result.geometry.tolist()
+        assert expected.metadata.tolist() == result.metadata.tolist()
+
+        rowwise = best_of(rowwise_normalize, catalog_entries)
+        vectorized = best_of(service._normalize_catalog_entries, catalog_entries)
+        print('{:<12} {:>12.2f} {:>16.2f}'.format(name, rowwise, vectorized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark search_terms filtering of a cached service catalog.
+
+Compares the `search_terms` scan done by `quest.api.search_catalog` (`str.contains` on the string
+representation of every column for every search term) with narrowing down the rows with the text index
+that is saved alongside the parquet catalog cache and then applying the same scan to the candidate rows.
+
+Usage:
+    python catalog_search_terms.py [number of catalog entries]
+"""
+import itertools
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+import quest
+from quest.util.catalog_cache import CatalogCache
+
+from catalog_bbox import synthetic_catalog
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+REPEAT = 3
+SEARCH_TERMS = [
+    ['station 123456'],  # single entry
+    ['station 12345'],  # a few entries
+    ['station 1', 'station 2'],  # most entries
+]
+
+
+def scan(df, terms):
+    idx = np.column_stack([df[col].apply(str).str.contains(term, na=False)
+                           for col, term in itertools.product(df.columns, terms)]).any(axis=1)
+    return df[idx]
+
+
+def best_of(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT))
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'CACHE_DIR': folder_obj.name})
+
+    catalog_entries = synthetic_catalog(N)
+    cache = CatalogCache('benchmark', 'points')
+    print('write: {:.2f}s'.format(best_of(lambda: cache.write(catalog_entries))))
+    df = cache.read()
+
+    print('{} catalog entries, best of {} runs'.format(N, REPEAT))
+    print('{:<30} {:>8} {:>12} {:>12}'.format('search_terms', 'matches', 'scan (s)', 'index (s)'))
+    for terms in SEARCH_TERMS:
+        matches = len(scan(df, terms))
+        assert matches == len(scan(cache.read(filters={'search_terms': terms}), terms))
+
+        scan_time = best_of(lambda: scan(df, terms))
+        index_time = best_of(lambda: scan(cache.read(filters={'search_terms': terms}), terms))
+        print('{:<30} {:>8} {:>12.4f} {:>12.4f}'.format(str(terms), matches, scan_time, index_time))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
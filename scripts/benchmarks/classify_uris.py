@@ -0,0 +1,79 @@
+"""Benchmark the per call overhead of `quest.util.classify_uris` and `quest.util.parse_service_uri`.
+
+`classify_uris` is timed for lists of 1, 100 and 100k uris, together with the previous implementation, which built
+a DataFrame and parsed each uri with `uuid.UUID`. `parse_service_uri` is timed for a uri that was parsed before
+(the result is memoized) and for new uris.
+
+Usage:
+    python classify_uris.py
+"""
+import time
+from uuid import UUID, uuid4
+
+import pandas as pd
+
+from quest import util
+from quest.static import UriType
+
+SIZES = [1, 100, 100000]
+
+
+def previous_is_uuid(uuid):
+    try:
+        val = UUID(uuid, version=4)
+    except ValueError:
+        return False
+    return val.hex == uuid
+
+
+def previous_classify_uris(uris):
+    df = pd.DataFrame(util.listify(uris), columns=['uri'])
+    df['type'] = UriType.COLLECTION
+    uuid_idx = df['uri'].apply(previous_is_uuid)
+    dataset_idx = uuid_idx & df['uri'].str.startswith('d')
+    df.loc[df['uri'].str.startswith('svc://'), 'type'] = UriType.SERVICE
+    df.loc[df['uri'].str.startswith('pub://'), 'type'] = UriType.PUBLISHER
+    df.loc[dataset_idx, 'type'] = UriType.DATASET
+    df.set_index('uri', drop=False, inplace=True)
+    return {k: list(v) for k, v in df.groupby('type').groups.items()}
+
+
+def uris(n):
+    kinds = [
+        lambda: 'd' + uuid4().hex[1:],
+        lambda: 'svc://usgs-nwis:iv/{}'.format(uuid4().hex[:8]),
+        lambda: uuid4().hex[:10],
+    ]
+    return [kinds[i % len(kinds)]() for i in range(n)]
+
+
+def timed(f, make_args, repeat):
+    total = 0
+    for _ in range(repeat):
+        args = make_args()
+        start = time.perf_counter()
+        f(args)
+        total += time.perf_counter() - start
+    return total / repeat
+
+
+def main():
+    print('{:<12} {:>16} {:>16} {:>16}'.format('uris', 'previous (ms)', 'classify (ms)', 'as groupby (ms)'))
+    for n in SIZES:
+        repeat = max(3, 1000 // n)
+        previous = timed(previous_classify_uris, lambda: uris(n), repeat)
+        new = timed(lambda u: util.classify_uris(u, as_dataframe=False), lambda: uris(n), repeat)
+        grouped = timed(util.classify_uris, lambda: uris(n), repeat)
+        print('{:<12} {:>16.3f} {:>16.3f} {:>16.3f}'.format(n, previous * 1e3, new * 1e3, grouped * 1e3))
+
+    service_uris = ['svc://usgs-nwis:iv/{}'.format(uuid4().hex) for _ in range(100000)]
+    for label, repeated in [('memoized', [service_uris[0]] * len(service_uris)), ('new uris', service_uris)]:
+        start = time.perf_counter()
+        for uri in repeated:
+            util.parse_service_uri(uri)
+        print('parse_service_uri ({}): {:.3f} us per call'
+              .format(label, (time.perf_counter() - start) / len(repeated) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Benchmark downloading staged datasets with `quest.api.download_datasets`.
+
+The download of each dataset is replaced by a function that waits for a fixed latency, like a request to a web
+service does, so that the time is spent on scheduling the downloads and updating their status rather than on the
+network. Downloading with a single worker is how datasets were downloaded before, one after the other.
+
+Usage:
+    python download_datasets.py [number of datasets] [latency in seconds]
+"""
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import quest
+import quest.api.datasets
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+
+def download(catalog_entry, file_path, dataset=None, **kwargs):
+    time.sleep(LATENCY)
+    return {'file_path': file_path, 'metadata': {}}
+
+
+def catalog_entries(n):
+    uris = ['svc://usgs-nwis:iv/{:08d}'.format(i) for i in range(n)]
+    return pd.DataFrame({'name': uris, 'service': 'svc://usgs-nwis:iv'}, index=uris)
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'BASE_DIR': folder_obj.name, 'CACHE_DIR': folder_obj.name,
+                               'PROJECTS_DIR': folder_obj.name})
+    quest.api.new_project('benchmark')
+    quest.api.set_active_project('benchmark')
+    quest.api.new_collection('benchmark')
+    datasets = quest.api.add_datasets('benchmark', catalog_entries(N))
+    quest.api.datasets.download = download
+
+    print('{} datasets, {}s per download'.format(N, LATENCY))
+    print('{:<30} {:>10}'.format('', 'time (s)'))
+    for label, workers in [('1 worker', 1), ('4 workers per provider', 4), ('16 workers per provider', 16)]:
+        quest.api.update_settings({'DOWNLOAD_WORKERS': workers, 'DOWNLOAD_PROVIDER_WORKERS': workers})
+        start = time.perf_counter()
+        quest.api.download_datasets(datasets)
+        print('{:<30} {:>10.3f}'.format(label, time.perf_counter() - start))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark listing and filtering the datasets of a project.
+
+Times `quest.api.get_datasets` when its filters, pagination and column selection are evaluated in the database, and
+the same filter when it has to be evaluated by pandas on every dataset (which is how all filters were evaluated
+before). The datasets are read with the given storage backend (see `quest.database.backends`), without its read
+cache except for the last timing, which lists the display names of the datasets as a tool options dialog does.
+
+Usage:
+    python get_datasets.py [number of datasets] [storage backend, Default=sqlite]
+"""
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import quest
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+BACKEND = sys.argv[2] if len(sys.argv) > 2 else 'sqlite'
+REPEAT = 5
+
+
+def catalog_entries(n):
+    uris = ['svc://usgs-nwis:iv/{:08d}'.format(i) for i in range(n)]
+    return pd.DataFrame({'name': uris, 'service': 'svc://usgs-nwis:iv'}, index=uris)
+
+
+def timed(**kwargs):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        quest.api.get_datasets(**kwargs)
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'BASE_DIR': folder_obj.name, 'CACHE_DIR': folder_obj.name,
+                               'PROJECTS_DIR': folder_obj.name, 'DB_BACKEND': BACKEND, 'DB_READ_CACHE_SIZE': 0})
+    quest.api.new_project('benchmark')
+    quest.api.set_active_project('benchmark')
+    quest.api.new_collection('benchmark')
+    datasets = quest.api.add_datasets('benchmark', catalog_entries(N))
+    quest.api.update_metadata(datasets[::100], quest_metadata={'datatype': 'raster'})
+
+    print('{} datasets, {} backend'.format(N, BACKEND))
+    print('{:<50} {:>10}'.format('', 'time (s)'))
+    print('{:<50} {:>10.3f}'.format('names', timed()))
+    print('{:<50} {:>10.3f}'.format('expanded', timed(expand=True)))
+    print('{:<50} {:>10.3f}'.format('dataframe', timed(as_dataframe=True)))
+    print('{:<50} {:>10.3f}'.format('expanded, first page of 50 display names',
+                                    timed(expand=True, columns=['display_name'], limit=50)))
+    print('{:<50} {:>10.3f}'.format('raster query in sql',
+                                    timed(expand=True, queries=["datatype == 'raster'"])))
+    # comparing two fields cannot be translated to sql, so the whole query is evaluated by pandas
+    print('{:<50} {:>10.3f}'.format('raster query in pandas',
+                                    timed(expand=True, queries=["datatype == 'raster' and unit == unit"])))
+
+    quest.api.update_settings({'DB_READ_CACHE_SIZE': 32})
+    print('{:<50} {:>10.3f}'.format('expanded display names (cached)', timed(expand=True, columns=['display_name'])))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
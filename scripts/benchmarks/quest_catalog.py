@@ -0,0 +1,52 @@
+"""Benchmark bbox searches of the local quest catalog.
+
+Times searching the `svc://quest:quest` service with a small bbox, which only reads the catalog entries whose
+bounding boxes intersect the bbox in the r*tree index, and without a bbox, which reads and parses every geometry
+(which is how bbox searches used to work).
+
+Usage:
+    python quest_catalog.py [number of catalog entries]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+from pony.orm import db_session
+import shapely.geometry
+
+import quest
+from quest.database import get_db
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+
+def timed(**filters):
+    start = time.perf_counter()
+    catalog_entries = quest.api.search_catalog('svc://quest:quest', filters=filters)
+    return time.perf_counter() - start, len(catalog_entries)
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'BASE_DIR': folder_obj.name, 'CACHE_DIR': folder_obj.name,
+                               'PROJECTS_DIR': folder_obj.name})
+    quest.api.new_project('benchmark')
+    quest.api.set_active_project('benchmark')
+
+    rng = np.random.RandomState(0)
+    db = get_db()
+    with db_session:
+        for i, (x, y) in enumerate(zip(rng.uniform(-125, -66, N), rng.uniform(24, 50, N))):
+            db.QuestCatalog(service_id='{:08d}'.format(i), geometry=shapely.geometry.Point(x, y).wkb, metadata={})
+
+    print('{} catalog entries'.format(N))
+    print('{:<30} {:>10} {:>10}'.format('', 'time (s)', 'entries'))
+    print('{:<30} {:>10.3f} {:>10}'.format('bbox (r*tree)', *timed(bbox=[-100, 30, -99, 31])))
+    print('{:<30} {:>10.3f} {:>10}'.format('whole catalog', *timed()))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
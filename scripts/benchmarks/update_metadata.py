@@ -0,0 +1,61 @@
+"""Benchmark updating the metadata of datasets.
+
+Compares `quest.api.update_metadata` called once with all datasets, which updates them in a single transaction and
+returns the updated metadata, with calling `update_metadata` for each dataset, which is what tools did before.
+
+Usage:
+    python update_metadata.py [number of datasets]
+"""
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import quest
+from quest.static import DatasetStatus
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+N_LOOP = min(N, 500)  # the per dataset loop is timed on fewer datasets and extrapolated
+
+
+def catalog_entries(n):
+    uris = ['svc://usgs-nwis:iv/{:08d}'.format(i) for i in range(n)]
+    return pd.DataFrame({'name': uris, 'service': 'svc://usgs-nwis:iv'}, index=uris)
+
+
+def main():
+    folder_obj = tempfile.TemporaryDirectory()
+    quest.api.update_settings({'BASE_DIR': folder_obj.name, 'CACHE_DIR': folder_obj.name,
+                               'PROJECTS_DIR': folder_obj.name})
+    quest.api.new_project('benchmark')
+    quest.api.set_active_project('benchmark')
+    quest.api.new_collection('benchmark')
+    datasets = quest.api.add_datasets('benchmark', catalog_entries(N))
+    quest_metadata = {'options': {'parameter': 'streamflow'}, 'status': DatasetStatus.DERIVED}
+
+    start = time.perf_counter()
+    for dataset in datasets[:N_LOOP]:
+        quest.api.update_metadata(dataset, quest_metadata=quest_metadata)
+    loop = (time.perf_counter() - start) * N / N_LOOP
+
+    start = time.perf_counter()
+    quest.api.update_metadata(datasets, quest_metadata=quest_metadata)
+    batched = time.perf_counter() - start
+
+    records = pd.DataFrame({'unit': 'cfs', 'description': ['dataset {}'.format(i) for i in range(N)]}, index=datasets)
+    start = time.perf_counter()
+    quest.api.update_metadata(records)
+    frame = time.perf_counter() - start
+
+    print('{} datasets'.format(N))
+    print('{:<45} {:>10}'.format('', 'time (s)'))
+    print('{:<45} {:>10.2f}'.format('update_metadata per dataset (extrapolated)', loop))
+    print('{:<45} {:>10.2f}'.format('update_metadata', batched))
+    print('{:<45} {:>10.2f}'.format('update_metadata with a frame', frame))
+
+    folder_obj.cleanup()
+
+
+if __name__ == '__main__':
+    main()
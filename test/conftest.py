@@ -55,8 +55,7 @@ def get_or_generate_test_cache(update=False, skip=False):
             continue
         provider_plugin = provider_plugins[provider]
 
-        cache_file = os.path.join(quest.util.get_cache_dir(provider_plugin.name), service + '_catalog.p')
-        if update or not os.path.exists(cache_file):
+        if update or not provider_plugin.services[service].catalog_cache.exists():
             try:
                 print('Updating test cache for service: {0}'.format(name))
                 quest.api.get_tags(name, update_cache=update)
@@ -96,6 +95,14 @@ def api(request, get_base_dir):
         return quest.api
 
 
+@pytest.fixture
+def temp_cache_dir(api, tmpdir):
+    cache_dir = api.get_settings().get('CACHE_DIR')
+    api.update_settings({'CACHE_DIR': str(tmpdir)})
+    yield str(tmpdir)
+    api.update_settings({'CACHE_DIR': cache_dir})
+
+
 @pytest.fixture
 def reset_settings(api, get_base_dir):
     test_settings = {'BASE_DIR': get_base_dir,
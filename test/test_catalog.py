@@ -1,5 +1,11 @@
+import pandas as pd
 import pytest
+from shapely.geometry import Point, box
 
+import quest
+from quest.database import get_db, db_session
+from quest.plugins.base.service_base import ServiceBase
+from quest.util.catalog_cache import CatalogCache
 from data import SERVICES_CATALOG_COUNT, CACHED_SERVICES
 
 slow = pytest.mark.skipif(
@@ -69,6 +75,34 @@ def test_new_catalog_entry(api):
     assert c in api.get_metadata(c)
 
 
+def test_search_quest_catalog_with_bbox(api):
+    inside = api.new_catalog_entry(geom_type='Point', geom_coords=[-94.2, 23.4])
+    outside = api.new_catalog_entry(geometry='POINT (10 10)')
+    crossing = api.new_catalog_entry(geometry='LINESTRING (-100 23.5, -90 23.5)')
+    # the bounding box of this line intersects the bbox but the line does not
+    near = api.new_catalog_entry(geometry='LINESTRING (-100 20, -90 30)')
+    no_geometry = api.new_catalog_entry(metadata={'a': 1})
+
+    catalog_entries = api.search_catalog('svc://quest:quest', filters={'bbox': [-95, 23, -94, 24]})
+    assert sorted(catalog_entries) == sorted([inside, crossing])
+
+    # a bbox that crosses the antimeridian
+    catalog_entries = api.search_catalog('svc://quest:quest', filters={'bbox': '170,0,200,40'})
+    assert catalog_entries == []
+
+    catalog_entries = api.search_catalog('svc://quest:quest', as_dataframe=True)
+    assert {inside, outside, crossing, near, no_geometry}.issubset(catalog_entries.index)
+    assert catalog_entries.loc[outside].geometry.wkt == 'POINT (10 10)'
+    assert catalog_entries.loc[no_geometry].geometry is None
+
+    # deleted entries are removed from the spatial index
+    db = get_db()
+    with db_session:
+        for c in [inside, crossing]:
+            db.QuestCatalog[c.split('/')[-1]].delete()
+    assert api.search_catalog('svc://quest:quest', filters={'bbox': [-95, 23, -94, 24]}) == []
+
+
 def test_delete_catalog_entry(api):
     c = api.new_catalog_entry(geom_type='Point', geom_coords=[-94.2, 23.4])
     d = api.new_dataset(collection='col1', catalog_entry=c, source='derived')
@@ -94,3 +128,158 @@ def test_get_tags(api, service):
     for value in tags.values():
         assert isinstance(value, list)
 
+
+
+class FakeProvider(object):
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def search_catalog(self, service, update_cache=False, **kwargs):
+        if self.fail:
+            raise ValueError('service is unavailable')
+        return pd.DataFrame({'display_name': [service], 'service': pd.Categorical(['svc://' + service])},
+                            index=['svc://{}/1'.format(service)])
+
+    def search_catalog_chunks(self, service, chunksize, update_cache=False, **kwargs):
+        catalog_entries = self.search_catalog(service, update_cache=update_cache, **kwargs)
+        for start in range(0, len(catalog_entries), chunksize):
+            yield catalog_entries.iloc[start:start + chunksize]
+
+    def get_tags(self, service, update_cache=False, prefix=None):
+        if self.fail:
+            raise ValueError('service is unavailable')
+        return {service: ['value']}
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    providers = {'fake-a': FakeProvider(), 'fake-b': FakeProvider(), 'broken': FakeProvider(fail=True)}
+    monkeypatch.setattr(quest.plugins, 'load_providers', lambda update_cache=False: providers)
+    return providers
+
+
+def test_search_catalog_multiple_services(api, fake_providers):
+    uris = ['svc://fake-a:s1', 'svc://fake-b:s2', 'svc://broken:s3', 'svc://fake-a:s1']
+    catalog_entries = api.search_catalog(uris, as_dataframe=True, max_workers=2)
+    assert catalog_entries.display_name.tolist() == ['s1', 's2']
+    assert catalog_entries.service.dtype == 'category'
+
+    assert api.get_tags(uris) == {'s1': ['value'], 's2': ['value']}
+
+    with pytest.raises(ValueError):
+        api.search_catalog('svc://broken:s3')
+
+
+def test_search_catalog_chunks(api, fake_providers):
+    uris = ['svc://fake-a:s1', 'svc://broken:s3', 'svc://fake-b:s2', 'svc://fake-b:s2']
+    chunks = api.search_catalog(uris, chunksize=1)
+    assert list(chunks) == [['svc://s1/1'], ['svc://s2/1']]
+
+    chunks = list(api.search_catalog(uris, as_dataframe=True, chunksize=10, filters={'display_name': 's2'}))
+    assert len(chunks) == 1 and chunks[0].index.tolist() == ['svc://s2/1']
+
+    with pytest.raises(ValueError):
+        list(api.search_catalog('svc://broken:s3', chunksize=10))
+
+
+def test_normalize_catalog_entries():
+    catalog_entries = pd.DataFrame({
+        'latitude': ['30.5', None],
+        'longitude': [-97.0, -98.0],
+        'state': ['TX', None],
+        'elevation': [100.0, float('nan')],
+    }, index=['a', 'b'])
+    catalog_entries = ServiceBase(provider=None)._normalize_catalog_entries(catalog_entries)
+
+    assert catalog_entries.loc['a', 'geometry'].equals(Point(-97.0, 30.5))
+    assert catalog_entries.loc['b', 'geometry'] is None
+    assert catalog_entries.display_name.tolist() == ['a', 'b']
+    assert catalog_entries.metadata.tolist() == [{'state': 'TX', 'elevation': 100.0},
+                                                 {'state': None, 'elevation': None}]
+    assert 'latitude' not in catalog_entries.columns
+
+    catalog_entries = pd.DataFrame({'bbox': [(-100, 25, '-90', 35)]}, index=['c'])
+    catalog_entries = ServiceBase(provider=None)._normalize_catalog_entries(catalog_entries)
+    assert catalog_entries.loc['c', 'geometry'].equals(box(-100, 25, -90, 35))
+    assert catalog_entries.loc['c', 'metadata'] == {}
+
+
+def test_filter_catalog_entries_metadata():
+    from quest.api.catalog import _filter_catalog_entries
+    catalog_entries = pd.DataFrame({'metadata': [
+        {'location': {'state': 'TX'}, 'elevation': 100.0},
+        {'elevation': 'unknown'},
+        {'location': {'state': 'PA'}},
+    ]}, index=['a', 'b', 'c'])
+
+    assert _filter_catalog_entries(catalog_entries, {'location:state': 'TX'}, None).index.tolist() == ['a']
+    assert _filter_catalog_entries(catalog_entries, {'elevation': {'>=': 50}}, None).index.tolist() == ['a']
+    filters = {'location:state': {'in': ['PA', 'NM']}}
+    assert _filter_catalog_entries(catalog_entries, filters, None).index.tolist() == ['c']
+
+
+class RefreshingProvider(object):
+    name = 'test-provider'
+    use_cache = True
+    update_frequency = 'D'
+
+
+class RefreshingService(ServiceBase):
+    _parameter_map = {'00060': 'streamflow'}
+
+    def search_catalog(self, **kwargs):
+        self.searches += 1
+        return pd.DataFrame({'latitude': [30.0, 31.0], 'longitude': [-97.0, -98.0], 'state': ['TX', 'TX']},
+                            index=['a', 'b'])
+
+    def search_catalog_updates(self, since):
+        self.updates.append(since)
+        return pd.DataFrame({'latitude': [32.0], 'longitude': [-99.0], 'state': ['PA']}, index=['c']), ['a']
+
+
+def test_search_catalog_wrapper_refresh(api, monkeypatch, temp_cache_dir):
+    service = RefreshingService(provider=RefreshingProvider(), name='test-service')
+    service.searches, service.updates = 0, []
+
+    assert sorted(service.search_catalog_wrapper().service_id) == ['a', 'b']
+    assert sorted(service.search_catalog_wrapper().service_id) == ['a', 'b']
+    assert service.searches == 1 and service.updates == []
+    assert service.get_tags() == {'state': ['TX']}
+    catalog_entries = service.search_catalog_wrapper()
+    assert catalog_entries.service.dtype == 'category' and catalog_entries.parameters.dtype == 'category'
+    assert catalog_entries.index.tolist() == catalog_entries.name.tolist()
+    assert sorted(catalog_entries.index) == ['svc://test-provider:test-service/a', 'svc://test-provider:test-service/b']
+
+    built = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=2)
+    service.catalog_cache.write(service.catalog_cache.read(), built=built)
+    catalog_entries = service.search_catalog_wrapper()
+    assert sorted(catalog_entries.service_id) == ['b', 'c']
+    assert catalog_entries.loc['svc://test-provider:test-service/c', 'parameters'] == 'streamflow'
+    assert service.searches == 1 and service.updates == [built]
+    assert not service.catalog_cache.is_stale('D')
+    assert sorted(service.get_tags(prefix='st')['state']) == ['PA', 'TX']
+
+    reads = []
+    read_ids = CatalogCache.read_ids
+    monkeypatch.setattr(CatalogCache, 'read_ids', lambda self, ids: reads.append(ids) or read_ids(self, ids))
+    uri = 'svc://test-provider:test-service/c'
+    catalog_entries = service.get_catalog_entries(['c', 'b'])
+    assert catalog_entries.index.tolist() == [uri, 'svc://test-provider:test-service/b']
+    assert catalog_entries.loc[uri, 'metadata'] == {'state': 'PA'}
+    catalog_entries.loc[uri, 'metadata']['state'] = 'changed'
+    assert service.get_catalog_entries(['c']).loc[uri, 'metadata'] == {'state': 'PA'}
+    assert reads == [['c', 'b']]
+    with pytest.raises(KeyError):
+        service.get_catalog_entries(['a'])
+
+    chunks = list(service.search_catalog_chunks(1))
+    assert [len(c) for c in chunks] == [1, 1]
+    assert sorted(pd.concat(chunks).service_id) == ['b', 'c']
+
+    # the whole catalog is downloaded again after max_catalog_merges updates
+    assert service.catalog_cache.merges() == 1
+    service.max_catalog_merges = 1
+    service.catalog_cache.write(service.catalog_cache.read(), built=built, merges=1)
+    assert sorted(service.search_catalog_wrapper().service_id) == ['a', 'b']
+    assert service.searches == 2 and service.updates == [built]
+    assert service.catalog_cache.merges() == 0
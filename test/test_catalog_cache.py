@@ -0,0 +1,258 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+
+import quest
+from quest.util.catalog_cache import CatalogCache
+
+
+@pytest.fixture
+def cache(temp_cache_dir):
+    return CatalogCache('test-provider', 'test-service')
+
+
+@pytest.fixture
+def catalog_entries():
+    return pd.DataFrame({
+        'display_name': ['Station A', 'Station B', 'Tile C'],
+        'description': ['', 'gage on river', ''],
+        'geometry': [Point(-97.5, 30.2), Point(-80.1, 40.0), box(-100, 25, -90, 35)],
+        'metadata': [{'state': 'TX', 'elevation': 100}, {'state': 'PA', 'elevation': None}, {}],
+        'reserved': [None, None, {'download_url': 'http://example.com/c.zip'}],
+        'parameters': ['streamflow', 'streamflow,gage_height', 'elevation'],
+    }, index=['a', 'b', 'c'])
+
+
+def test_catalog_cache_round_trip(cache, catalog_entries):
+    assert not cache.exists()
+    cache.write(catalog_entries)
+    assert cache.exists()
+
+    df = cache.read()
+    assert sorted(df.index) == ['a', 'b', 'c']
+    assert df.loc['a', 'metadata'] == {'state': 'TX', 'elevation': 100}
+    assert df.loc['c', 'reserved'] == {'download_url': 'http://example.com/c.zip'}
+    assert df.loc['b', 'geometry'].equals(Point(-80.1, 40.0))
+    assert df.loc['c', 'geometry'].equals(box(-100, 25, -90, 35))
+
+
+def test_catalog_cache_value_types(cache):
+    metadata = {'begin_date': pd.Timestamp('2020-01-01'), 'end_date': datetime.date(2020, 6, 30),
+                'count': np.int64(3), 'mean': np.float32(1.5)}
+    cache.write(pd.DataFrame({'geometry': [Point(0, 0)], 'metadata': [metadata]}, index=['a']))
+
+    # the values are read back with the same types as before they were cached
+    for df in [cache.read(), cache.read_ids(['a'])]:
+        actual = df['metadata'].iloc[0]
+        assert actual == metadata
+        assert isinstance(actual['begin_date'], pd.Timestamp)
+        assert type(actual['end_date']) is datetime.date
+
+
+def test_catalog_cache_filters(cache, catalog_entries):
+    cache.write(catalog_entries)
+
+    assert sorted(cache.read(filters={'bbox': [-99, 29, -96, 31]}).index) == ['a', 'c']
+    assert cache.read(filters={'parameter': 'gage_height'}).index.tolist() == ['b']
+    assert cache.read(filters={'geom_type': 'Polygon'}).index.tolist() == ['c']
+    assert cache.read(filters={'description': 'river', 'bbox': '-85,35,-75,45'}).index.tolist() == ['b']
+    assert cache.read(filters={'state': 'TX'}).index.tolist() == ['a']
+    # filters that cannot be evaluated on the cache are ignored
+    assert len(cache.read(filters={'county': 'Travis'})) == 3
+
+
+def test_catalog_cache_columns(cache, catalog_entries):
+    cache.write(catalog_entries)
+    df = cache.read(columns=['display_name'])
+    assert df.columns.tolist() == ['display_name']
+    assert sorted(df.index) == ['a', 'b', 'c']
+
+
+@pytest.fixture
+def points_catalog_entries():
+    n = 25000
+    catalog_entries = pd.DataFrame({
+        'display_name': ['station {}'.format(i) for i in range(n)],
+        'geometry': [Point(-180 + 360 * i / n, -60 + (i % 120)) for i in range(n)],
+    }, index=[str(i) for i in range(n)])
+    catalog_entries.loc['0', 'geometry'] = None
+    return catalog_entries
+
+
+def test_catalog_cache_spatial_index(cache, points_catalog_entries):
+    catalog_entries = points_catalog_entries
+    cache.write(catalog_entries)
+
+    bbox = [-10, -5, 10, 5]
+    expected = catalog_entries.geometry.apply(lambda g: g is not None and g.intersects(box(*bbox)))
+    expected = sorted(catalog_entries[expected].index)
+
+    assert sorted(cache.read(filters={'bbox': bbox}).index) == expected
+    assert sorted(cache.read(filters={'bbox': bbox, 'display_name': 'station 1'}).index) == \
+        [i for i in expected if 'station {}'.format(i).find('station 1') >= 0]
+    assert cache.read(filters={'bbox': [0, 80, 10, 85]}).empty
+
+    # bbox that crosses the antimeridian
+    df = cache.read(filters={'bbox': [170, -90, 190, 90]})
+    assert len(df) > 0 and all(g.x >= 170 or g.x <= -170 for g in df.geometry)
+
+
+def test_catalog_cache_text_index(cache, catalog_entries):
+    cache.write(catalog_entries)
+
+    assert cache.read(filters={'search_terms': ['river']}).index.tolist() == ['b']
+    assert sorted(cache.read(filters={'search_terms': ['Station', 'example.com']}).index) == ['a', 'b', 'c']
+    assert sorted(cache.read(filters={'search_terms': ['TX', 'PA']}).index) == ['a', 'b']
+    # labels added by the service are searchable
+    assert len(cache.read(filters={'search_terms': ['test-provider:test-service']})) == 3
+    assert cache.read(filters={'search_terms': ['zip']}).index.tolist() == ['c']
+    assert cache.read(filters={'search_terms': ['POLYGON']}).index.tolist() == ['c']
+    assert cache.read(filters={'display_name': 'ion B'}).index.tolist() == ['b']
+    assert cache.read(filters={'description': 'gage on riv', 'search_terms': ['gage']}).index.tolist() == ['b']
+    assert cache.read(filters={'display_name': 'Station Z'}).empty
+    # regular expressions cannot be evaluated with the index
+    assert len(cache.read(filters={'search_terms': ['Sta.*A']})) == 3
+
+    # the index is rebuilt when the cache is updated
+    catalog_entries.loc['a', 'description'] = 'river gage'
+    cache.write(catalog_entries)
+    assert sorted(cache.read(filters={'search_terms': ['river']}).index) == ['a', 'b']
+
+
+def test_catalog_cache_is_stale(cache, catalog_entries):
+    built = pd.Timestamp('2024-01-15T10:00', tz='UTC')
+    cache.write(catalog_entries, built=built)
+    assert cache.built() == built
+
+    assert not cache.is_stale('M', now=pd.Timestamp('2024-02-15T09:00', tz='UTC'))
+    assert cache.is_stale('M', now=pd.Timestamp('2024-02-15T10:00', tz='UTC'))
+    assert not cache.is_stale('D', now=built + pd.Timedelta(hours=23))
+    assert cache.is_stale('D', now=built + pd.Timedelta(days=1))
+    assert not cache.is_stale(None, now=built + pd.Timedelta(days=1000))
+
+
+def test_catalog_cache_merge(cache, catalog_entries):
+    cache.write(catalog_entries)
+
+    changed = catalog_entries.loc[['b']].copy()
+    changed['display_name'] = 'Station B2'
+    added = pd.DataFrame({'display_name': ['Station D'], 'geometry': [Point(0, 0)], 'metadata': [{}]}, index=['d'])
+    assert cache.merges() == 0
+    cache.merge(pd.concat([changed, added]), deleted=['a'])
+    assert cache.merges() == 1
+
+    df = cache.read()
+    assert sorted(df.index) == ['b', 'c', 'd']
+    assert df.loc['b', 'display_name'] == 'Station B2'
+    assert df.loc['c', 'reserved'] == {'download_url': 'http://example.com/c.zip'}
+    assert cache.read(filters={'search_terms': ['B2']}).index.tolist() == ['b']
+    assert cache.read(filters={'bbox': [-1, -1, 1, 1]}).index.tolist() == ['d']
+
+
+def test_catalog_cache_iter_batches(cache, points_catalog_entries):
+    cache.write(points_catalog_entries)
+
+    batches = list(cache.iter_batches(batch_size=10000))
+    assert [len(b) for b in batches] == [10000, 10000, 5000]
+    assert sorted(pd.concat(batches).index) == sorted(points_catalog_entries.index)
+
+    bbox = [-10, -5, 10, 5]
+    batches = list(cache.iter_batches(filters={'bbox': bbox}, columns=['display_name'], batch_size=100))
+    assert all(len(b) <= 100 for b in batches)
+    assert sorted(pd.concat(batches).index) == sorted(cache.read(filters={'bbox': bbox}).index)
+    assert batches[0].columns.tolist() == ['display_name']
+
+    assert list(cache.iter_batches(filters={'display_name': 'station Z'})) == []
+
+
+def test_catalog_cache_tags(cache, catalog_entries):
+    catalog_entries['metadata'] = [
+        {'state': 'TX', 'elevation': 100, 'site': {'type': 'stream', 'huc': '1201'}, 'location': {'x': 1}},
+        {'state': 'TX', 'elevation': None, 'site': {'type': 'lake', 'huc': '1201'}, 'agency': ['USGS', 'TWDB']},
+        {'state': 'PA', 'elevation': '100'},
+    ]
+    cache.write(catalog_entries)
+
+    tags = cache.read_tags()
+    assert sorted(tags.tag.unique()) == ['agency', 'elevation', 'site:huc', 'site:type', 'state']
+    assert tags[tags.tag == 'state'][['value', 'count']].values.tolist() == [['TX', 2], ['PA', 1]]
+    # values of different types are kept apart
+    assert sorted(map(repr, tags[tags.tag == 'elevation'].value)) == ["'100'", '100', 'None']
+    assert sorted(tags[tags.tag == 'agency'].value) == ['TWDB', 'USGS']
+
+    tags = cache.read_tags(prefix='site:')
+    assert sorted(tags.tag.unique()) == ['site:huc', 'site:type']
+    assert tags[tags.tag == 'site:huc'][['value', 'count']].values.tolist() == [['1201', 2]]
+
+    # the tag index is rebuilt with the cache
+    catalog_entries['metadata'] = [{'state': 'NM'}] * 3
+    cache.write(catalog_entries)
+    assert cache.read_tags().values.tolist() == [['state', 'NM', 3]]
+
+
+def test_catalog_cache_metadata_filters(cache, catalog_entries):
+    catalog_entries['metadata'] = [
+        {'location': {'state': 'TX', 'elevation': 100}, 'active': True, 'mixed': 1},
+        {'location': {'state': 'PA', 'elevation': 250.5}, 'active': False, 'mixed': 'one'},
+        {'location': {'state': 'TX'}, 'tags': ['a', 'b']},
+    ]
+    cache.write(catalog_entries)
+
+    def read(filters):
+        return sorted(cache.read(filters=filters).index)
+
+    assert read({'location:state': 'TX'}) == ['a', 'c']
+    assert read({'location:elevation': {'>=': 100, '<': 200}}) == ['a']
+    assert read({'location:elevation': {'>': 100}}) == ['b']
+    assert read({'location:state': {'in': ['PA', 'NM']}, 'bbox': [-90, 35, -70, 45]}) == ['b']
+    assert read({'active': False}) == ['b']
+    assert read({'location:state': 'TX', 'description': 'river'}) == []
+    # tags with values of more than one type or list values are not stored as columns
+    assert read({'mixed': 1}) == ['a', 'b', 'c']
+    assert read({'tags': 'a'}) == ['a', 'b', 'c']
+    # values that cannot be compared to the column are not pushed down
+    assert read({'location:elevation': 'high'}) == ['a', 'b', 'c']
+
+    df = cache.read(filters={'location:state': 'PA'}, columns=['display_name'])
+    assert df.columns.tolist() == ['display_name'] and df.index.tolist() == ['b']
+    assert not any(c.startswith('_') for c in cache.read().columns)
+
+
+def test_catalog_cache_categorical_columns(cache):
+    n = 1000
+    catalog_entries = pd.DataFrame({
+        'display_name': ['station {}'.format(i) for i in range(n)],
+        'parameters': ['streamflow', 'gage_height'] * (n // 2),
+        'geometry': [Point(-100 + i / n, 30) for i in range(n)],
+        'metadata': [{'state': ['TX', 'PA'][i % 2]} for i in range(n)],
+    }, index=[str(i) for i in range(n)])
+    cache.write(catalog_entries)
+
+    df = cache.read()
+    assert df.parameters.dtype == 'category'
+    assert df.display_name.dtype == object
+    assert sorted(df.parameters.cat.categories) == ['gage_height', 'streamflow']
+    assert df.parameters.memory_usage(index=False, deep=True) < \
+        catalog_entries.parameters.memory_usage(index=False, deep=True) / 10
+
+    # filters are evaluated on the dictionary encoded columns
+    assert len(cache.read(filters={'parameter': 'gage', 'geom_type': 'Point'})) == n // 2
+    assert len(cache.read(filters={'state': {'in': ['PA']}, 'bbox': [-100, 29, -99.5, 31]})) == n // 4
+    chunks = list(cache.iter_batches(filters={'parameter': 'stream'}, batch_size=100))
+    assert sum(len(c) for c in chunks) == n // 2 and all(c.parameters.dtype == 'category' for c in chunks)
+
+
+def test_catalog_cache_read_ids(cache, catalog_entries):
+    cache.write(catalog_entries)
+    build = cache.build_id()
+
+    df = cache.read_ids(['c', 'a', 'missing'])
+    assert sorted(df.index) == ['a', 'c']
+    assert df.loc['a', 'metadata'] == {'state': 'TX', 'elevation': 100}
+    assert cache.read_ids(['b'], columns=['display_name']).columns.tolist() == ['display_name']
+
+    cache.write(catalog_entries)
+    assert cache.build_id() != build
@@ -1,20 +1,96 @@
 import pytest
+from contextlib import closing
+import os
+from datetime import datetime
+import sqlite3
 from types import ModuleType
 
 from pandas import DataFrame
+import pyarrow as pa
 
 from data import DOWNLOAD_OPTIONS_FROM_ALL_SERVICES, SERVICE, CATALOG_ENTRY, DATASET, DATASET_METADATA
 
-from quest.static import DatasetStatus
+from quest.database import database
+from quest.static import DatasetStatus, DatasetSource
+from quest.util import uuid
 
 ACTIVE_PROJECT = 'test_data'
 
 pytestmark = pytest.mark.usefixtures('reset_projects_dir', 'set_active_project')
 
 
-def test_download_datasets():
-    pass
-    # TODO
+def test_download_datasets(api, monkeypatch):
+    import quest.api.datasets
+
+    def download(catalog_entry, file_path, dataset=None, **kwargs):
+        if kwargs.get('parameter') == 'missing':
+            raise ValueError('parameter not found')
+        return {'file_path': os.path.join(file_path, dataset), 'metadata': {'parameter': kwargs['parameter']}}
+
+    monkeypatch.setattr(quest.api.datasets, 'download', download)
+    new_datasets = [uuid('dataset') for _ in range(3)]
+    database.insert_datasets([
+        {'name': dataset, 'collection': 'col1', 'catalog_entry': CATALOG_ENTRY, 'source': DatasetSource.WEB_SERVICE,
+         'status': DatasetStatus.STAGED, 'options': {'parameter': parameter}}
+        for dataset, parameter in zip(new_datasets, ['streamflow', 'gage_height', 'missing'])
+    ])
+    try:
+
+        progress = []
+        status = api.download_datasets(new_datasets, progress=lambda *args: progress.append(args))
+        assert status == {new_datasets[0]: DatasetStatus.DOWNLOADED, new_datasets[1]: DatasetStatus.DOWNLOADED,
+                          new_datasets[2]: DatasetStatus.FAILED_DOWNLOAD}
+        assert sorted(p[0] for p in progress) == sorted(new_datasets)
+        assert [p[2:] for p in progress] == [(1, 3), (2, 3), (3, 3)]
+
+        metadata = api.get_metadata(new_datasets)
+        assert metadata[new_datasets[0]]['metadata'] == {'parameter': 'streamflow'}
+        assert metadata[new_datasets[1]]['status'] == DatasetStatus.DOWNLOADED
+        assert metadata[new_datasets[2]]['status'] == DatasetStatus.FAILED_DOWNLOAD
+        assert metadata[new_datasets[2]]['message'] == 'parameter not found'
+
+        with pytest.raises(ValueError):
+            api.download_datasets(new_datasets[2], raise_on_error=True)
+    finally:
+        api.delete(new_datasets)
+
+
+def test_download_datasets_stopped(api, monkeypatch):
+    import quest.api.datasets
+
+    def download(catalog_entry, file_path, dataset=None, **kwargs):
+        if kwargs.get('parameter') == 'missing':
+            raise ValueError('parameter not found')
+        return {'file_path': os.path.join(file_path, dataset), 'metadata': {}}
+
+    def progress(*args):
+        raise RuntimeError('cancelled')
+
+    monkeypatch.setattr(quest.api.datasets, 'download', download)
+    settings = api.get_settings()
+    new_datasets = [uuid('dataset') for _ in range(6)]
+    database.insert_datasets([
+        {'name': dataset, 'collection': 'col1', 'catalog_entry': CATALOG_ENTRY, 'source': DatasetSource.WEB_SERVICE,
+         'status': DatasetStatus.STAGED, 'options': {'parameter': parameter}}
+        for dataset, parameter in zip(new_datasets, ['missing'] * 3 + ['streamflow'] * 3)
+    ])
+    try:
+        # one download at a time, so that the downloads after the first one are not started
+        api.update_settings({'DOWNLOAD_WORKERS': 1})
+
+        with pytest.raises(ValueError):
+            api.download_datasets(new_datasets[:3], raise_on_error=True)
+        statuses = [m['status'] for m in api.get_metadata(new_datasets[:3]).values()]
+        assert sorted(statuses) == [DatasetStatus.PENDING, DatasetStatus.STAGED, DatasetStatus.STAGED]
+
+        # the status of the finished downloads is recorded when the progress callback raises
+        with pytest.raises(RuntimeError):
+            api.download_datasets(new_datasets[3:], progress=progress)
+        statuses = [m['status'] for m in api.get_metadata(new_datasets[3:]).values()]
+        assert sorted(statuses) == [DatasetStatus.DOWNLOADED, DatasetStatus.STAGED, DatasetStatus.STAGED]
+    finally:
+        settings.pop('DOWNLOAD_WORKERS', None)
+        api.delete(new_datasets)
 
 
 @pytest.mark.parametrize('service, options', [(k, v) for k, v in DOWNLOAD_OPTIONS_FROM_ALL_SERVICES.items()])
@@ -76,6 +152,145 @@ def test_get_datasets_with_query(api):
     assert len(datasets) == expected
 
 
+def test_get_datasets_with_database_filters(api):
+    # the template project database was created with the previous schema and is migrated when it is opened
+    download_options = {'start': '2018-08-15 12:00:00', 'end': '2018-09-15 12:00:00', 'parameter': 'streamflow'}
+    actual = api.get_datasets(filters={'status': DatasetStatus.DOWNLOADED, 'options': download_options})
+    assert actual == [DATASET]
+
+    actual = api.get_datasets(filters={'collection': 'col1', 'catalog_entry': CATALOG_ENTRY})
+    assert actual == [DATASET]
+
+    actual = api.get_datasets(filters={'options': dict(download_options, parameter='gage_height')})
+    assert actual == []
+
+    # the options hash is updated with the options
+    catalog_entries = DataFrame({'name': ['svc://usgs-nwis:iv/0'], 'service': 'svc://usgs-nwis:iv'})
+    new_dataset = api.add_datasets('col1', catalog_entries)[0]
+    try:
+        api.stage_for_download(new_dataset, options=download_options)
+        actual = api.get_datasets(filters={'options': download_options})
+        assert sorted(actual) == sorted([DATASET, new_dataset])
+
+        actual = api.get_datasets(filters={'status': DatasetStatus.STAGED, 'options': download_options})
+        assert actual == [new_dataset]
+    finally:
+        api.delete(new_dataset)
+
+
+def test_get_datasets_with_pages_and_columns(api):
+    catalog_entries = DataFrame({
+        'name': ['svc://usgs-nwis:iv/{}'.format(i) for i in range(5)],
+        'service': 'svc://usgs-nwis:iv',
+    })
+    new_datasets = api.add_datasets('col1', catalog_entries)
+    try:
+        all_datasets = sorted(new_datasets + [DATASET])
+        assert api.get_datasets(limit=2, offset=1) == all_datasets[1:3]
+        assert api.get_datasets(offset=4) == all_datasets[4:]
+
+        # queries are evaluated in sql or, when they cannot be translated, by pandas
+        query = 'status == "{}"'.format(DatasetStatus.NOT_STAGED)
+        assert sorted(api.get_datasets(queries=[query])) == sorted(new_datasets)
+        query = 'status == "{}" and file_path != "x"'.format(DatasetStatus.NOT_STAGED)
+        assert sorted(api.get_datasets(queries=[query])) == sorted(new_datasets)
+        assert api.get_datasets(queries=[query], limit=1, offset=1) == sorted(new_datasets)[1:2]
+
+        actual = api.get_datasets(filters={'name': {'>=': all_datasets[3]}, 'status': {'in': [DatasetStatus.NOT_STAGED]}})
+        assert sorted(actual) == [d for d in all_datasets[3:] if d != DATASET]
+
+        actual = api.get_datasets(filters={'file_path': {'!=': 'x'}}, expand=True, columns=['status'], limit=2)
+        assert list(actual) == all_datasets[:2]
+        assert all(list(v) == ['name', 'status'] for v in actual.values())
+
+        actual = api.get_datasets(as_dataframe=True, columns=['catalog_entry'])
+        assert list(actual.columns) == ['name', 'catalog_entry']
+        assert sorted(actual.index) == all_datasets
+
+        with pytest.raises(ValueError):
+            api.get_datasets(expand=True, columns=['not_a_field'])
+    finally:
+        api.delete(new_datasets)
+
+
+def test_update_metadata_of_datasets(api):
+    catalog_entries = DataFrame({
+        'name': ['svc://usgs-nwis:iv/{}'.format(i) for i in range(3)],
+        'service': 'svc://usgs-nwis:iv',
+    })
+    new_datasets = api.add_datasets('col1', catalog_entries)
+    try:
+        quest_metadata = {'status': DatasetStatus.DERIVED}
+        actual = api.update_metadata(new_datasets, quest_metadata=quest_metadata, description=['a', 'b', 'c'])
+        assert actual == api.get_metadata(new_datasets)
+        assert [actual[d]['description'] for d in new_datasets] == ['a', 'b', 'c']
+        assert all(actual[d]['status'] == DatasetStatus.DERIVED for d in new_datasets)
+        assert quest_metadata == {'status': DatasetStatus.DERIVED}
+
+        # records as dicts or as a frame, where missing values are not updated
+        actual = api.update_metadata([{'name': new_datasets[0], 'unit': 'cfs'}])
+        assert actual[new_datasets[0]]['unit'] == 'cfs'
+        records = DataFrame({'unit': ['m', None], 'options': [{'a': 1}, None]}, index=new_datasets[1:])
+        actual = api.update_metadata(records, as_dataframe=True)
+        assert actual['unit'].tolist() == ['m', '']
+        assert actual['options'].tolist() == [{'a': 1}, None]
+        assert api.get_datasets(filters={'options': {'a': 1}}) == [new_datasets[1]]
+
+        with pytest.raises(ValueError):
+            api.update_metadata([{'unit': 'cfs'}])
+        with pytest.raises(ValueError):
+            api.update_metadata(records, display_name='name')
+    finally:
+        api.delete(new_datasets)
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'duckdb'])
+def test_get_datasets_with_storage_backend(api, backend):
+    if backend == 'duckdb':
+        pytest.importorskip('duckdb')
+
+    settings = api.get_settings()
+    try:
+        api.update_settings({'DB_BACKEND': backend})
+        table = database.select_datasets(filters={'created_at': {'<': datetime.now()}},
+                                         columns=['name', 'created_at', 'options'], as_table=True)
+        assert table.column_names == ['name', 'created_at', 'options']
+        assert table.schema.field('created_at').type == pa.timestamp('us')
+        assert table.column('name').to_pylist() == [DATASET]
+
+        actual = api.get_datasets(as_dataframe=True)
+        assert actual.loc[DATASET, 'options']['parameter'] == 'streamflow'
+        assert actual.loc[DATASET, 'created_at'] == database.select_datasets()[0]['created_at']
+        assert api.get_collections(as_dataframe=True).loc['col1', 'name'] == 'col1'
+
+        api.update_settings({'DB_BACKEND': 'not_a_backend'})
+        with pytest.raises(ValueError):
+            api.get_datasets()
+    finally:
+        settings.pop('DB_BACKEND', None)
+        database.get_db(reconnect=True)
+
+
+def test_get_datasets_read_cache(api, monkeypatch):
+    backend = database.get_backend()
+    reads = []
+    read = backend._read
+    monkeypatch.setattr(backend, '_read', lambda *args: reads.append(args) or read(*args))
+
+    expected = api.get_datasets(expand=True, columns=['display_name'])
+    assert api.get_datasets(expand=True, columns=['display_name']) == expected
+    assert len(reads) == 1  # the second read is served from the cache
+
+    # changes made through quest and by other connections (e.g. of task workers) invalidate the cache
+    api.update_metadata(DATASET, display_name='new name')
+    assert api.get_datasets(expand=True, columns=['display_name'])[DATASET]['display_name'] == 'new name'
+    with closing(sqlite3.connect(api.active_db())) as connection:
+        with connection:
+            connection.execute('UPDATE "Dataset" SET "display_name" = ? WHERE "name" = ?', ('other name', DATASET))
+    assert api.get_datasets(expand=True, columns=['display_name'])[DATASET]['display_name'] == 'other name'
+    assert len(reads) == 3
+
+
 def test_new_dataset(api):
     new_dataset = api.new_dataset(CATALOG_ENTRY, 'col1')
     datasets = api.get_datasets()
@@ -129,6 +344,29 @@ def test_stage_for_download(api):
         api.delete(new_datasets)
 
 
+def test_add_and_stage_datasets_in_bulk(api):
+    catalog_entries = DataFrame({
+        'name': ['svc://usgs-nwis:iv/{}'.format(i) for i in range(50)],
+        'service': 'svc://usgs-nwis:iv',
+    })
+    new_datasets = api.add_datasets('col1', catalog_entries)
+    try:
+        assert len(new_datasets) == 50
+        assert set(new_datasets).issubset(api.get_datasets())
+
+        download_options = {'parameter': 'streamflow'}
+        api.stage_for_download(new_datasets, options=download_options)
+        metadata = api.get_metadata(uris=new_datasets)
+        for i, dataset in enumerate(new_datasets):
+            assert metadata[dataset]['catalog_entry'] == 'svc://usgs-nwis:iv/{}'.format(i)
+            assert metadata[dataset]['source'] == DatasetSource.WEB_SERVICE
+            assert metadata[dataset]['options'] == download_options
+            assert metadata[dataset]['status'] == DatasetStatus.STAGED
+            assert metadata[dataset]['display_name'] == 'usgs-nwis-streamflow-{}'.format(dataset[:7])
+    finally:
+        api.delete(new_datasets)
+
+
 def test_describe_dataset(api):
     pass
 
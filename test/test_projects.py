@@ -6,6 +6,8 @@ import os
 import pytest
 import shutil
 
+from quest.database import database
+
 ACTIVE_PROJECT = 'project1'
 
 pytestmark = pytest.mark.usefixtures('reset_projects_dir')
@@ -218,3 +220,42 @@ def test_set_active_project_non_existing(api):
 def test__load_project_non_existing(api):
     with pytest.raises(ValueError):
         api.projects._load_project('non_existing_project')
+
+
+def test_database_settings(api, set_active_project):
+    def pragma(db, name):
+        with database.db_session:
+            return db.select('* FROM pragma_{}'.format(name))[0]
+
+    db = database.get_db()
+    assert pragma(db, 'journal_mode') == 'wal'
+    assert pragma(db, 'busy_timeout') == database.DEFAULT_DB_SETTINGS['DB_BUSY_TIMEOUT']
+
+    settings = api.get_settings()
+    try:
+        api.update_settings({'DB_JOURNAL_MODE': 'delete', 'DB_SYNCHRONOUS': 'FULL', 'DB_BUSY_TIMEOUT': 100})
+        db = database.get_db()
+        assert pragma(db, 'journal_mode') == 'delete'
+        assert pragma(db, 'synchronous') == 2
+        assert pragma(db, 'busy_timeout') == 100
+
+        with pytest.raises(ValueError):
+            api.update_settings({'DB_SYNCHRONOUS': 'SOMETIMES'})
+    finally:
+        for k in database.DEFAULT_DB_SETTINGS:
+            settings.pop(k, None)
+        database.get_db(reconnect=True)
+
+
+def test_database_connection_per_process(api, set_active_project, monkeypatch):
+    db = database.get_db()
+    assert database.get_db() is db
+
+    # a forked process opens its own connection instead of using the one of its parent
+    pid = os.getpid()
+    monkeypatch.setattr(database.os, 'getpid', lambda: pid + 1)
+    child_db = database.get_db()
+    assert child_db is not db
+    assert database.get_db() is child_db
+    with database.db_session:
+        assert db.Collection.select().count() == child_db.Collection.select().count()
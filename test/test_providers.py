@@ -41,3 +41,95 @@ def test_download(api, catalog_entry, options):
     api.stage_for_download(d, options=options)[0]
     result = api.download_datasets(d, raise_on_error=True)
     assert result[d] == 'downloaded'
+
+
+def test_wmts_download_tiles_to_tif(api, tmpdir):
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    import threading
+
+    import numpy as np
+    from PIL import Image
+    import rasterio
+    from quest.util.tile_cache import get_tile_cache
+    from quest_provider_plugins.wmts_imagery import WMTSImageryService, TILE_SIZE
+
+    # tiles of zoom level 2 with the x and y index as red and green, except the missing tile 1/1
+    tiles = tmpdir.mkdir('tiles')
+    for x in range(4):
+        for y in range(4):
+            if (x, y) != (1, 1):
+                tile = np.zeros((TILE_SIZE, TILE_SIZE, 3), 'uint8')
+                tile[..., 0], tile[..., 1] = x + 1, y + 1
+                Image.fromarray(tile).save(str(tiles.join('2-{}-{}.png'.format(x, y))))
+
+    handler = partial(SimpleHTTPRequestHandler, directory=str(tiles))
+    handler.log_message = lambda *args: None
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/{{Z}}-{{X}}-{{Y}}.png'.format(httpd.server_port)
+    api.update_settings({'CACHE_DIR': str(tmpdir.mkdir('cache'))})
+    try:
+        file_path = str(tmpdir.join('tiles.tiff'))
+        crop_bbox = 100, 50, 3 * TILE_SIZE + 10, 2 * TILE_SIZE + 20
+        WMTSImageryService._download_tiles_to_tif(url, (0, 0, 3, 2), crop_bbox, 2, 12, (-180, -60, 90, 85), file_path)
+        with rasterio.open(file_path) as src:
+            assert src.shape == (2 * TILE_SIZE - 30, 3 * TILE_SIZE - 90)
+            assert src.block_shapes[0] == (TILE_SIZE, TILE_SIZE)
+            image = np.moveaxis(src.read(), 0, -1)
+
+        # pixels of the first tile, the missing tile and the last tile
+        assert image[0, 0].tolist() == [1, 1, 0]
+        assert image[TILE_SIZE - 50, TILE_SIZE - 100].tolist() == [0, 0, 0]
+        assert image[-1, -1].tolist() == [4, 3, 0]
+
+        # tiles of overlapping requests are read from the tile cache
+        tile_cache = get_tile_cache()
+        assert dict(tile_cache.stats) == {'misses': 12}
+        WMTSImageryService._download_tiles_to_tif(url, (1, 0, 3, 2), None, 2, 12, (-90, -60, 90, 85), file_path)
+        assert dict(tile_cache.stats) == {'misses': 13, 'hits': 8}
+
+        with pytest.raises(ValueError):
+            WMTSImageryService._download_tiles_to_tif(url, (0, 0, 3, 2), None, 2, 11, (-180, -60, 90, 85), file_path)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_ncdc_concurrent_downloads(api, monkeypatch, tmpdir):
+    from functools import partial
+    import threading
+
+    import pandas as pd
+    from quest.plugins import load_providers, load_plugins
+    from quest.util.download import DownloadScheduler
+    import quest_provider_plugins.noaa_ncdc
+
+    # both downloads are in progress before either of them reads its data
+    barrier = threading.Barrier(2, timeout=10)
+
+    def get_data(station, elements, as_dataframe):
+        barrier.wait()
+        index = pd.date_range('2000-01-01', '2000-12-31', freq='D')
+        return {elements: pd.DataFrame({'value': float(station[-1])}, index=index)}
+
+    monkeypatch.setattr(quest_provider_plugins.noaa_ncdc.ghcn_daily, 'get_data', get_data)
+    service = load_providers()['noaa-ncdc'].services['ghcn-daily']
+    options = {
+        'station1': {'parameter': 'rainfall:daily:total', 'start': '2000-01-01', 'end': '2000-01-31'},
+        'station2': {'parameter': 'snowfall:daily:total', 'start': '2000-06-01', 'end': '2000-06-10'},
+    }
+    jobs = [(station, 'noaa-ncdc', partial(service.download, station, str(tmpdir), station, **kwargs))
+            for station, kwargs in options.items()]
+    results = {key: (result, error) for key, result, error in DownloadScheduler(n_workers=2, provider_workers=2, retries=0).run(jobs)}
+
+    io = load_plugins('io', 'timeseries-hdf5')['timeseries-hdf5']
+    for station, kwargs in options.items():
+        metadata, error = results[station]
+        assert error is None
+        assert metadata['parameter'] == kwargs['parameter']
+        data = io.read(metadata['file_path'])
+        assert station in metadata['file_path']
+        assert data.columns.tolist() == [kwargs['parameter']]
+        assert (data[kwargs['parameter']] == float(station[-1])).all()
+        assert str(data.index[0].date()) == kwargs['start'] and str(data.index[-1].date()) == kwargs['end']
@@ -1,5 +1,5 @@
-from time import sleep
-from quest.api.tasks import add_async
+from time import sleep, time
+from quest.api.tasks import add_async, close_executors
 import pytest
 import quest
 
@@ -31,8 +31,16 @@ def long_process_with_exception(delay, msg):
     return {'delay': delay, 'msg': msg}
 
 
+@add_async
+def timed_process(delay):
+    start = time()
+    sleep(delay)
+    return {'start': start, 'end': time()}
+
+
 setattr(quest.api, 'long_process', long_process)
 setattr(quest.api, 'long_process_with_exception', long_process_with_exception)
+setattr(quest.api, 'timed_process', timed_process)
 
 
 def wait_until_done(api):
@@ -139,3 +147,29 @@ def test_get_tasks(api, task_cleanup):
     assert len(tasks) == 0
     tasks = api.get_tasks(filters={'task_ids': test_tasks, 'status': ['finished']})
     assert len(tasks) == 2
+
+
+@skip_tasks
+@pytest.mark.parametrize('executor', ['local', 'threads'])
+def test_task_executors(api, task_cleanup, executor):
+    settings = api.get_settings()
+    try:
+        api.update_settings({'TASK_EXECUTOR': executor, 'TASK_WORKERS': 3})
+        test_tasks = [api.long_process(0.1, msg, async_tasks=True) for msg in ['first', 'second', 'third']]
+        wait_until_done(api)
+        for task, msg in zip(test_tasks, ['first', 'second', 'third']):
+            assert api.get_task(task)['result'] == {'delay': 0.1, 'msg': msg}
+
+        # the tasks are run by three workers at the same time, so each one starts before any of them ends
+        test_tasks = [api.timed_process(1.051, async_tasks=True) for _ in range(3)]
+        wait_until_done(api)
+        results = [api.get_task(task)['result'] for task in test_tasks]
+        assert max(r['start'] for r in results) < min(r['end'] for r in results)
+
+        api.update_settings({'TASK_EXECUTOR': 'not_an_executor'})
+        with pytest.raises(ValueError):
+            api.long_process(0, 'fourth', async_tasks=True)
+    finally:
+        for k in ['TASK_EXECUTOR', 'TASK_WORKERS']:
+            settings.pop(k, None)
+        close_executors()
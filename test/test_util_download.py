@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from quest.util.download import DownloadScheduler, is_retryable
+
+lock = threading.Lock()
+
+
+def make_download(result, running, limits, errors=None):
+    def download():
+        with lock:
+            running[provider] = running.get(provider, 0) + 1
+            limits[provider] = max(limits.get(provider, 0), running[provider])
+        time.sleep(0.05)
+        with lock:
+            running[provider] -= 1
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    provider = result[0]
+    return download
+
+
+def test_download_scheduler_provider_workers():
+    running, limits = {}, {}
+    jobs = [(i, provider, make_download((provider, i), running, limits))
+            for i, provider in enumerate(['nwis', 'ncdc'] * 6)]
+    scheduler = DownloadScheduler(n_workers=4, provider_workers={'nwis': 1}, retries=0, backoff=0)
+    results = {key: (result, error) for key, result, error in scheduler.run(jobs)}
+
+    assert sorted(results) == list(range(12))
+    assert all(error is None and result[1] == key for key, (result, error) in results.items())
+    assert limits == {'nwis': 1, 'ncdc': 3}
+
+
+def test_download_scheduler_retries():
+    running, limits = {}, {}
+    response = requests.Response()
+    response.status_code = 503
+    errors = [requests.ConnectionError(), requests.HTTPError(response=response)]
+    jobs = [('retried', 'nwis', make_download(('nwis', 'ok'), running, limits, errors)),
+            ('failed', 'nwis', make_download(('nwis', 'ok'), running, limits, [ValueError('bad parameter')]))]
+    results = {key: (result, error) for key, result, error in DownloadScheduler(retries=2, backoff=0).run(jobs)}
+
+    assert results['retried'] == (('nwis', 'ok'), None)
+    assert isinstance(results['failed'][1], ValueError)
+
+    jobs = [('failed', 'nwis', make_download(('nwis', 'ok'), running, limits, [TimeoutError()] * 2))]
+    results = {key: (result, error) for key, result, error in DownloadScheduler(retries=1, backoff=0).run(jobs)}
+    assert isinstance(results['failed'][1], TimeoutError)
+
+
+@pytest.mark.parametrize('status_code, retryable', [(429, True), (503, True), (404, False)])
+def test_is_retryable(status_code, retryable):
+    response = requests.Response()
+    response.status_code = status_code
+    assert is_retryable(requests.HTTPError(response=response)) == retryable
+    assert not is_retryable(ValueError())
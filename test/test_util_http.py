@@ -0,0 +1,107 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+import quest
+from quest.util import http
+from quest.util.download import is_retryable
+
+
+@pytest.fixture
+def server(tmpdir):
+    handler = partial(SimpleHTTPRequestHandler, directory=str(tmpdir))
+    handler.log_message = lambda *args: None
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(httpd.server_port), tmpdir
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        http.close_session()
+
+
+def test_read_csv(server):
+    url, folder = server
+    pd.DataFrame({'time': ['2016-01-01'], 'flow': [1.5]}).to_csv(os.path.join(str(folder), 'data.csv'), index=False)
+
+    data = http.read_csv(url + '/data.csv')
+    assert data.to_dict(orient='list') == {'time': ['2016-01-01'], 'flow': [1.5]}
+
+    with pytest.raises(requests.HTTPError):
+        http.read_csv(url + '/missing.csv')
+
+
+def test_is_retried(server):
+    url, folder = server
+    assert http.is_retried(requests.HTTPError(response=http.get(url + '/missing.csv')))
+    assert not http.is_retried(requests.HTTPError(response=requests.get(url + '/missing.csv')))
+    assert not http.is_retried(requests.ConnectionError())
+
+    # errors of the shared session are not retried again by the downloads
+    response = http.get(url + '/missing.csv')
+    response.status_code = 503
+    assert not is_retryable(requests.HTTPError(response=response))
+
+
+def test_download_file(server, tmpdir):
+    url, folder = server
+    with open(os.path.join(str(folder), 'tile.tif'), 'wb') as f:
+        f.write(b'tile')
+
+    path = os.path.join(str(tmpdir), 'downloads', 'tile.tif')
+    assert http.download_file(url + '/tile.tif', path) == path
+    with open(path, 'rb') as f:
+        assert f.read() == b'tile'
+
+    # files that exist are not downloaded again unless they changed
+    with open(os.path.join(str(folder), 'tile.tif'), 'wb') as f:
+        f.write(b'new tile')
+    http.download_file(url + '/tile.tif', path)
+    with open(path, 'rb') as f:
+        assert f.read() == b'tile'
+    http.download_file(url + '/tile.tif', path, check_modified=True)
+    with open(path, 'rb') as f:
+        assert f.read() == b'new tile'
+
+    with pytest.raises(requests.HTTPError):
+        http.download_file(url + '/missing.tif', os.path.join(str(tmpdir), 'missing.tif'))
+    assert not os.path.exists(os.path.join(str(tmpdir), 'missing.tif'))
+
+
+def test_session_settings(reset_settings):
+    session = http.get_session()
+    assert http.get_session() is session
+    adapter = session.get_adapter('https://example.com')
+    assert adapter.timeout == http.DEFAULT_HTTP_SETTINGS['HTTP_TIMEOUT']
+
+    quest.api.update_settings({'HTTP_TIMEOUT': 5, 'HTTP_RATE_LIMITS': {'example.com': 10}})
+    try:
+        session = http.get_session()
+        adapter = session.get_adapter('https://example.com')
+        assert adapter.timeout == 5
+        assert adapter.rate_limiter.rate_limits == {'example.com': 10}
+
+        other_session = http.mount(requests.Session())
+        assert other_session.get_adapter('http://example.com') is adapter
+    finally:
+        settings = quest.api.get_settings()
+        settings.pop('HTTP_TIMEOUT')
+        settings.pop('HTTP_RATE_LIMITS')
+        http.close_session()
+
+
+def test_rate_limiter():
+    limiter = http.RateLimiter({'example.com': 20})
+    start = time.perf_counter()
+    for _ in range(5):
+        limiter.wait('example.com')
+        limiter.wait('other.com')
+    assert 4 / 20 <= time.perf_counter() - start < 0.5
@@ -1,5 +1,7 @@
 import os
 import tempfile
+
+import pytest
 import quest
 
 
@@ -45,6 +47,36 @@ def test_parse_service_uri():
     assert catalog_id == 'catalog_id/with/slashes'
 
 
+def test_classify_uris():
+    dataset = quest.util.uuid('dataset')
+    uris = ['svc://provider:service/1', 'col1', dataset, 'pub://provider:publisher', dataset.upper(),
+            'svc://provider:service/2']
+
+    actual = quest.util.classify_uris(uris, as_dataframe=False)
+    expected = {
+        'collections': ['col1', dataset.upper()],
+        'datasets': [dataset],
+        'publishers': ['pub://provider:publisher'],
+        'services': ['svc://provider:service/1', 'svc://provider:service/2'],
+    }
+    assert actual == expected
+    assert list(actual) == sorted(expected)
+
+    df = quest.util.classify_uris(uris, grouped=False)
+    assert df.index.tolist() == uris
+    assert df.loc[dataset, 'type'] == 'datasets'
+    grouped = quest.util.classify_uris(uris)
+    assert grouped.get_group('services').uri.tolist() == expected['services']
+
+    with pytest.raises(ValueError):
+        quest.util.classify_uris(uris, exclude=['publishers'])
+    with pytest.raises(ValueError):
+        quest.util.classify_uris(uris, require_same_type=True)
+    with pytest.raises(ValueError):
+        quest.util.classify_uris([])
+    assert quest.util.classify_uris([], as_dataframe=False, raise_if_empty=False) == {}
+
+
 def test_bbox2poly():
 
     bbox = -244.34479950938268, 6.5895717344199625, -224.63313773902783, 20.882714122571414
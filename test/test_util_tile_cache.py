@@ -0,0 +1,119 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+
+import pytest
+
+from quest.util import http
+from quest.util.tile_cache import TileCache, get_tile_cache
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    tiles = {}  # content and etag of the tiles keyed by path
+    requests = []  # paths and status codes of the responses
+    cache_control = None
+
+    def do_GET(self):
+        if self.path not in self.tiles:
+            status, content = 404, b''
+        elif self.headers.get('If-None-Match') == self.tiles[self.path][1]:
+            status, content = 304, b''
+        else:
+            status, content = 200, self.tiles[self.path][0]
+
+        self.requests.append((self.path, status))
+        self.send_response(status)
+        if self.path in self.tiles:
+            self.send_header('ETag', self.tiles[self.path][1])
+        if self.cache_control:
+            self.send_header('Cache-Control', self.cache_control)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server():
+    TileHandler.tiles = {'/1/{}/0.png'.format(x): (b'tile %d' % x * 10, '"v1-{}"'.format(x)) for x in range(4)}
+    TileHandler.requests = []
+    TileHandler.cache_control = None
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), TileHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        yield 'http://127.0.0.1:{}/{{Z}}/{{X}}/{{Y}}.png'.format(httpd.server_port)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        http.close_session()
+
+
+def test_tile_cache_hits_and_revalidation(tile_server, tmpdir):
+    cache = TileCache(str(tmpdir), max_size=10000)
+    assert cache.get(tile_server, 1, 0, 0) == b'tile 0' * 10
+    assert cache.get(tile_server, 1, 0, 0) == b'tile 0' * 10
+    assert cache.get(tile_server, 1, 5, 0) is None
+    assert dict(cache.stats) == {'misses': 2, 'hits': 1}
+    assert TileHandler.requests == [('/1/0/0.png', 200), ('/1/5/0.png', 404)]
+    assert os.path.isfile(cache.tile_path(tile_server, 1, 0, 0))
+
+    # expired tiles are only downloaded again if they changed
+    cache = TileCache(str(tmpdir), max_size=10000, max_age=0)
+    assert cache.get(tile_server, 1, 0, 0) == b'tile 0' * 10
+    TileHandler.tiles['/1/0/0.png'] = (b'new tile 0', '"v2-0"')
+    assert cache.get(tile_server, 1, 0, 0) == b'new tile 0'
+    assert cache.get(tile_server, 1, 0, 0) == b'new tile 0'
+    assert dict(cache.stats) == {'revalidations': 2, 'misses': 1}
+    assert TileHandler.requests[2:] == [('/1/0/0.png', 304), ('/1/0/0.png', 200), ('/1/0/0.png', 304)]
+
+    # the max-age of the server is used instead of the max_age of the cache
+    TileHandler.cache_control = 'max-age=3600'
+    cache.get(tile_server, 1, 1, 0)
+    cache.get(tile_server, 1, 1, 0)
+    assert cache.stats['hits'] == 1
+
+
+def test_tile_cache_eviction(tile_server, tmpdir):
+    cache = TileCache(str(tmpdir), max_size=150)
+    for x in [0, 1, 0, 2]:
+        cache.get(tile_server, 1, x, 0)
+
+    # tile 1 was used least recently and is removed to make room for tile 2
+    assert cache.stats['evictions'] == 1
+    assert not os.path.exists(cache.tile_path(tile_server, 1, 1, 0))
+    assert os.path.exists(cache.tile_path(tile_server, 1, 0, 0))
+    cache.get(tile_server, 1, 0, 0)
+    cache.get(tile_server, 1, 2, 0)
+    assert cache.stats['hits'] == 3
+
+    # the size of the cache is kept between instances
+    cache = TileCache(str(tmpdir), max_size=150)
+    cache.get(tile_server, 1, 3, 0)
+    assert cache.stats['evictions'] == 1
+    assert not os.path.exists(cache.tile_path(tile_server, 1, 0, 0))
+
+    cache.clear()
+    assert not os.path.exists(cache.tile_path(tile_server, 1, 3, 0))
+    cache.get(tile_server, 1, 3, 0)
+    assert cache.stats['misses'] == 2
+
+
+def test_get_tile_cache(api, reset_settings, tmpdir):
+    api.update_settings({'CACHE_DIR': str(tmpdir)})
+    try:
+        cache = get_tile_cache()
+        assert cache.path == os.path.join(str(tmpdir), 'tiles')
+        assert get_tile_cache() is cache
+
+        api.update_settings({'TILE_CACHE_MAX_AGE': 60})
+        assert get_tile_cache() is not cache
+        assert get_tile_cache().max_age == 60
+        cache.clear()  # the previous cache can still be used by downloads that are running
+
+        api.update_settings({'TILE_CACHE_SIZE': 0})
+        assert get_tile_cache() is None
+    finally:
+        for key in ['TILE_CACHE_SIZE', 'TILE_CACHE_MAX_AGE']:
+            api.get_settings().pop(key, None)